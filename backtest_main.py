@@ -2,8 +2,10 @@ from definedClass import CallPut
 from functools import reduce
 from helpers import callput
 from tradeStat import calc_entry_price, calc_exit_price, assign_trade_num, calc_pnl
-from filters import filter_data
+from filters import filter_data, func_map, _apply_filters
+from profiler import profiled
 import pandas as pd 
+import numpy as np
 
 pd.set_option("display.expand_frame_repr", False)
 
@@ -46,9 +48,162 @@ output_format = [
     "cash_flow",
 ]
 
-def _create_legs(data, leg):
-    # select call or put, ratio ("long": 1, "short": -1 )
-    return data.pipe(callput, call_put = leg[0]).assign(ratio = leg[1])
+def assign_contract_id(data):
+    # give every contract (underlying_symbol, call_put, maturity_date, strike) an integer id and sort the
+    # chain by (contract_id, date), so that simulate can find the quotes of a contract by offset ranges.
+    # build it once after loading the chain, _process_legs only builds it if it is missing
+    return (
+        data.assign(contract_id = lambda x: x.groupby(on, sort = True, observed = True).ngroup().astype("int32"))
+        .sort_values(["contract_id", "date"], kind = "mergesort")
+        .reset_index(drop = True)
+    )
+
+def _ranges(start, end):
+    # every position start[i] <= p < end[i], with its i
+    counts = end - start
+    idx = np.repeat(np.arange(len(start)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return idx, np.repeat(start, counts) + offsets
+
+def _quote_positions(spread_ids, chain_ids):
+    # for each leg, the positions of all the quotes of its contract in the chain sorted by contract_id
+    start = np.searchsorted(chain_ids, spread_ids, side = "left")
+    end = np.searchsorted(chain_ids, spread_ids, side = "right")
+    return _ranges(start, end)
+
+def _lookup_contract_ids(spreads, data):
+    # contract_id of the legs built without it, looked up in the contract dictionary of the chain.
+    # the legs of a contract without quote in the chain are dropped, like pd.merge(spreads, data, on = on)
+    contracts = data[on + ["contract_id"]].drop_duplicates(on)
+    cid = spreads[on].merge(contracts, on = on, how = "left")["contract_id"].values.astype(float)
+    known = ~np.isnan(cid)
+    return spreads[known].assign(contract_id = cid[known].astype(np.int64))
+
+def _gather_quotes(spreads, data, legs, pos):
+    # put the entry leg (spreads row) and its quote in the chain (data row) side by side,
+    # overlapping columns are suffixed like pd.merge(spreads, data, on = on, suffixes = ("_entry", "_exit"))
+    keys = on + ["contract_id"]
+    overlap = [c for c in data.columns if c in spreads.columns and c not in keys]
+    entry = spreads.iloc[legs].reset_index(drop = True).rename(columns = {c: f"{c}_entry" for c in overlap})
+    exit = data.iloc[pos].drop(keys, axis = 1).reset_index(drop = True).rename(columns = {c: f"{c}_exit" for c in overlap})
+    return pd.concat([entry, exit], axis = 1)
+
+def _has_exit_masks(exit_filters):
+    return all("mask" in func_map[k] for k in exit_filters)
+
+def _exit_mask(data, exit_filters):
+    # combined exit conditions over the whole chain, without exit condition the trades are held to maturity
+    masks = [profiled(func_map[k]["mask"], k)(data, v) for (k, v) in exit_filters.items()]
+    masks = [m for m in masks if m is not None]
+    return reduce(np.logical_and, masks) if masks else data["dtm"].values < 1
+
+def _day_num(dates):
+    return dates.values.astype("datetime64[D]").astype(np.int64)
+
+def _first_complete_date(spreads, legs, days):
+    # of the quotes (legs, days) of the trades (index of spreads), select the quotes of the first date
+    # where every leg of the trade has one, so that all the legs of a trade exit on the same date
+    trade, _ = pd.factorize(spreads.index.values)
+    n_legs = np.bincount(trade, minlength = 1)
+    quotes = pd.DataFrame({"trade": trade[legs], "day": days})
+    complete = quotes.groupby(["trade", "day"])["trade"].transform("size").values == n_legs[quotes["trade"].values]
+    first = quotes[complete].groupby("trade")["day"].min()
+    return complete & (days == first.reindex(quotes["trade"].values).values)
+
+def _exit_keys(data, mask):
+    # the search keys of _exit_positions over the chain sorted by (contract_id, date), built once per
+    # chain and exit mask and shared by every batch of spreads searched in it
+    cid = data["contract_id"].values.astype(np.int64)
+    days = _day_num(data["date"])
+    first_day = (days.min() if len(days) else 0) - 1 # the entry days are clipped to [first_day, last day]
+    span = (days.max() if len(days) else 0) - first_day + 1
+    return {
+        "cid": cid,
+        "days": days,
+        "first_day": first_day,
+        "span": span,
+        "chain_key": cid * span + (days - first_day), # sorted, like the chain
+        "qualified": np.flatnonzero(mask),
+    }
+
+def _exit_positions(spreads, keys):
+    # for each trade, the first date after the entry date where the exit mask is True on a quote of every
+    # leg, and the positions in the chain of the quotes of its legs on that date. only the quotes
+    # satisfying the mask are looked at, the trades without exit date are dropped.
+    # :params keys: _exit_keys of the chain
+    entry_days = np.clip(_day_num(spreads["date"]) - keys["first_day"], 0, keys["span"] - 1)
+    leg_cid = spreads["contract_id"].values.astype(np.int64)
+    after = np.searchsorted(keys["chain_key"], leg_cid * keys["span"] + entry_days, side = "right")
+    end = np.searchsorted(keys["cid"], leg_cid, side = "right")
+
+    qualified = keys["qualified"]
+    legs, at = _ranges(np.searchsorted(qualified, after), np.searchsorted(qualified, end))
+    pos = qualified[at]
+    found = _first_complete_date(spreads, legs, keys["days"][pos])
+    return legs[found], pos[found]
+
+def _split_path_filters(exit_filters, exit_spread_filters):
+    # the path dependent exit filters (e.g. exit_profit_loss_pct) are taken out of the exit filters
+    path = {k: v for (k, v) in {**exit_filters, **exit_spread_filters}.items() if func_map[k].get("path")}
+    exit_filters = {k: v for (k, v) in exit_filters.items() if k not in path}
+    exit_spread_filters = {k: v for (k, v) in exit_spread_filters.items() if k not in path}
+    return path, exit_filters, exit_spread_filters
+
+def _trade_paths(spreads, data, legs, pos, mask, mode):
+    # one row per (trade_num, date) after the entry date: the price to close the trade and its greeks
+    quotes = {
+        "trade_num": spreads.index.values[legs],
+        "date": data["date"].values[pos],
+        "ratio": spreads["ratio"].values[legs],
+        "leg_delta": data["delta"].values[pos] * spreads["ratio"].values[legs],
+        "leg1_delta": np.where(spreads["leg"].values[legs] == 0, abs(data["delta"].values[pos]), np.nan),
+        "at_exit": mask[pos],
+    }
+    for col in ("bid", "ask", "last"):
+        if col in data:
+            quotes[f"{col}_exit"] = data[col].values[pos]
+
+    path = (
+        pd.DataFrame(quotes)
+        .pipe(calc_exit_price, mode = mode)
+        .groupby(["trade_num", "date"], sort = True)
+        .agg(
+            n_legs = ("ratio", "size"),
+            spread_price = ("exit_opt_price", "sum"),
+            spread_delta = ("leg_delta", "sum"),
+            leg1_delta = ("leg1_delta", "max"),
+            at_exit = ("at_exit", "all"),
+        )
+        .reset_index()
+    )
+
+    trade = spreads.groupby(level = 0)
+    t = path["trade_num"].values
+    entry_price = trade["entry_opt_price"].sum().reindex(t).values
+    path["complete"] = path["n_legs"].values == trade.size().reindex(t).values # every leg has a quote
+    path["hold_days"] = (path["date"].values - trade["date"].first().reindex(t).values).astype("timedelta64[D]").astype(int)
+    path["pnl_pct"] = (path["spread_price"].values + entry_price) / abs(entry_price) * 100
+    return path
+
+def _path_exit_positions(spreads, data, mask, path_filters, mode):
+    # first passage: each trade exits at the first date after entry where a path exit filter is breached
+    # (or the exit masks are True for every leg), the path of all the trades is scanned at once
+    legs, pos = _quote_positions(spreads["contract_id"].values, data["contract_id"].values)
+    after = data["date"].values[pos] > spreads["date"].values[legs]
+    legs, pos = legs[after], pos[after]
+
+    path = profiled(_trade_paths)(spreads, data, legs, pos, mask, mode)
+    breach = reduce(np.logical_or, [profiled(func_map[k]["func"], k)(path, v) for (k, v) in path_filters.items()], path["at_exit"].values)
+    complete = path[path["complete"]]
+    exits = complete[breach[path["complete"].values]].drop_duplicates("trade_num")
+
+    exit_date = pd.Series(exits["date"].values, index = exits["trade_num"].values)
+    found = exit_date.reindex(spreads.index.values[legs]).values == data["date"].values[pos]
+    return legs[found], pos[found]
+
+def _create_legs(data, leg, idx):
+    # select call or put, ratio ("long": 1, "short": -1 ), leg number (0 = 1st leg)
+    return data.pipe(callput, call_put = leg[0]).assign(ratio = leg[1], leg = idx)
 
 def _do_dedupe(spread, groupby, col, mode):
     # dedupe delta dist ties
@@ -64,15 +219,94 @@ def _do_dedupe(spread, groupby, col, mode):
 def _dedup_rows_by_cols(spreads, cols, groupby = None, mode = "max"):
     return reduce(lambda x, col: _do_dedupe(spreads, groupby, col, mode), cols, spreads)
 
-def create_spread(data, leg_structs, entry_filters, entry_spread_filters, mode):
-    legs = [_create_legs(data, leg) for leg in leg_structs]
+trade_keys = ['date', 'maturity_date', 'underlying_symbol']
+
+strike_ops = {
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    ">=": np.greater_equal,
+    ">": np.greater,
+}
+
+def _leg_candidates(leg, idx):
+    # trade keys, strike and position of the rows of a leg, the highest strike first like _dedup_rows_by_cols
+    leg = leg.sort_values("strike", ascending = False, kind = "mergesort").reset_index(drop = True)
+    cand = pd.DataFrame({k: leg[k].values for k in trade_keys})
+    cand[f"strike{idx}"] = leg["strike"].values
+    cand[f"pos{idx}"] = np.arange(len(leg))
+    return leg, cand
+
+def _join_legs(legs, strike_order):
+    # combinations of the legs sharing the trade keys, joined leg by leg from the leg with the fewest
+    # candidates: a strike order constraint (a, op, b) drops the combinations as soon as the legs a
+    # and b are both joined, so the legs filtered by nearest prune the wide legs early
+    for (a, op, b) in strike_order:
+        if op not in strike_ops or not (0 <= a < len(legs) and 0 <= b < len(legs)):
+            raise ValueError(f"Invalid strike order: {(a, op, b)}")
+
+    combos, joined = None, set()
+    for idx in np.argsort([len(leg) for leg in legs], kind = "mergesort"):
+        combos = legs[idx] if combos is None else combos.merge(legs[idx], on = trade_keys)
+        joined.add(idx)
+        for (a, op, b) in strike_order:
+            if idx in (a, b) and a in joined and b in joined:
+                combos = combos[strike_ops[op](combos[f"strike{a}"].values, combos[f"strike{b}"].values)]
+    # one combination per trade: the first one in the order of the candidates of each leg
+    return (
+        combos.sort_values(trade_keys + [f"pos{idx}" for idx in range(len(legs))])
+        .drop_duplicates(trade_keys)
+        .reset_index(drop = True)
+    )
+
+def _create_multi_leg_spread(legs, entry_filters, strike_order):
+    # the legs of a trade are paired explicitly instead of being deduped one by one
+    legs, cands = zip(*[_leg_candidates(leg, idx) for idx, leg in enumerate(_apply_filters(legs, entry_filters))])
+    combos = profiled(_join_legs)(list(cands), strike_order)
+    return (
+        pd.concat([
+            leg.iloc[combos[f"pos{idx}"].values].assign(trade_num = np.arange(len(combos)))
+            for idx, leg in enumerate(legs)
+        ], sort = True)
+        .sort_values("trade_num", kind = "mergesort")
+        .set_index("trade_num")
+    )
+
+def _unselected_legs(n_legs, entry_filters):
+    # the legs (numbered from 1) without a selection filter
+    return [n for n in range(1, n_legs + 1) if f"leg{n}_delta" not in entry_filters and f"leg{n}_strike_pct" not in entry_filters]
+
+def create_spread(data, leg_structs, entry_filters, entry_spread_filters, mode, strike_order = None):
+    """
+    :params strike_order: list of (leg a, op, leg b) constraints on the strikes, e.g. [(0, "<", 1)] for a
+        1st leg strike below the 2nd leg strike (legs numbered from 0, op in strike_ops). With constraints
+        or more than 2 legs, the legs are joined per trade (date, maturity_date, underlying_symbol) and a
+        trade is only opened when every leg has a quote. Every leg needs a legN_delta or legN_strike_pct
+        filter then, the rows of a leg without selection would all be joined.
+    """
+    if strike_order is not None or len(leg_structs) > 2:
+        missing = _unselected_legs(len(leg_structs), entry_filters)
+        if missing:
+            raise ValueError(f"The legs {missing} need a legN_delta or legN_strike_pct filter")
+    legs = [profiled(_create_legs, f"leg{idx + 1}")(data, leg, idx) for idx, leg in enumerate(leg_structs)]
+    return _spread_of_legs(legs, entry_filters, entry_spread_filters, mode, strike_order)
+
+def _spread_of_legs(legs, entry_filters, entry_spread_filters, mode, strike_order = None):
+    # spreads of the legs built by _create_legs, e.g. legs already selected by paramSweep
+    if strike_order is not None or len(legs) > 2:
+        return (
+            profiled(_create_multi_leg_spread)(legs, entry_filters, strike_order or [])
+            .rename(columns = {'bid': 'bid_entry', 'ask': 'ask_entry', 'last': 'last_entry'})
+            .pipe(profiled(calc_entry_price), mode = mode)
+            .pipe(profiled(filter_data, "entry_spread_filters"), filters = entry_spread_filters)
+        )
     return(
-        filter_data(legs, filters = entry_filters)
+        profiled(filter_data, "entry_filters")(legs, filters = entry_filters)
         .rename(columns = {'bid': 'bid_entry', 'ask': 'ask_entry', 'last': 'last_entry'})
-        .pipe(_dedup_rows_by_cols, cols = ['delta', 'strike'])
-        .pipe(assign_trade_num, groupby = ['date', 'maturity_date', 'underlying_symbol'])
-        .pipe(calc_entry_price, mode = mode)
-        .pipe(filter_data, filters = entry_spread_filters)
+        .pipe(profiled(_dedup_rows_by_cols), cols = ['delta', 'strike'])
+        .pipe(profiled(assign_trade_num), groupby = ['date', 'maturity_date', 'underlying_symbol'])
+        .pipe(profiled(calc_entry_price), mode = mode)
+        .pipe(profiled(filter_data, "entry_spread_filters"), filters = entry_spread_filters)
     )
 #-------------------------------------------------------------------------------------------------------------------------
 # Main function that runs the backtest engine:
@@ -81,16 +315,57 @@ def create_spread(data, leg_structs, entry_filters, entry_spread_filters, mode):
 #-------------------------------------------------------------------------------------------------------------------------
 def simulate(spreads, data, exit_filters, exit_spread_filters, mode):
     # for each option to be traded, determine the historical price action    
-    res = (
-        pd.merge(spreads, data, on = on, suffixes = ("_entry", "_exit")) # Suffix to apply to overlapping column names in the left and right side, respectively
-        .pipe(filter_data, filters = exit_filters)
+    if "contract_id" not in spreads or "contract_id" not in data:
+        # legs built without contract_id exit like the legs of create_spread
+        data = data if "contract_id" in data else assign_contract_id(data)
+        spreads = _lookup_contract_ids(spreads, data)
+    elif not data["contract_id"].is_monotonic_increasing:
+        data = data.sort_values(["contract_id", "date"], kind = "mergesort")
+
+    return _run_exits(spreads, profiled(_prepare_exits)(data, exit_filters, exit_spread_filters), mode)
+
+def _prepare_exits(data, exit_filters, exit_spread_filters):
+    # the exit conditions evaluated once over the chain sorted by (contract_id, date), so that the
+    # batches of spreads of a stream (optionStrategies._stream_legs) are run against them without
+    # computing the exit mask again
+    path_filters, exit_filters, exit_spread_filters = _split_path_filters(exit_filters, exit_spread_filters)
+    if not _has_exit_masks(exit_filters):
+        raise ValueError("Every exit filter needs a mask")
+    mask = profiled(_exit_mask)(data, exit_filters)
+    return {
+        "data": data,
+        "mask": mask,
+        "keys": None if path_filters else _exit_keys(data, mask),
+        "path_filters": path_filters,
+        "exit_spread_filters": exit_spread_filters,
+    }
+
+def _run_exits(spreads, exits, mode):
+    # the trades of the spreads (with contract_id) exited under the conditions of _prepare_exits
+    data = exits["data"]
+    if exits["path_filters"]:
+        legs, pos = profiled(_path_exit_positions)(spreads, data, exits["mask"], exits["path_filters"], mode)
+    else:
+        # only the exit quotes of the legs are gathered, instead of every quote of the contract
+        legs, pos = profiled(_exit_positions)(spreads, exits["keys"])
+    quotes = profiled(_gather_quotes)(spreads, data, legs, pos)
+
+    return quotes.pipe(profiled(_close_legs), exits["exit_spread_filters"], mode).pipe(profiled(_number_trades))
+
+def _close_legs(quotes, exit_spread_filters, mode):
+    # price the exit of the legs joined with their exit quote and calculate the PnL
+    return (
+        quotes
         .rename(columns = {"bid": "bid_exit", "ask": "ask_exit", 'last': 'last_exit'}) # because the bid_entry and ask_entry have been specified in 'create_spread'
-        .pipe(calc_exit_price, mode = mode)
-        .pipe(calc_pnl)
-        .pipe(filter_data, filters = exit_spread_filters)
+        .pipe(profiled(calc_exit_price), mode = mode)
+        .pipe(profiled(calc_pnl))
+        .pipe(profiled(filter_data, "exit_spread_filters"), filters = exit_spread_filters)
         .rename(columns = output_cols)
-        .sort_values(["entry_date", "maturity_date", "underlying_symbol", "strike"])
-        .pipe(assign_trade_num, groupby = ["entry_date", "maturity_date", "underlying_symbol"])
     )
 
-    return res[output_format]
\ No newline at end of file
+def _number_trades(res):
+    res = (
+        res.sort_values(["entry_date", "maturity_date", "underlying_symbol", "strike"])
+        .pipe(assign_trade_num, groupby = ["entry_date", "maturity_date", "underlying_symbol"])
+    )
+    return res[output_format]
\ No newline at end of file
@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+from definedClass import CallPut
+from optionStrategies import _prepare_filters
+from backtest_main import create_spread, simulate, assign_contract_id
+from filters import filter_data
+from helpers import nearest
+from tradeStat import results
+from syntheticChain import synthetic_chain
+
+# Benchmark of the pipeline stages on synthetic chains of growing size:
+#   python benchmark.py                      # run and compare with the stored baseline
+#   python benchmark.py --save-baseline      # run and store the result as the new baseline
+# Each stage is timed (best of --repeat runs) and its peak memory measured with tracemalloc in a
+# separate run, so that the tracing does not slow the timings. A stage is flagged as a regression
+# when its time or peak memory is more than --tolerance above the baseline of the same size.
+# Timings depend on the machine, so no baseline is committed: save one first, the comparison fails
+# when there is none.
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bench_baseline.json")
+
+sizes = {
+    "small": {"n_underlyings": 1, "n_strikes": 21, "n_maturities": 3, "n_days": 40},
+    "medium": {"n_underlyings": 2, "n_strikes": 41, "n_maturities": 4, "n_days": 120},
+    "large": {"n_underlyings": 4, "n_strikes": 81, "n_maturities": 6, "n_days": 250},
+}
+
+legs = [(CallPut.CALL, 1), (CallPut.PUT, 1)]
+
+filters = {
+    "entry_dtm": {"value": 7, "cond": "greater"},
+    "leg1_delta": {"value": 0.5, "cond": "nearest"},
+    "leg2_delta": {"value": 0.5, "cond": "nearest"},
+    "contract_size": 10,
+    "exit_dtm": {"value": 5, "cond": "less_or_equal"},
+}
+
+mode = "mid_price"
+
+def _stages(data):
+    # (name, function) of each stage, the inputs of a stage are built by the previous ones
+    init_fil, entry_fil, exit_fil, entry_s_fil, exit_s_fil = _prepare_filters(filters)
+    chain = filter_data(data, init_fil)
+    spreads = create_spread(chain, legs, entry_fil, entry_s_fil, mode)
+    trades = simulate(spreads, chain, exit_fil, exit_s_fil, mode)
+    return [
+        ("filter_data", lambda: filter_data(data, init_fil)),
+        ("nearest", lambda: nearest(data, "delta", 0.5, groupby = ["date", "call_put"])),
+        ("create_spread", lambda: create_spread(chain, legs, entry_fil, entry_s_fil, mode)),
+        ("simulate", lambda: simulate(spreads, chain, exit_fil, exit_s_fil, mode)),
+        ("results", lambda: results(trades)),
+    ]
+
+def _time(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run(size_names = None, repeat = 3, seed = 0):
+    """
+    return {size: {"rows": rows of the chain, "stages": {stage: {"seconds": float, "peak_mb": float}}}}
+    """
+    report = {}
+    for name in size_names or list(sizes):
+        data = assign_contract_id(synthetic_chain(seed = seed, **sizes[name]))
+        report[name] = {"rows": len(data), "stages": {}}
+        for (stage, func) in _stages(data):
+            report[name]["stages"][stage] = {
+                "seconds": round(_time(func, repeat), 6),
+                "peak_mb": round(_peak_memory(func) / 2 ** 20, 3),
+            }
+    return report
+
+def compare(report, baseline, tolerance = 0.2):
+    """
+    return the list of regressions (size, stage, metric, baseline value, current value)
+    """
+    regressions = []
+    for (name, res) in report.items():
+        base = baseline.get(name)
+        if base is None or base["rows"] != res["rows"]:
+            continue
+        for (stage, metrics) in res["stages"].items():
+            for (metric, value) in metrics.items():
+                ref = base["stages"].get(stage, {}).get(metric)
+                if ref is not None and value > ref * (1 + tolerance):
+                    regressions.append((name, stage, metric, ref, value))
+    return regressions
+
+def unmatched_sizes(report, baseline):
+    # the sizes of the report that the baseline cannot be compared with (missing or another chain)
+    return [name for (name, res) in report.items() if baseline.get(name, {}).get("rows") != res["rows"]]
+
+def load_baseline(path = BASELINE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_baseline(report, path = BASELINE):
+    with open(path, "w") as f:
+        json.dump(report, f, indent = 2, sort_keys = True)
+
+def print_report(report, baseline):
+    for (name, res) in report.items():
+        print(f"{name} ({res['rows']} rows)")
+        for (stage, m) in res["stages"].items():
+            ref = baseline.get(name, {}).get("stages", {}).get(stage)
+            vs = f"  (baseline {ref['seconds']:.4f}s {ref['peak_mb']:.1f}MB)" if ref else ""
+            print(f"  {stage:<15}{m['seconds']:>10.4f}s{m['peak_mb']:>10.1f}MB{vs}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "benchmark the backtest pipeline on synthetic chains")
+    parser.add_argument("--sizes", default = ",".join(sizes), help = "comma separated, among " + ", ".join(sizes))
+    parser.add_argument("--repeat", type = int, default = 3)
+    parser.add_argument("--tolerance", type = float, default = 0.2)
+    parser.add_argument("--baseline", default = BASELINE)
+    parser.add_argument("--save-baseline", action = "store_true")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline)
+    if not baseline and not args.save_baseline:
+        sys.exit(f"ERROR no baseline at {args.baseline}, run with --save-baseline first")
+
+    report = run(args.sizes.split(","), repeat = args.repeat)
+    print_report(report, baseline)
+
+    if args.save_baseline:
+        save_baseline(report, args.baseline)
+        print(f"baseline saved to {args.baseline}")
+    else:
+        for name in unmatched_sizes(report, baseline):
+            print(f"WARNING {name}: not in the baseline, not compared", file = sys.stderr)
+        regressions = compare(report, baseline, args.tolerance)
+        for (name, stage, metric, ref, value) in regressions:
+            print(f"REGRESSION {name} {stage} {metric}: {ref} -> {value}")
+        if regressions:
+            raise SystemExit(1)
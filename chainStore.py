@@ -0,0 +1,144 @@
+import os
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from datetime import datetime
+
+# The chain store keeps a normalised option chain on disk as a parquet dataset,
+# partitioned by underlying_symbol and quote month, e.g.
+#   <root>/underlying_symbol=AS51/quote_month=2016-03/part-0.parquet
+# so that the init filters can be pushed down into the reader and only the
+# partitions / row groups that can contain matching quotes are loaded.
+
+partition_cols = ["underlying_symbol", "quote_month"]
+
+ROW_GROUP_SIZE = 100000 # rows per parquet row group, smaller groups -> finer pruning
+
+# only the init filters are pushed down to the reader, the entry filters (e.g. day_to_event)
+# would also drop the exit quotes simulate needs
+pushdown_filters = ("start_date", "end_date")
+
+cond_ops = {
+    "less_or_equal": "<=",
+    "less": "<",
+    "equal": "==",
+    "greater_or_equal": ">=",
+    "greater": ">",
+}
+
+def _quote_month(dates):
+    return dates.dt.strftime("%Y-%m")
+
+def store_chain(data, root, row_group_size = ROW_GROUP_SIZE):
+    """
+    write the normalised chain (output of data_import.get_data) to the chain store.
+    rows are sorted by maturity_date and date inside each partition so that the
+    parquet row-group statistics can be used to skip whole row groups on read.
+    the partitions of the chain already in the store are overwritten, the others are kept.
+    """
+    if "underlying_symbol" not in data:
+        raise ValueError("underlying_symbol is required to partition the chain store")
+
+    (
+        data.assign(quote_month = lambda x: _quote_month(x["date"]))
+        .sort_values(["underlying_symbol", "quote_month", "maturity_date", "date"])
+        .reset_index(drop = True)
+        .to_parquet(
+            root,
+            engine = "pyarrow",
+            partition_cols = partition_cols,
+            index = False,
+            row_group_size = row_group_size,
+            existing_data_behavior = "delete_matching",
+        )
+    )
+    return root
+
+def _cond_op(f):
+    if f["cond"] not in cond_ops:
+        raise ValueError("The condition does not make sense")
+    return cond_ops[f["cond"]]
+
+def _to_timestamp(val):
+    if isinstance(val, datetime):
+        return pd.Timestamp(val)
+    else:
+        raise ValueError("Dates must of Date type")
+
+def _pushdown_filters(filters, underlying_symbol = None, maturities = None):
+    # translate the start_date / end_date filters into pyarrow predicates
+    #   start_date, end_date -> maturity_date (row group statistics)
+    #   end_date             -> quote_month partitions, since a quote date is never after its maturity date
+    preds = []
+    if underlying_symbol is not None:
+        symbols = [underlying_symbol] if isinstance(underlying_symbol, str) else list(underlying_symbol)
+        preds.append(("underlying_symbol", "in", symbols))
+
+    if maturities is not None:
+        # (first, last) maturity_date to load, inclusive
+        preds.append(("maturity_date", ">=", pd.Timestamp(maturities[0])))
+        preds.append(("maturity_date", "<=", pd.Timestamp(maturities[1])))
+
+    if "start_date" in filters:
+        f = filters["start_date"]
+        if f["cond"] != "greater":
+            raise ValueError("The condition does not make sense")
+        preds.append(("maturity_date", ">", _to_timestamp(f["value"])))
+
+    if "end_date" in filters:
+        f = filters["end_date"]
+        op = _cond_op(f)
+        preds.append(("maturity_date", op, _to_timestamp(f["value"])))
+        if op in ("<=", "<", "=="):
+            preds.append(("quote_month", "<=", f["value"].strftime("%Y-%m")))
+
+    return preds if preds else None
+
+def load_chain(root, filters = None, underlying_symbol = None, columns = None, maturities = None):
+    """
+    load the chain from the chain store, only reading the partitions and row groups that
+    can satisfy the start_date and end_date filters (same format as filters.func_map).
+    other filters in the dict are ignored here and still have to be applied by the strategy.
+    maturities: (first, last) maturity_date, only load the contracts maturing in between (inclusive)
+    """
+    if not os.path.isdir(root):
+        raise ValueError("Invalid path, please provide a valid chain store directory")
+
+    filters = {} if filters is None else filters
+    data = pd.read_parquet(
+        root,
+        engine = "pyarrow",
+        columns = columns,
+        filters = _pushdown_filters(filters, underlying_symbol, maturities),
+    )
+    if "underlying_symbol" in data:
+        # partition keys come back as categoricals, keep the same dtype as get_data
+        data["underlying_symbol"] = data["underlying_symbol"].astype(str)
+
+    return (
+        data.drop(["quote_month"], axis = 1, errors = "ignore")
+        .sort_values(["date", "maturity_date", "call_put", "strike"])
+        .reset_index(drop = True)
+    )
+
+def chain_maturities(root, filters = None, underlying_symbol = None):
+    """
+    the distinct (underlying_symbol, maturity_date) of the chain store, scanned batch by batch
+    so that only these two columns of one row group are in memory at a time.
+    """
+    if not os.path.isdir(root):
+        raise ValueError("Invalid path, please provide a valid chain store directory")
+
+    preds = _pushdown_filters({} if filters is None else filters, underlying_symbol)
+    dataset = ds.dataset(root, format = "parquet", partitioning = "hive")
+    keys = set()
+    for batch in dataset.to_batches(
+        columns = ["underlying_symbol", "maturity_date"],
+        filter = pq.filters_to_expression(preds) if preds else None,
+    ):
+        b = batch.to_pandas()
+        keys.update(zip(b["underlying_symbol"].astype(str), b["maturity_date"]))
+    return (
+        pd.DataFrame(sorted(keys), columns = ["underlying_symbol", "maturity_date"])
+        .astype({"maturity_date": "datetime64[ns]"})
+    )
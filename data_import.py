@@ -1,8 +1,10 @@
 import glob
 import os
 import sys
+import numpy as np
 import pandas as pd 
 from distutils.util import strtobool
+from pricing import fill_greeks, greek_fields
 
 # All recognized fields by the library are defined in the tuples below. Structs are used
 # to map headers from source data to one of the recognized fields.
@@ -35,6 +37,12 @@ fields = ( # required field for the imported dataset
     ('day_to_event', False),
 )
 
+# compact dtypes used by the streaming import (chunksize is not None)
+category_fields = ('call_put', 'underlying_symbol')
+# delta stays float64, it is the key of the nearest delta selection and float32 noise changes its ties
+float32_fields = ('implied_vol', 'gamma', 'theta', 'vega', 'rho')
+call_put_dtype = pd.api.types.CategoricalDtype(['c', 'p'])
+
 def timeFormatter(df): # format_option_df
     return(
         df.assign(
@@ -47,6 +55,65 @@ def timeFormatter(df): # format_option_df
         .round(2)
     )
 
+def compactFormatter(df):
+    # same as timeFormatter, but keeps the compact dtypes of a streamed chunk
+    return (
+        df.pipe(timeFormatter)
+        .astype({'call_put': call_put_dtype, 'dtm': 'int32'})
+    )
+
+def _compact_dtypes(names):
+    # derive the dtype map of the streaming import from the recognised fields
+    dtypes = {}
+    for f in names:
+        if f in category_fields:
+            dtypes[f] = 'category'
+        elif f in float32_fields:
+            dtypes[f] = 'float32'
+    return dtypes
+
+def _count_lines(path, block = 1 << 20):
+    # upper bound of the rows of the file: its lines, plus a last line without end of line
+    n = 1
+    with open(path, 'rb') as f:
+        for b in iter(lambda: f.read(block), b''):
+            n += b.count(b'\n')
+    return n
+
+def _add_codes(cats, col):
+    # codes of a chunk categorical in the categories met so far, new categories are appended
+    # in their order of appearance like union_categoricals
+    known = pd.Index(cats)
+    cats.extend(c for c in col.cat.categories if c not in known)
+    mapping = np.append(pd.Index(cats).get_indexer(col.cat.categories), -1) # code -1 (NaN) stays -1
+    return mapping[col.cat.codes.values]
+
+def _append_chunks(chunks, capacity):
+    # copy the standardised chunks into columns allocated once for the whole file instead of keeping
+    # every chunk for a final concat, so the peak memory is the final frame plus one chunk.
+    # categoricals are stored as codes in the categories of all the chunks
+    arrays, cats, n = None, {}, 0
+    for chunk in chunks:
+        if arrays is None:
+            cats = {c: [] for c in chunk.select_dtypes(include = 'category').columns}
+            arrays = {c: np.empty(capacity, dtype = 'int32' if c in cats else chunk[c].dtype) for c in chunk.columns}
+        end = n + len(chunk)
+        for c, a in arrays.items():
+            values = _add_codes(cats[c], chunk[c]) if c in cats else chunk[c].values
+            if not np.can_cast(values.dtype, a.dtype, 'same_kind'):
+                # e.g. an int column with a NaN in this chunk, promoted like concat would
+                a = arrays[c] = a.astype(np.result_type(a.dtype, values.dtype))
+            if end > len(a): # more rows than lines, only with line breaks inside quoted values
+                a = arrays[c] = np.concatenate([a, np.empty(max(end, 2 * len(a)) - len(a), dtype = a.dtype)])
+            a[n:end] = values
+        n = end
+    if arrays is None:
+        raise ValueError("The file does not contain any data")
+    return pd.DataFrame({
+        c: pd.Categorical.from_codes(a[:n], categories = cats[c]) if c in cats else a[:n]
+        for c, a in arrays.items()
+    }, copy = False)
+
 def _check_field_is_standard(struct):
     # Check:
     # 1) if the de-zipped field name == the original zipped field name
@@ -64,22 +131,26 @@ def _check_field_is_duplicated(cols):
         raise ValueError('We have duplicated indices, it does not make sense!')
     return True
 
-def _check_fields_contains_required(cols):
+def _check_fields_contains_required(cols, greeks = False):
     # Check if the struct provided contains all the required fields
-    req_fields = [x[0] for x in fields if x[1] is True] # x[1] = True -> x[0] are required
+    # greeks: the greeks are filled by pricing.fill_greeks, so they are not required
+    req_fields = [x[0] for x in fields if x[1] is True and not (greeks and x[0] in greek_fields)] # x[1] = True -> x[0] are required
     if not all (f in cols[0] for f in req_fields):
         raise ValueError('Required field(s) is missing!')
     return True
 
-def _check_structs(struct, cols):
+def _check_structs(struct, cols, greeks = False):
     # Check if the struct we input is valid
     return (_check_field_is_standard(struct) 
             and _check_field_is_duplicated(cols) 
-            and _check_fields_contains_required(cols))
+            and _check_fields_contains_required(cols, greeks))
 
-def _import_file(path, names, usecols, date_cols, skiprow):
+def _import_file(path, names, usecols, date_cols, skiprow, chunksize = None):
     # import the file
-    if not os.path.isdir(path): # if the path is not a directory
+    if os.path.isdir(path): # if the path is a directory
+        raise ValueError("Invalid path, please provide a valid path to a file")
+
+    if chunksize is None:
         data = pd.read_csv(
             path,
             names = names,
@@ -88,10 +159,21 @@ def _import_file(path, names, usecols, date_cols, skiprow):
             skiprows = skiprow,
             infer_datetime_format = True,
         )
+        return data.pipe(timeFormatter) # standardise the format
     else:
-        raise ValueError("Invalid path, please provide a valid path to a file")
-
-    return data.pipe(timeFormatter) # standardise the format
+        # streaming import: read the file chunk by chunk with compact dtypes, standardise each chunk and
+        # copy it into the columns of the whole file, so that only one raw chunk is alive at a time
+        reader = pd.read_csv(
+            path,
+            names = names,
+            usecols = usecols,
+            parse_dates = date_cols,
+            skiprows = skiprow,
+            infer_datetime_format = True,
+            dtype = _compact_dtypes(names),
+            chunksize = chunksize,
+        )
+        return _append_chunks((chunk.pipe(compactFormatter) for chunk in reader), max(_count_lines(path) - skiprow, 0))
 
 def _preview(data):
     # preview the data see if there is any problem
@@ -110,14 +192,23 @@ def _user_prompt(question):
         except ValueError:
             sys.stdout.write(" Please user y/n or yes/no. \n")
 
-def _import(path, struct, skiprow, preview):
+def _fill_greeks(data, rate, chunksize):
+    # price the missing greeks, rounded like timeFormatter and kept compact in streaming mode
+    data = data.pipe(fill_greeks, rate = rate).round({f: 2 for f in ('implied_vol',) + greek_fields})
+    if chunksize is not None:
+        data = data.astype({f: 'float32' for f in float32_fields})
+    return data
+
+def _import(path, struct, skiprow, preview, chunksize = None, greeks = False, rate = 0.0):
     # check the imported struct and then import the file by calling _import_file
     cols = list(zip(*struct)) # de-zipped the struct
 
-    if _check_structs(struct, cols): # check if the imported struct fulfils our standard requirements
+    if _check_structs(struct, cols, greeks): # check if the imported struct fulfils our standard requirements
         date_cols = [cols[0].index('date'), cols[0].index('maturity_date')] # find the index of the two columns containing dates
         # find the index of the two columns containing dates
-        data = _import_file(path, names = cols[0], usecols = cols[1], date_cols = date_cols, skiprow = skiprow)
+        data = _import_file(path, names = cols[0], usecols = cols[1], date_cols = date_cols, skiprow = skiprow, chunksize = chunksize)
+        if greeks:
+            data = _fill_greeks(data, rate, chunksize)
         # data['day_to_event'] = pd.to_timedelta(data['day_to_event']).dt.days
         if not preview or (preview & _preview(data)):
             return data
@@ -125,5 +216,10 @@ def _import(path, struct, skiprow, preview):
             print('Data is not correct')
             sys.exit()
 
-def get_data(file_path, struct, skiprow = 1, preview = False):
-    return _import(file_path, struct, skiprow, preview)
+def get_data(file_path, struct, skiprow = 1, preview = False, chunksize = None, greeks = False, rate = 0.0):
+    # chunksize: number of rows per chunk, import the file in streaming mode with compact dtypes if not None
+    #   (categorical call_put / underlying_symbol, float32 greeks, int32 dtm). The dates are not converted
+    #   to int day offsets, they stay datetime64 since every filter compares them with datetimes.
+    # greeks: fill the implied_vol and greeks missing from the file (columns or values) with Black-Scholes, see pricing.py
+    # rate: the continuously compounded rate used to price the greeks
+    return _import(file_path, struct, skiprow, preview, chunksize, greeks, rate)
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+from backtest_main import on, assign_contract_id, _quote_positions
+from tradeStat import calc_exit_price, BUDGET
+
+# Daily mark-to-market of the trades returned by the strategies (e.g. long_call_long_put):
+# every leg is marked on each quote date from its entry date to its exit date, at the price it
+# could be closed at (the same side as the exit price for the given mode). The P&L of a leg on a
+# date is its mark value + entry_price, so on the exit date it is the cash_flow of the leg.
+# The portfolio daily P&L, equity and drawdown are grouped sums over all the leg-days at once.
+
+def _leg_contract_ids(trades, data):
+    # contract_id of each leg, looked up in the contract dictionary of the chain
+    contracts = data[on + ["contract_id"]].drop_duplicates(on)
+    return trades[on].merge(contracts, on = on, how = "left")["contract_id"].values
+
+def mark_to_market(trades, data, mode = "market"):
+    """
+    one row per leg and quote date while the leg is open, with its mark value and cumulative P&L.
+    :params trades: dataframe, the output of a strategy (output_format)
+    :params data: dataframe, the option chain the trades were simulated on
+    :params mode: string, "market" or "mid_price", same as the strategy
+    """
+    data = data if "contract_id" in data else assign_contract_id(data)
+    leg_cid = _leg_contract_ids(trades, data)
+    known = ~np.isnan(leg_cid.astype(float))
+    legs = np.flatnonzero(known)
+
+    i, pos = _quote_positions(leg_cid[legs].astype(np.int64), data["contract_id"].values)
+    legs = legs[i]
+    dates = data["date"].values[pos]
+    held = (dates >= trades["entry_date"].values[legs]) & (dates <= trades["exit_date"].values[legs])
+    legs, pos, dates = legs[held], pos[held], dates[held]
+
+    marks = {
+        "trade_num": trades.index.values[legs],
+        "leg": legs,
+        "date": dates,
+        "ratio": trades["ratio"].values[legs],
+        "contracts": trades["contracts"].values[legs],
+        "entry_price": trades["entry_price"].values[legs],
+        "delta": data["delta"].values[pos] * trades["ratio"].values[legs] * trades["contracts"].values[legs],
+    }
+    for col in ("bid", "ask", "last"):
+        if col in data:
+            marks[f"{col}_exit"] = data[col].values[pos]
+
+    res = pd.DataFrame(marks).pipe(calc_exit_price, mode = mode)
+    res["mark_value"] = res["exit_opt_price"] * res["contracts"]
+    res["pnl"] = res["mark_value"] + res["entry_price"]
+    # a quote without price (e.g. no bid) cannot mark the leg, its previous mark is kept
+    res = res[res["pnl"].notna()].sort_values(["leg", "date"], kind = "mergesort").reset_index(drop = True)
+    # P&L of the day = change of the cumulative P&L of the leg since its previous mark
+    res["daily_pnl"] = res["pnl"] - res.groupby("leg")["pnl"].shift(1).fillna(0)
+    return res
+
+def equity_curve(trades, data, mode = "market", init_balance = BUDGET):
+    """
+    portfolio daily P&L, equity, running max, drawdown and exposure, indexed by date.
+    """
+    marks = mark_to_market(trades, data, mode)
+    marks["abs_mark_value"] = marks["mark_value"].abs()
+    curve = marks.groupby("date").agg(
+        daily_pnl = ("daily_pnl", "sum"),
+        open_trades = ("trade_num", "nunique"),
+        gross_exposure = ("abs_mark_value", "sum"),
+        net_delta = ("delta", "sum"),
+    )
+    curve["equity"] = init_balance + curve["daily_pnl"].cumsum()
+    curve["running_max"] = curve["equity"].cummax().clip(lower = init_balance)
+    curve["drawdown"] = curve["equity"] - curve["running_max"]
+    curve["drawdown_pct"] = curve["drawdown"] / curve["running_max"] * 100
+    return curve.round(2)
+
+def max_drawdown(curve):
+    return curve["drawdown"].min()
@@ -0,0 +1,130 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+
+from backtest_main import assign_contract_id, _ranges
+
+# Event calendar: a table of event dates per category, event and market, joined against one
+# chain loaded once (e.g. load_chain of the whole market) instead of one pre-baked csv per event.
+# event_day / day_to_event are computed for every event from the trading days of the chain:
+#   calendar = calendar_from_files()                  # or make_calendar([...])
+#   windows = event_windows(chain, calendar)          # (event, date, day_to_event) of every event
+#   for i, data in event_chains(chain, calendar):     # the chain of each event, like its csv file
+#       long_call_long_put(data, filters)
+# day_to_event counts calendar days like the event files (event_day - date), or trading days of
+# the chain with trading_days = True (0 on the first trading day on or after the event).
+
+EVENT_ROOT = os.path.join(os.path.abspath(os.path.dirname(__file__)), "data", "event_dateframe")
+BEFORE = 60 # days kept before the event
+AFTER = 70  # days kept after the event
+
+calendar_cols = ["category", "event", "market", "name", "event_day"]
+
+def make_calendar(records):
+    """
+    :params records: list of dicts or tuples (category, event, market, name, event_day)
+    """
+    cal = pd.DataFrame.from_records(records, columns = None if records and isinstance(records[0], dict) else calendar_cols)
+    if not set(calendar_cols) <= set(cal.columns):
+        raise ValueError(f"The calendar needs the columns {calendar_cols}")
+    cal["event_day"] = pd.to_datetime(cal["event_day"])
+    return cal[calendar_cols].sort_values(["event_day", "category", "event", "market"]).reset_index(drop = True)
+
+def calendar_from_files(root = EVENT_ROOT):
+    # calendar of the event files data/event_dateframe/<category>/<event>/<market>/(<market>) 16 MAR 2016 <name>.csv
+    records = []
+    for category in sorted(os.listdir(root)):
+        for event in sorted(os.listdir(os.path.join(root, category))):
+            for market in sorted(os.listdir(os.path.join(root, category, event))):
+                for f in sorted(os.listdir(os.path.join(root, category, event, market))):
+                    m = re.search(r"(\d{1,2} [A-Z]{3} \d{4})\s*(.*)\.csv$", f)
+                    if m:
+                        records.append((category, event, market, m.group(2), pd.to_datetime(m.group(1), format = "%d %b %Y")))
+    return make_calendar(records)
+
+def _day_num(dates):
+    return np.asarray(dates, dtype = "datetime64[D]").astype(np.int64)
+
+def quote_days(chain):
+    # the sorted quote dates of the chain, as day numbers
+    return np.unique(_day_num(chain["date"].values))
+
+def _windows(days, event_days, before, after, by_trading_days):
+    # [start, end) positions in days of the window of each event and the position of the event
+    event_pos = np.searchsorted(days, event_days, side = "left")
+    if by_trading_days:
+        start = np.maximum(event_pos - before, 0)
+        end = np.minimum(event_pos + after + 1, len(days))
+    else:
+        start = np.searchsorted(days, event_days - before, side = "left")
+        end = np.searchsorted(days, event_days + after, side = "right")
+    return start, end, event_pos
+
+def _day_to_event(days, pos, event_days, event_pos, by_trading_days):
+    return event_pos - pos if by_trading_days else event_days - days[pos]
+
+def event_windows(chain, calendar, before = BEFORE, after = AFTER, trading_days = False):
+    """
+    one row per (event, trading day) within [-after, before] days of the event, for all the events at once:
+    the calendar index of the event, date and day_to_event
+    """
+    days = quote_days(chain)
+    event_days = _day_num(calendar["event_day"].values)
+    start, end, event_pos = _windows(days, event_days, before, after, trading_days)
+    counts = np.maximum(end - start, 0)
+    event = np.repeat(np.arange(len(calendar)), counts)
+    pos = np.repeat(start, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return pd.DataFrame({
+        "event_idx": calendar.index.values[event],
+        "date": days[pos].astype("datetime64[D]").astype("datetime64[ns]"),
+        "day_to_event": _day_to_event(days, pos, event_days[event], event_pos[event], trading_days),
+    })
+
+def event_chains(chain, calendar, before = BEFORE, after = AFTER, trading_days = False):
+    """
+    yield (calendar index, chain of the event) for every event of the calendar, the chain of an event
+    holds its quotes within [-after, before] days of the event with the event_day and day_to_event columns.
+    The contract ids are assigned once on the whole chain, so the strategies do not rebuild them per event.
+    """
+    chain = chain if "contract_id" in chain else assign_contract_id(chain)
+    chain = chain.drop(columns = [c for c in ("event_day", "day_to_event") if c in chain])
+    days = quote_days(chain)
+    quote_pos = np.searchsorted(days, _day_num(chain["date"].values))
+    # rows of the chain by date, the rows of a window are a slice of by_date
+    by_date = np.argsort(quote_pos, kind = "mergesort")
+    first_row = np.searchsorted(quote_pos[by_date], np.arange(len(days) + 1))
+
+    event_days = _day_num(calendar["event_day"].values)
+    start, end, event_pos = _windows(days, event_days, before, after, trading_days)
+    # the rows and day_to_event of all the events at once, the rows of each event in the (contract_id, date) order
+    event, pos = _ranges(first_row[start], first_row[np.maximum(end, start)])
+    rows = by_date[pos]
+    order = np.lexsort((rows, event))
+    event, rows = event[order], rows[order]
+    day_to_event = _day_to_event(days, quote_pos[rows], event_days[event], event_pos[event], trading_days)
+    bounds = np.searchsorted(event, np.arange(len(calendar) + 1))
+
+    for i, idx in enumerate(calendar.index):
+        (a, b) = bounds[i], bounds[i + 1]
+        if b <= a:
+            continue
+        yield idx, chain.take(rows[a:b]).assign(
+            event_day = pd.Timestamp(calendar["event_day"].iloc[i]).strftime("%Y-%m-%d"),
+            day_to_event = day_to_event[a:b],
+        ).reset_index(drop = True)
+
+def run_events(chain, calendar, strategy, filters, mode = "market", before = BEFORE, after = AFTER, trading_days = False):
+    """
+    run a strategy of optionStrategies on the chain of every event of the calendar, return the trades
+    of all the events stacked with the calendar columns (see tradeStat.trade_stats(trades, by = calendar_cols))
+    """
+    ledgers = {
+        idx: strategy(data, filters, mode = mode)
+        for idx, data in event_chains(chain, calendar, before, after, trading_days)
+    }
+    ledgers = {idx: trades for idx, trades in ledgers.items() if len(trades)}
+    if not ledgers:
+        return pd.DataFrame(columns = calendar_cols + ["trade_num"])
+    trades = pd.concat(ledgers, names = ["event_idx", "trade_num"]).reset_index()
+    return calendar.loc[trades["event_idx"], calendar_cols].reset_index(drop = True).join(trades.drop(columns = "event_idx"))
@@ -2,6 +2,7 @@ import pandas as pd
 import numpy as np
 from helpers import _process_values, nearest, gte
 from functools import reduce
+from profiler import profiled
 from datetime import datetime, timedelta
 
 dayThres = timedelta(days = 1)
@@ -69,6 +70,53 @@ def end_date(data, date, _idx):
     else:
         raise ValueError("End Dates must of Date type")
 
+# Row Masks
+# row-wise version of the comparison filters, used by the filter compiler in _apply_filters:
+# consecutive comparison filters are evaluated as one combined mask instead of one copy of the frame each.
+cmp_ops = {
+    "less_or_equal": np.less_equal,
+    "less": np.less,
+    "equal": np.equal,
+    "greater_or_equal": np.greater_equal,
+    "greater": np.greater,
+}
+
+def _cmp_mask(data, column, value):
+    return np.asarray(cmp_ops[value["cond"]](data[column], value["value"]))
+
+def _check_date(value):
+    if not isinstance(value["value"], datetime):
+        raise ValueError("Dates must of Date type")
+
+def _check_number(value):
+    if not isinstance(value["value"], (int, float)):
+        raise ValueError("Invalid value passed to the filter")
+
+def start_date_mask(data, date):
+    _check_date(date)
+    if date["cond"] != "greater":
+        raise ValueError("The condition does not make sense")
+    return _cmp_mask(data, "maturity_date", date)
+
+def end_date_mask(data, date):
+    _check_date(date)
+    return _cmp_mask(data, "maturity_date", date)
+
+def day_to_event_mask(data, day_to_event):
+    return _cmp_mask(data, "day_to_event", day_to_event)
+
+def entry_dtm_mask(data, betweenDays):
+    _check_number(betweenDays)
+    return _cmp_mask(data, "dtm", betweenDays)
+
+def entry_day_to_event_mask(data, days):
+    _check_number(days)
+    return _cmp_mask(data, "day_to_event", days)
+
+def entry_realized_vol_mask(data, value):
+    _check_number(value)
+    return _cmp_mask(data, value.get("column", "rv_20"), value)
+
 # Entry Filter
 def contract_size(data, size, _idx):
     """
@@ -87,36 +135,45 @@ def entry_dtm(data, betweenDays, _idx):
     between and including 20 to 55.
     """
     groupby = ["call_put", "maturity_date", "underlying_symbol"]
-    return _process_values(data, "dtm", betweenDays['value'], betweenDays['cond'], groupby = groupby)
+    return _process_values(data, "dtm", betweenDays['value'], betweenDays['cond'], groupby = groupby, tie = betweenDays.get('tie'))
 
 def entry_day_to_event(data, days, _idx):
     
     groupby = ["call_put", "maturity_date", "underlying_symbol"]
-    return _process_values(data, "day_to_event", days['value'], days['cond'], groupby = groupby)
+    return _process_values(data, "day_to_event", days['value'], days['cond'], groupby = groupby, tie = days.get('tie'))
+
+def entry_realized_vol(data, value, _idx):
+    """
+    Realized vol of the underlying on the entry date, e.g. {"value": 0.2, "cond": "less", "column": "rv_60"}.
+    The column ("rv_20" by default) is joined on the chain by volatility.join_realized_vol.
+    """
+    return _process_values(data, value.get("column", "rv_20"), value['value'], value['cond'], groupby = ["date", "underlying_symbol"])
 
 def leg1_delta(data, value, idx):
     """
     Absolute value of a delta of an option.
+    An optional "tie" ("roundup", "rounddown" or "first") picks one of two deltas at the same distance
+    from the value, by default both are kept and deduped by create_spread.
     """
-    return _process_values(data, "delta", value['value'], cond = value['cond']) if idx == 0 else data
+    return _process_values(data, "delta", value['value'], cond = value['cond'], tie = value.get('tie')) if idx == 0 else data
 
 def leg2_delta(data, value, idx):
     """
     Absolute value of a delta of an option.
     """
-    return _process_values(data, "delta", value['value'], cond = value['cond']) if idx == 1 else data
+    return _process_values(data, "delta", value['value'], cond = value['cond'], tie = value.get('tie')) if idx == 1 else data
 
 def leg3_delta(data, value, idx):
     """
     Absolute value of a delta of an option.
     """
-    return _process_values(data, "delta", value['value'], cond = value['cond']) if idx == 2 else data
+    return _process_values(data, "delta", value['value'], cond = value['cond'], tie = value.get('tie')) if idx == 2 else data
 
 def leg4_delta(data, value, idx):
     """
     Absolute value of a delta of an option.
     """
-    return _process_values(data, "delta", value['value'], cond = value['cond']) if idx == 3 else data
+    return _process_values(data, "delta", value['value'], cond = value['cond'], tie = value.get('tie')) if idx == 3 else data
 
 def leg1_strike_pct(data, value, idx):
     """
@@ -163,20 +220,13 @@ def entry_spread_price(data, value, _idx):
 # Exit Filter
 def exit_dtm(data, days, _idx):
     """
-    Exit the trade when the days to day to maturity left is equal to this.
+    Exit the trade when the days to maturity left is equal to this.
     For example, it would exit a trade with 10 days to the date to maturity.
+    None for no condition on the days to maturity, the trade is held to maturity without other exit filter.
     """
-    return data
-    # if days is None:
-    #     #print(data["date_exit"].astype('datetime64[D]').tolist())
-    #     #print(set(abs(data["date_exit"].values - data["maturity_date"].values)))
-    #     # return data[abs(data["date_exit"].astype('datetime64[D]') - data["maturity_date"].astype('datetime64[D]'))< dayThres]
-    #     return data[data["dtm_exit"] < 1]
-    #     # return data[data["date_exit"] == data["maturity_date"]]
-    # else:
-    #     groupby = ["call_put", "maturity_date", "underlying_symbol"]
-    #     return _process_values(data, "dtm_exit", days['value'], cond = days['cond'], groupby=groupby)
-    #     # return nearest(data, "dtm_exit", days, groupby = groupby)
+    if days is None:
+        return data
+    return data[exit_dtm_mask(data, days, column = "dtm_exit")]
 
 def exit_day_to_event(data, day_to_event, _idx):
     """
@@ -186,13 +236,114 @@ def exit_day_to_event(data, day_to_event, _idx):
     # groupby = ["call_put", "maturity_date", "underlying_symbol"]
     # return _process_values(data, "day_to_event_exit", day_to_event["value"], cond = day_to_event["cond"], groupby=groupby)
 
+# Exit Masks
+# used by the exit engine in simulate: evaluated once on the whole chain, the trade exits at the
+# first date after the entry date where all the masks are True for every leg. None means no exit
+# condition, without any the trade is held to maturity. Every exit filter needs a mask.
+mask_ops = {
+    **cmp_ops,
+    "nearest": np.less_equal, # the first quote that reaches the target
+}
+
+def exit_dtm_mask(data, days, column = "dtm"):
+    """
+    Exit at the first quote with the day to maturity <= the value, no condition if None.
+    """
+    if days is None:
+        return None
+    elif days["cond"] in mask_ops:
+        return mask_ops[days["cond"]](data[column].values, days["value"])
+    else:
+        raise ValueError("The condition does not make sense")
+
+def exit_day_to_event_mask(data, day_to_event):
+    """
+    Exit at the first quote with the day to event equal to the value.
+    """
+    return data["day_to_event"].values == day_to_event["value"]
+
+# Path Exit Filters
+# evaluated by simulate on the path of each trade: one row per (trade_num, date) after the entry date,
+# with the columns hold_days, spread_price, pnl_pct, spread_delta and leg1_delta.
+# each returns the rows breaching the exit condition, the trade exits at the first breach.
+def _outside(values, bounds):
+    # bounds = (min, max), None for no bound
+    low, high = bounds
+    out = np.zeros(len(values), dtype = bool)
+    if low is not None:
+        out |= values < low
+    if high is not None:
+        out |= values > high
+    return out
+
+hold_ops = {
+    **cmp_ops,
+    "nearest": np.greater_equal, # the first day the holding reaches the target
+}
+
+def exit_hold_days(path, days, _idx = None):
+    """
+    Exit the trade when the trade was held this many days.
+
+    For example, it would exit a trade when the trade has been held for 20 days,
+    i.e. {"value": 20, "cond": "greater_or_equal"}. Without cond (or with a bare 20) the cond is greater_or_equal.
+    """
+    days = days if isinstance(days, dict) else {"value": days}
+    cond = days.get("cond", "greater_or_equal")
+    if cond not in hold_ops:
+        raise ValueError("The condition does not make sense")
+    return hold_ops[cond](path["hold_days"].values, days["value"])
+
+def exit_leg_1_delta(path, value, _idx = None):
+    """
+    Exit the trade when the delta of leg 1 is below the min or above the max.
+
+    For example, it would exit when the delta of the
+    first leg is below .10 or above .90 delta, i.e. {"value": (0.1, 0.9)}.
+    """
+    return _outside(path["leg1_delta"].values, value["value"])
+
+def exit_profit_loss_pct(path, value, _idx = None):
+    """
+    Take profits and add stop loss to exit trade at these intervals.
+
+    For example, set a stop loss of 50 (-50%) and a profit target at 200 (200%) on a long call,
+    i.e. {"value": (-50, 200)}. Set only a stop loss by leaving profit None.
+    """
+    stop_loss, profit = value["value"]
+    pnl = path["pnl_pct"].values
+    out = np.zeros(len(pnl), dtype = bool)
+    if stop_loss is not None:
+        out |= pnl <= stop_loss
+    if profit is not None:
+        out |= pnl >= profit
+    return out
+
+def exit_spread_delta(path, value, _idx = None):
+    """
+    Exit the trade if the spread total delta exceed the min or max value. For Example;
+
+    spread delta = leg1ratio * leg1delta + leg2ratio * leg2delta
+    """
+    return _outside(path["spread_delta"].values, value["value"])
+
+def exit_spread_price(path, value, _idx = None):
+    """
+    Exit the trade when the trade price falls below the min or rises above the max.
+
+    For example, it would exit if below 0.4 min or above $0.90 max price, i.e. {"value": (0.4, 0.9)}.
+    The trade price is the net price to close all the legs.
+    """
+    return _outside(path["spread_price"].values, value["value"])
+
 func_map = {
-    "start_date": {"func": start_date, "type": "init"},                     # Find the contracts alive after a certain date
-    "end_date": {"func": end_date, "type": "init"},                         # Find the contracts matured before a certain date 
-    "day_to_event": {"func": day_to_event, "type": "entry"},                  
+    "start_date": {"func": start_date, "type": "init", "row_mask": start_date_mask}, # Find the contracts alive after a certain date
+    "end_date": {"func": end_date, "type": "init", "row_mask": end_date_mask}, # Find the contracts matured before a certain date
+    "day_to_event": {"func": day_to_event, "type": "entry", "row_mask": day_to_event_mask},
     "contract_size": {"func": contract_size, "type": "entry"},              # Specify the contract size
-    "entry_dtm": {"func": entry_dtm, "type": "entry"},                      # Search the contracts with day to maturity between x and y
-    "entry_day_to_event": {"func": entry_day_to_event, "type": "entry"},                     
+    "entry_dtm": {"func": entry_dtm, "type": "entry", "row_mask": entry_dtm_mask}, # Search the contracts with day to maturity between x and y
+    "entry_day_to_event": {"func": entry_day_to_event, "type": "entry", "row_mask": entry_day_to_event_mask},
+    "entry_realized_vol": {"func": entry_realized_vol, "type": "entry", "row_mask": entry_realized_vol_mask}, # Realized vol of the underlying, see volatility.realized_vol
     
     # "entry_days": {"func": entry_days, "type": "entry"},                  
     "leg1_delta": {"func": leg1_delta, "type": "entry"},                    # The 1st contract with certain delta
@@ -206,26 +357,54 @@ func_map = {
     "entry_spread_price": {"func": entry_spread_price, "type": "entry_s"},
     # "entry_spread_delta": {"func": entry_spread_delta, "type": "entry_s"},
     # "entry_spread_yield": {"func": entry_spread_yield, "type": "entry_s"},
-    "exit_dtm": {"func": exit_dtm, "type": "exit"},                         # Find the option that has day to maturity <= centain days
-    "exit_day_to_event": {"func": exit_day_to_event, "type": "exit"},
-    # "exit_hold_days": {"func": exit_hold_days, "type": "exit"},
-    # "exit_leg_1_delta": {"func": exit_leg_1_delta, "type": "exit"},
+    "exit_dtm": {"func": exit_dtm, "type": "exit", "mask": exit_dtm_mask},  # Find the option that has day to maturity <= centain days
+    "exit_day_to_event": {"func": exit_day_to_event, "type": "exit", "mask": exit_day_to_event_mask},
+    "exit_hold_days": {"func": exit_hold_days, "type": "exit", "path": True},            # Exit after holding the trade for certain days
+    "exit_leg_1_delta": {"func": exit_leg_1_delta, "type": "exit", "path": True},        # Exit when the delta of the 1st leg leaves the range
     # "exit_leg_1_otm_pct": {"func": exit_leg_1_otm_pct, "type": "exit"},
-    # "exit_profit_loss_pct": {"func": exit_profit_loss_pct, "type": "exit"},
-    # "exit_spread_delta": {"func": exit_spread_delta, "type": "exit_s"},
-    # "exit_spread_price": {"func": exit_spread_price, "type": "exit_s"},
+    "exit_profit_loss_pct": {"func": exit_profit_loss_pct, "type": "exit", "path": True}, # Stop loss / profit target
+    "exit_spread_delta": {"func": exit_spread_delta, "type": "exit_s", "path": True},    # Exit when the spread delta leaves the range
+    "exit_spread_price": {"func": exit_spread_price, "type": "exit_s", "path": True},    # Exit when the spread price leaves the range
     # "exit_strike_diff_pct": {"func": exit_strike_diff_pct, "type": "exit"},
 }
 
+def _is_comparison(value):
+    # the filter value is a plain comparison, i.e. the result of a row does not depend on the other rows
+    return isinstance(value, dict) and value.get("cond") in cmp_ops and not isinstance(value.get("value"), tuple)
+
+def _compile_filters(filters):
+    # split the filters into stages, keeping their order:
+    #   ("mask", [...]): consecutive comparison filters, evaluated as one combined mask
+    #   ("func", [...]): a filter that depends on the other rows (e.g. nearest) or modifies the frame,
+    #                    it runs on the rows surviving the previous stages only
+    stages = []
+    for (k, v) in filters.items():
+        kind = "mask" if "row_mask" in func_map[k] and _is_comparison(v) else "func"
+        if kind == "mask" and stages and stages[-1][0] == "mask":
+            stages[-1][1].append((k, v))
+        else:
+            stages.append((kind, [(k, v)]))
+    return stages
+
+def _apply_stage(data, stage, idx):
+    kind, items = stage
+    if kind == "mask":
+        return data[reduce(np.logical_and, (profiled(func_map[k]["row_mask"], k)(data, v) for (k, v) in items))]
+    else:
+        return reduce(lambda d, kv: profiled(func_map[kv[0]]["func"], kv[0])(d, kv[1], idx), items, data)
+
+def _apply_leg(leg, stages, idx):
+    # sequentially applying the compiled filters
+    return reduce(lambda data, stage: _apply_stage(data, stage, idx), stages, leg)
+
 def _apply_filters(legs, filters):
     if not filters:
         return legs
     else:
-        return [
-            # sequentially applying the filters
-            reduce(lambda data, filter: func_map[filter]['func'](data, filters[filter], idx), filters, leg)
-            for idx, leg in enumerate(legs)
-        ]
+        stages = _compile_filters(filters)
+        if len(legs) == 1:
+            return [_apply_leg(legs[0], stages, 0)]
+        return [profiled(_apply_leg, f"leg{idx + 1}")(leg, stages, idx) for idx, leg in enumerate(legs)]
 #========================================================================================
 # Main function
 #========================================================================================
@@ -266,23 +445,6 @@ def entry_spread_yield(data, value, _idx):
     pass
 
 # Exit Filter
-def exit_hold_days(data, value, _idx):
-    """
-    Exit the trade when the trade was held this many days.
-
-    For example, it would exit a trade when the trade has been held for 20 days.
-    """
-    pass
-
-def exit_leg_1_delta(data, value, idx):
-    """
-    Exit the trade when the delta of leg 1 is below the min or above the max.
-
-    For example, it would exit when the delta of the
-    first leg is below .10 or above .90 delta.
-    """
-    pass
-
 def exit_leg_1_otm_pct(data, value, idx):
     """
     Exit the trade when the strike as a percent of stock price
@@ -293,31 +455,6 @@ def exit_leg_1_otm_pct(data, value, idx):
     """
     pass
 
-def exit_profit_loss_pct(data, value, _idx):
-    """
-    Take profits and add stop loss to exit trade at these intervals.
-
-    For example, set a stop loss of 50 (-50%) and a profit target at 200 (200%) on a long call.
-    Set only a stop loss by leaving profit blank.
-    """
-    pass
-
-def exit_spread_delta(data, value, _idx):
-    """
-    Exit and roll the trade if the spread total delta exceed the min or max value. For Example;
-
-    spread delta = leg1ratio * leg1delta + leg2ratio * leg2delta
-    """
-    pass
-
-def exit_spread_price(data, value, _idx):
-    """
-    Exit the trade when the trade price falls below the min or rises above the max.
-
-    For example, it would exit if below 0.4 min or above $0.90 max price.
-    """
-    pass
-
 def exit_strike_diff_pct(data, value, _idx):
     """
     Exit the trade when the trade price divided by the difference
@@ -327,4 +464,4 @@ def exit_strike_diff_pct(data, value, _idx):
     $1 divided by 5 is below the min of .20 or the price of 4.5
     that is above the max of .90.
     """
-    pass
\ No newline at end of file
+    pass
\ No newline at end of file
@@ -1,14 +1,10 @@
 from data_import import fields
 from definedClass import Period, CallPut
+import numpy as np
 
 def _convert_if_Period(val):
     return val.value if isinstance(val, Period) else val
 
-def _calc_abs_distance(row, column, val, absolute = True):
-    # calculate the absolute distance
-    col = abs(row[column]) if absolute else row[column]
-    return abs(col - _convert_if_Period(val))
-
 def calls(df):
     # return call options from the data frame
     return df[df.call_put.str.lower().str.startswith('c')]
@@ -69,24 +65,52 @@ def between(df, column, start, end, inclusive = True, absolute = False):
     ]
     return result.drop(temp_col, axis=1) if absolute else result
 
-def nearest(df, column, val, groupby = None, absolute = True, tie = "roundup"):
+def _group_codes(df, groupby):
+    # integer code of the group of each row, -1 if any of the group keys is missing
+    return df.groupby(groupby, sort = False, observed = True).ngroup().fillna(-1).values.astype(np.int64)
+
+def _nearest_positions(codes, dist, values, tie = None):
+    # sort-based grouped arg-min: the positions of the rows with the min distance in their group.
+    # tie: None        -> keep all the rows with the min distance
+    #      "roundup"   -> if two values are at the same distance, keep the rows with the larger one
+    #      "rounddown" -> if two values are at the same distance, keep the rows with the smaller one
+    #      "first"     -> if two values are at the same distance, keep the rows with the one seen first
+    if tie in (None, "roundup"):
+        tie_key = -values
+    elif tie == "rounddown":
+        tie_key = values
+    elif tie == "first":
+        tie_key = np.arange(len(values))
+    else:
+        raise ValueError("Invalid tie breaking rule")
+
+    valid = (codes >= 0) & ~np.isnan(dist)
+    order = np.flatnonzero(valid)
+    order = order[np.lexsort((tie_key[order], dist[order], codes[order]))]
+    sorted_codes = codes[order]
+    best = order[np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]] if len(order) else order # best row of each group
+
+    # one extra slot at the end, so that the missing groups (code -1) never match
+    best_dist = np.full((codes.max() + 2) if len(codes) else 1, np.nan)
+    best_dist[codes[best]] = dist[best]
+    keep = valid & (dist == best_dist[codes])
+    if tie is not None:
+        best_val = np.full(len(best_dist), np.nan)
+        best_val[codes[best]] = values[best]
+        keep &= values == best_val[codes]
+    return np.flatnonzero(keep)
+
+def nearest(df, column, val, groupby = None, absolute = True, tie = None):
     # we need to group by unique option columns so that we are
     # getting the min abs dist over multiple sets of option groups
     # instead of the absolute min of the entire data set.
     if groupby is None:
         groupby = ["date", "call_put", "maturity_date", "underlying_symbol"]
 
-    on = groupby + ["abs_dist"]
-
-    data = df.assign(abs_dist = lambda r: _calc_abs_distance(r, column, val, absolute))
-
-    return (
-        data.groupby(groupby)["abs_dist"]
-        .min()
-        .to_frame()
-        .merge(data, on = on)
-        .drop("abs_dist", axis = 1)
-    )
+    values = (abs(df[column]) if absolute else df[column]).values.astype(float)
+    dist = abs(values - _convert_if_Period(val))
+    pos = _nearest_positions(_group_codes(df, groupby), dist, values, tie)
+    return df.iloc[pos].reset_index(drop = True)
 
 cond_map = {
     "less_or_equal": {"func": lte},
@@ -99,12 +123,12 @@ cond_map = {
 }
 
 
-def _process_tuples(data, column, groupby, value):
+def _process_tuples(data, column, groupby, value, tie = None):
     if len(set(value)) == 1:
         return eq(data, column, value[1])
     else:
         # what is the format of the argument 'value'?
-        return data.pipe(nearest, column, value[1], groupby = groupby).pipe(between, column, value[0], value[2], absolute = True)
+        return data.pipe(nearest, column, value[1], groupby = groupby, tie = tie).pipe(between, column, value[0], value[2], absolute = True)
 
 def _process_values_gte(data, column, value, groupby = None, valid_types = (int, float, tuple)):
     if not isinstance(value, valid_types):
@@ -114,10 +138,12 @@ def _process_values_gte(data, column, value, groupby = None, valid_types = (int,
     else:
         return gte(data, column, value)
 
-def _process_values(data, column, value, cond = "nearest", groupby = None, valid_types = (int, float, tuple)):
+def _process_values(data, column, value, cond = "nearest", groupby = None, valid_types = (int, float, tuple), tie = None):
     if not isinstance(value, valid_types):
         raise ValueError("Invalid value passed to the filter")
     elif isinstance(value, tuple):
-        return _process_tuples(data, column, groupby = groupby, value = value)
+        return _process_tuples(data, column, groupby = groupby, value = value, tie = tie)
+    elif cond == "nearest":
+        return nearest(data, column, value, groupby = groupby, tie = tie)
     else:
         return cond_map[cond]['func'](data, column, value, groupby = groupby)
@@ -0,0 +1,108 @@
+import os
+import hashlib
+import pyarrow.feather as feather
+from data_import import get_data
+from backtest_main import assign_contract_id
+
+# Disk cache of the normalised frames returned by data_import.get_data.
+# An entry is keyed by the content hash of the source file together with the struct,
+# skiprow, chunksize and greeks options used for the import, so a modified csv never hits a stale entry.
+# With contract_ids, the entry is the frame with its contract ids (backtest_main.assign_contract_id),
+# so the strategies run on a cached frame do not build them again.
+# Entries are stored as uncompressed feather files, which are read back into a frame without
+# parsing or decompression. The least recently used entries are evicted when the cache grows above
+# max_bytes. The cache directory can be shared by the workers of sample_run.mass_get_data_parallel:
+# an entry evicted by another process while it is looked up is imported again, as a miss.
+
+CACHE_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), "data", ".import_cache")
+CACHE_MAX_BYTES = 4 * 1024 ** 3 # 4GB
+BLOCK_SIZE = 1024 ** 2 # read the source file 1MB at a time when hashing
+
+cache_stats = {"hits": 0, "misses": 0, "evictions": 0} # counted per process, see sample_run.mass_get_data_parallel
+
+def _file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _cache_key(path, struct, skiprow, chunksize, greeks = False, rate = 0.0, contract_ids = False):
+    key = f"{_file_hash(path)}|{tuple(struct)!r}|{skiprow}|{chunksize}"
+    if greeks:
+        key += f"|greeks|{rate!r}"
+    if contract_ids:
+        key += "|contract_id"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+def _cache_file(cache_dir, key):
+    return os.path.join(cache_dir, f"{key}.feather")
+
+def _cache_entries(cache_dir):
+    # (last used time, size, path) of every entry, the mtime is touched on every hit
+    entries = []
+    for f in os.listdir(cache_dir):
+        if f.endswith(".feather"):
+            try:
+                st = os.stat(os.path.join(cache_dir, f))
+            except FileNotFoundError:
+                continue # evicted by another process
+            entries.append((st.st_mtime, st.st_size, os.path.join(cache_dir, f)))
+    return sorted(entries)
+
+def _evict(cache_dir, max_bytes):
+    # drop the least recently used entries until the cache fits in max_bytes
+    entries = _cache_entries(cache_dir)
+    total = sum(e[1] for e in entries)
+    for _mtime, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            cache_stats["evictions"] += 1
+        except FileNotFoundError:
+            pass # evicted by another process
+        total -= size
+
+def _read(file):
+    # the cached frame, None if the entry is missing (or was just evicted by another process)
+    try:
+        os.utime(file) # mark as recently used
+        return feather.read_feather(file)
+    except FileNotFoundError:
+        return None
+
+def _write(data, file):
+    # write to a temporary file first so that a crashed write never leaves a corrupted entry
+    tmp = f"{file}.{os.getpid()}.tmp"
+    feather.write_feather(data.reset_index(drop = True), tmp, compression = "uncompressed")
+    os.replace(tmp, file)
+
+def get_cached_data(file_path, struct, skiprow = 1, chunksize = None, greeks = False, rate = 0.0, cache_dir = CACHE_DIR, max_bytes = CACHE_MAX_BYTES, contract_ids = False):
+    """
+    same as data_import.get_data, but the normalised frame is served from the import cache
+    if the same file content was already imported with the same struct.
+    :params contract_ids: bool, return the frame of backtest_main.assign_contract_id, assigned once on import
+    """
+    os.makedirs(cache_dir, exist_ok = True)
+    file = _cache_file(cache_dir, _cache_key(file_path, struct, skiprow, chunksize, greeks, rate, contract_ids))
+
+    data = _read(file)
+    if data is not None:
+        cache_stats["hits"] += 1
+        return data
+
+    cache_stats["misses"] += 1
+    data = get_data(file_path, struct, skiprow = skiprow, preview = False, chunksize = chunksize, greeks = greeks, rate = rate)
+    if contract_ids:
+        data = assign_contract_id(data)
+    _write(data, file)
+    _evict(cache_dir, max_bytes)
+    return data
+
+def clear_cache(cache_dir = CACHE_DIR):
+    for _mtime, _size, path in _cache_entries(cache_dir):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
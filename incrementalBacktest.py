@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+from optionStrategies import _prepare_filters
+from backtest_main import (
+    on, create_spread, _exit_mask, _exit_keys, _has_exit_masks, _split_path_filters, _exit_positions, _gather_quotes, _close_legs,
+    _number_trades, output_format,
+)
+from filters import filter_data
+
+# Incremental backtest: the state keeps the contract dictionary, the legs still open and the
+# closed trades, so that appending the quotes of a new trading day only opens the entries of that
+# day and looks for the exits of the open legs in the new quotes, instead of re-running the
+# whole history through create_spread and simulate.
+#
+#   state = init_state([(CallPut.CALL, 1), (CallPut.PUT, 1)], filters, mode = "mid_price")
+#   state = update(state, history)         # first run, same as the full backtest
+#   state = update(state, today_quotes)    # every evening
+#   trades(state)                          # same output as long_call_long_put(...)
+#
+# All the legs of a trade exit on the same date, like simulate, so the open legs keep the number of
+# their trade in their index. Without exit filters the trades are held to maturity.
+#
+# NOTE: the entry filters must only compare the quotes of the same date (e.g. entry_dtm "greater",
+# leg1_delta "nearest"), a nearest entry_dtm looks across dates and can change with the new days.
+
+def init_state(legs, filters, mode = "market"):
+    f = _prepare_filters(filters)
+    path_filters, exit_fil, _ = _split_path_filters(f[2], f[4])
+    if path_filters:
+        raise ValueError(f"The incremental backtest does not support the path dependent exit filters {list(path_filters)}")
+    if not _has_exit_masks(exit_fil):
+        raise ValueError("The incremental backtest only supports exit filters with a mask")
+    return {
+        "legs": legs,
+        "filters": f,
+        "mode": mode,
+        "last_date": None,
+        "contracts": None, # on + contract_id, ids are never reassigned
+        "trades": 0,       # number of trades opened so far
+        "open": None,      # legs of the open trades, as returned by create_spread, indexed by trade
+        "closed": None,    # exited legs, in output_format
+        "expired": None,   # legs expired without exit date, dropped from the trades like simulate does
+    }
+
+def _assign_ids(state, quotes):
+    # look up the contract_id of the new quotes, new contracts get the next ids
+    keys = quotes[on].drop_duplicates()
+    contracts = state["contracts"] if state["contracts"] is not None else keys.iloc[:0].assign(contract_id = 0)
+
+    new = keys.merge(contracts, on = on, how = "left", indicator = True)
+    new = new[new["_merge"] == "left_only"][on]
+    new = new.assign(contract_id = np.arange(len(contracts), len(contracts) + len(new)))
+    state["contracts"] = pd.concat([contracts, new], ignore_index = True)
+
+    return (
+        quotes.merge(state["contracts"], on = on, how = "left")
+        .sort_values(["contract_id", "date"], kind = "mergesort")
+        .reset_index(drop = True)
+    )
+
+def _concat(*frames, ignore_index = True):
+    frames = [f for f in frames if f is not None]
+    return pd.concat(frames, ignore_index = ignore_index) if frames else None
+
+def update(state, quotes):
+    """
+    append the quotes after state["last_date"]: open the new entries and close the open trades
+    at their first exit date.
+    return the updated state.
+    """
+    if state["last_date"] is not None:
+        quotes = quotes[quotes["date"] > state["last_date"]]
+    if quotes.empty:
+        return state
+
+    init_fil, entry_fil, exit_fil, entry_s_fil, exit_s_fil = state["filters"]
+    chain = _assign_ids(state, quotes)
+
+    # 1. open the entries of the new days, numbered after the trades already opened
+    spreads = (
+        filter_data(chain, init_fil)
+        .pipe(create_spread, state["legs"], entry_fil, entry_s_fil, state["mode"])
+    )
+    if len(spreads):
+        spreads.index = spreads.index + state["trades"]
+        state["trades"] = spreads.index.max() + 1
+    open_legs = _concat(state["open"], spreads, ignore_index = False)
+
+    # 2. first exit date of the open trades in the new days
+    legs, pos = _exit_positions(open_legs, _exit_keys(chain, _exit_mask(chain, exit_fil)))
+    closed = _gather_quotes(open_legs, chain, legs, pos).pipe(_close_legs, exit_s_fil, state["mode"])[output_format]
+
+    # 3. the legs not closed stay open, until they expire without exit (no quote can come after the maturity date)
+    last_date = chain["date"].max()
+    expired = open_legs["maturity_date"].values <= last_date
+    still_open = np.ones(len(open_legs), dtype = bool)
+    still_open[legs] = False
+    state["expired"] = _concat(state["expired"], open_legs[still_open & expired])
+    state["open"] = open_legs[still_open & ~expired]
+    state["closed"] = _concat(state["closed"], closed)
+    state["last_date"] = last_date
+    return state
+
+def trades(state):
+    # the closed trades numbered like simulate
+    if state["closed"] is None:
+        return pd.DataFrame(columns = output_format)
+    return _number_trades(state["closed"])
+
+def open_trades(state):
+    return state["open"]
+
+def expired_legs(state):
+    # the legs that expired without exit date, simulate drops them from the trades
+    return state["expired"]
+
+def save_state(state, path):
+    pd.to_pickle(state, path)
+
+def load_state(path):
+    return pd.read_pickle(path)
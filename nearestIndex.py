@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+from helpers import _group_codes, _convert_if_Period
+
+# Index to answer helpers.nearest for many target values at once, e.g. a sweep of leg1_delta
+# targets (0.10, 0.15, ..., 0.50). The values of every (date, call_put, maturity_date, underlying_symbol)
+# slice are sorted once, then all the (slice, target) pairs are located with one batched searchsorted.
+# For each target the result is the same as nearest(df, column, target, groupby, tie = tie).
+
+def _expand_ranges(start, end):
+    # concatenation of the ranges [start, end) and the index of the range of each element
+    counts = end - start
+    idx = np.repeat(np.arange(len(start)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return idx, np.repeat(start, counts) + offsets
+
+def build_nearest_index(df, values, groupby = None):
+    """
+    :params df: dataframe, the option chain (or the leg)
+    :params values: array, the value of each row of df to search, e.g. abs(delta) or strike percentage
+    :params groupby: list, the columns of a slice, default = ["date", "call_put", "maturity_date", "underlying_symbol"]
+    """
+    if groupby is None:
+        groupby = ["date", "call_put", "maturity_date", "underlying_symbol"]
+
+    codes = _group_codes(df, groupby)
+    values = np.asarray(values, dtype = float)
+    rows = np.flatnonzero((codes >= 0) & ~np.isnan(values))
+
+    # (slice code, rank of the value) as one exact integer key
+    levels = np.unique(values[rows])
+    n = len(levels) + 1
+    key = codes[rows] * n + np.searchsorted(levels, values[rows])
+    order = np.argsort(key, kind = "mergesort") # stable, rows of the same value stay in their original order
+    rows, key = rows[order], key[order]
+
+    # distinct values of each slice and the rows holding them
+    ukey, ustart = np.unique(key, return_index = True)
+    uend = np.r_[ustart[1:], len(key)].astype(ustart.dtype)
+    ucode = ukey // n
+    slices, sstart = np.unique(ucode, return_index = True)
+    send = np.r_[sstart[1:], len(ucode)].astype(sstart.dtype)
+
+    return {
+        "rows": rows,
+        "levels": levels,
+        "n": n,
+        "ukey": ukey,
+        "uvalue": levels[ukey % n],
+        "ustart": ustart,
+        "uend": uend,
+        "slices": slices,
+        "sstart": sstart,
+        "send": send,
+    }
+
+def _pick(index, s, t, tie):
+    # distinct value picked for each (slice, target) pair: the one above or below the target, or both on ties
+    uvalue = index["uvalue"]
+    lo = np.searchsorted(index["ukey"], index["slices"][s] * index["n"] + np.searchsorted(index["levels"], t, side = "left"), side = "left")
+    up = np.minimum(lo, len(uvalue) - 1)
+    down = np.maximum(lo - 1, 0)
+    d_up = np.where(lo < index["send"][s], abs(uvalue[up] - t), np.inf)
+    d_down = np.where(lo - 1 >= index["sstart"][s], abs(uvalue[down] - t), np.inf)
+
+    tied = d_up == d_down
+    if tie is None:
+        use_up, use_down = d_up <= d_down, d_down <= d_up
+    elif tie == "roundup":
+        use_up = d_up <= d_down
+        use_down = ~use_up
+    elif tie == "rounddown":
+        use_down = d_down <= d_up
+        use_up = ~use_down
+    elif tie == "first":
+        up_first = index["rows"][index["ustart"][up]] < index["rows"][index["ustart"][down]]
+        use_up = (d_up < d_down) | (tied & up_first)
+        use_down = ~use_up
+    else:
+        raise ValueError("Invalid tie breaking rule")
+
+    pair = np.r_[np.flatnonzero(use_up), np.flatnonzero(use_down)]
+    return pair, np.r_[up[use_up], down[use_down]]
+
+def query_nearest(df, index, targets, tie = None):
+    """
+    rows of df nearest to each of the targets in their slice, with a column 'target'.
+    the rows of each target are in the original order of df.
+    """
+    targets = np.asarray([_convert_if_Period(t) for t in targets], dtype = float)
+    s = np.repeat(np.arange(len(index["slices"])), len(targets))
+    k = np.tile(np.arange(len(targets)), len(index["slices"]))
+
+    pair, u = _pick(index, s, targets[k], tie)
+    i, pos = _expand_ranges(index["ustart"][u], index["uend"][u])
+    rows = index["rows"][pos]
+    target_idx = k[pair][i]
+
+    order = np.lexsort((rows, target_idx))
+    return (
+        df.iloc[rows[order]]
+        .assign(target = targets[target_idx[order]])
+        .reset_index(drop = True)
+    )
+
+def delta_values(df):
+    # the value searched by the leg delta filters
+    return abs(df["delta"]).values
+
+def strike_pct_values(df):
+    # the value searched by the leg strike percentage filters
+    return (df["strike"] / df["underlying_price"]).round(2).values
+
+def nearest_many(df, column, targets, groupby = None, absolute = True, tie = None):
+    # helpers.nearest for a vector of targets, one index build for all of them
+    values = abs(df[column]) if absolute else df[column]
+    return query_nearest(df, build_nearest_index(df, values, groupby), targets, tie = tie)
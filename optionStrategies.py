@@ -1,6 +1,9 @@
+import numpy as np
+
 from definedClass import CallPut
-from backtest_main import create_spread, simulate
-from filters import filter_data, func_map
+from backtest_main import create_spread, simulate, assign_contract_id, _prepare_exits, _run_exits
+from filters import filter_data, func_map, _is_comparison
+from profiler import profiled
 
 default_entry_filters = {
     "contract_size": 10,
@@ -17,13 +20,65 @@ def _prepare_filters(fil):
     exit_fil = {k: v for (k, v) in f.items() if func_map[k]["type"] == "exit"}
     return init_fil, entry_fil, exit_fil, entry_s_fil, exit_s_fil
 
-def _process_legs(data, legs, fil, mode):
+# entry filters comparing the quotes of different dates, unless they are plain comparisons (e.g. a nearest entry_dtm)
+cross_date_filters = ("entry_dtm", "entry_day_to_event")
+
+def _by_entry_date(entry_fil):
+    # the spreads entered on a date only depend on the quotes of that date
+    return all(_is_comparison(v) for (k, v) in entry_fil.items() if k in cross_date_filters)
+
+def _stream_legs(data, legs, f, mode, strike_order, batch_days):
+    """
+    generator of the trades of the legs, batch_days quote dates at a time, see streaming.stream_trades.
+    the spreads are created from the quotes of the batch only, unless an entry filter compares the
+    quotes of different dates, then they are created once and only the exits run per batch.
+    the exit mask of the chain is computed once, each batch only searches the exits of its spreads.
+    """
+    if batch_days < 1:
+        raise ValueError("batch_days must be at least 1")
+    init_fil, entry_fil, exit_fil, entry_s_fil, exit_s_fil = f
+    if not data["contract_id"].is_monotonic_increasing:
+        # sorted once, the spreads of the batches are created from the sorted chain too
+        data = data.sort_values(["contract_id", "date"], kind = "mergesort")
+    # the exit mask and search keys of the chain, computed once for all the batches
+    exits = profiled(_prepare_exits)(data, exit_fil, exit_s_fil)
+
+    days = data["date"].values
+    dates = np.unique(days)
+    spreads = None
+    if not _by_entry_date(entry_fil):
+        spreads = profiled(create_spread)(profiled(filter_data, "init_filters")(data, init_fil), legs, entry_fil, entry_s_fil, mode, strike_order)
+        days = spreads["date"].values
 
+    first = 0 # trade_num of the first trade of the batch
+    for start in range(0, len(dates), batch_days):
+        rows = np.flatnonzero((days >= dates[start]) & (days <= dates[min(start + batch_days, len(dates)) - 1]))
+        if spreads is None:
+            batch = profiled(filter_data, "init_filters")(data.iloc[rows], init_fil)
+            batch = profiled(create_spread)(batch, legs, entry_fil, entry_s_fil, mode, strike_order) if len(batch) else batch
+        else:
+            batch = spreads.iloc[rows]
+        if not len(batch):
+            continue
+        trades = profiled(_run_exits, "simulate")(batch, exits, mode)
+        if len(trades):
+            trades.index = trades.index + first
+            first = trades.index.max() + 1
+            yield trades
+
+def _process_legs(data, legs, fil, mode, strike_order = None, batch_days = None):
+    """
+    :params batch_days: int, return a generator of the trades by batch of batch_days entry dates
+        instead of a dataframe (see streaming.stream_trades), None for the whole run at once
+    """
     f = _prepare_filters(fil)
+    data = data if "contract_id" in data else assign_contract_id(data)
+    if batch_days is not None:
+        return _stream_legs(data, legs, f, mode, strike_order, batch_days)
     return (
-        data.pipe(filter_data, f[0])
-        .pipe(create_spread, legs, f[1], f[3], mode)
-        .pipe(simulate, data, f[2], f[4], mode)
+        data.pipe(profiled(filter_data, "init_filters"), f[0])
+        .pipe(profiled(create_spread), legs, f[1], f[3], mode, strike_order)
+        .pipe(profiled(simulate), data, f[2], f[4], mode)
     )
 
 def long_call(data, filters, mode = "market"):
@@ -54,3 +109,53 @@ def short_call_short_put(data, filters, mode = "market"):
     legs = [(CallPut.CALL, -1), (CallPut.PUT, -1)]
     return _process_legs(data, legs, filters, mode)
 
+# Vertical spreads: the legs are numbered from 0 in the strike order, e.g. [(0, "<", 1)]
+def long_call_spread(data, filters, mode = "market"):
+    # bull call spread, debit: long the lower strike call, short the higher strike call
+    legs = [(CallPut.CALL, 1), (CallPut.CALL, -1)]
+    return _process_legs(data, legs, filters, mode, strike_order = [(0, "<", 1)])
+
+def short_call_spread(data, filters, mode = "market"):
+    # bear call spread, credit: short the lower strike call, long the higher strike call
+    legs = [(CallPut.CALL, -1), (CallPut.CALL, 1)]
+    return _process_legs(data, legs, filters, mode, strike_order = [(0, "<", 1)])
+
+def long_put_spread(data, filters, mode = "market"):
+    # bear put spread, debit: long the higher strike put, short the lower strike put
+    legs = [(CallPut.PUT, 1), (CallPut.PUT, -1)]
+    return _process_legs(data, legs, filters, mode, strike_order = [(1, "<", 0)])
+
+def short_put_spread(data, filters, mode = "market"):
+    # bull put spread, credit: short the higher strike put, long the lower strike put
+    legs = [(CallPut.PUT, -1), (CallPut.PUT, 1)]
+    return _process_legs(data, legs, filters, mode, strike_order = [(1, "<", 0)])
+
+# Iron condors and butterflies, legs from the lowest strike: put wing, put body, call body, call wing.
+# Every leg needs a selection filter (legN_delta or legN_strike_pct), the bodies of the butterflies
+# are at the money (delta nearest 0.5) unless leg2 / leg3 filters are given.
+atm_body_filters = {
+    "leg2_delta": {"value": 0.5, "cond": "nearest"},
+    "leg3_delta": {"value": 0.5, "cond": "nearest"},
+}
+
+def _with_atm_body(filters):
+    if any(k in filters for k in ("leg2_delta", "leg2_strike_pct", "leg3_delta", "leg3_strike_pct")):
+        return filters
+    return {**filters, **atm_body_filters}
+
+def short_iron_condor(data, filters, mode = "market"):
+    legs = [(CallPut.PUT, 1), (CallPut.PUT, -1), (CallPut.CALL, -1), (CallPut.CALL, 1)]
+    return _process_legs(data, legs, filters, mode, strike_order = [(0, "<", 1), (1, "<", 2), (2, "<", 3)])
+
+def long_iron_condor(data, filters, mode = "market"):
+    legs = [(CallPut.PUT, -1), (CallPut.PUT, 1), (CallPut.CALL, 1), (CallPut.CALL, -1)]
+    return _process_legs(data, legs, filters, mode, strike_order = [(0, "<", 1), (1, "<", 2), (2, "<", 3)])
+
+def short_iron_butterfly(data, filters, mode = "market"):
+    # the put and call bodies share the same strike
+    legs = [(CallPut.PUT, 1), (CallPut.PUT, -1), (CallPut.CALL, -1), (CallPut.CALL, 1)]
+    return _process_legs(data, legs, _with_atm_body(filters), mode, strike_order = [(0, "<", 1), (1, "==", 2), (2, "<", 3)])
+
+def long_iron_butterfly(data, filters, mode = "market"):
+    legs = [(CallPut.PUT, -1), (CallPut.PUT, 1), (CallPut.CALL, 1), (CallPut.CALL, -1)]
+    return _process_legs(data, legs, _with_atm_body(filters), mode, strike_order = [(0, "<", 1), (1, "==", 2), (2, "<", 3)])
@@ -0,0 +1,71 @@
+import pandas as pd
+
+from backtest_main import output_format, _number_trades
+from chainStore import load_chain, chain_maturities, pushdown_filters
+
+# Out-of-core backtest: a trade never spans more than one maturity_date, so the chain can be split
+# by (underlying_symbol, maturity) and each partition backtested on its own:
+#   trades = run_partitioned("data/SPX.parquet", long_call_long_put, filters, mode = "mid_price", by = "month")
+# A chain store partition (chainStore.store_chain) is loaded only when it is run, with the maturity
+# range pushed down to the parquet reader, so the peak memory is set by the largest partition.
+# The trades of the partitions are renumbered at the end, giving the trade_num of a single run.
+#
+# NOTE: only the filters comparing the quotes of one maturity are exact per partition, which is
+# the case of every filter of func_map (nearest entry_dtm, leg deltas... group by maturity_date).
+
+partition_by = {
+    "maturity": lambda m: m.dt.strftime("%Y-%m-%d"), # one partition per maturity_date
+    "month": lambda m: m.dt.strftime("%Y-%m"),       # the maturities of a month together
+}
+
+def _partition_keys(maturities, by):
+    # (underlying_symbol, first maturity, last maturity) of each partition
+    if by not in partition_by:
+        raise ValueError(f"Unknown partitioning: {by}, must be one of {list(partition_by)}")
+    m = maturities.assign(part = lambda x: partition_by[by](x["maturity_date"]))
+    keys = m.groupby(["underlying_symbol", "part"], sort = True, observed = True)["maturity_date"].agg(["min", "max"])
+    return [(sym, lo, hi) for ((sym, _part), lo, hi) in keys.itertuples(name = None)]
+
+def _store_partitions(root, filters, by, underlying_symbol):
+    pushed = {k: v for (k, v) in filters.items() if k in pushdown_filters}
+    for (sym, lo, hi) in _partition_keys(chain_maturities(root, pushed, underlying_symbol), by):
+        # not bound to a local name, so that the previous partition is freed before the next one is loaded
+        yield load_chain(root, pushed, sym, maturities = (lo, hi))
+
+def _frame_partitions(data, by, underlying_symbol):
+    if underlying_symbol is not None:
+        symbols = [underlying_symbol] if isinstance(underlying_symbol, str) else list(underlying_symbol)
+        data = data[data["underlying_symbol"].isin(symbols)]
+    if by not in partition_by:
+        raise ValueError(f"Unknown partitioning: {by}, must be one of {list(partition_by)}")
+    for _key, part in data.groupby([data["underlying_symbol"], partition_by[by](data["maturity_date"])], sort = True, observed = True):
+        yield part
+
+def partitions(source, filters = None, by = "maturity", underlying_symbol = None):
+    """
+    yield the chain of each (underlying_symbol, maturity) partition of the source
+    :params source: string, the root of a chain store, or a dataframe (the chain is already in memory)
+    :params by: "maturity" (one partition per maturity_date) or "month" (per maturity month)
+    """
+    filters = {} if filters is None else filters
+    if isinstance(source, str):
+        return _store_partitions(source, filters, by, underlying_symbol)
+    return _frame_partitions(source, by, underlying_symbol)
+
+def stitch_trades(ledgers):
+    # the trades of the partitions numbered like one run over the whole chain
+    ledgers = [t.reset_index(drop = True) for t in ledgers if len(t)]
+    if not ledgers:
+        return pd.DataFrame(columns = output_format)
+    return _number_trades(pd.concat(ledgers, ignore_index = True))
+
+def run_partitioned(source, strategy, filters, mode = "market", by = "maturity", underlying_symbol = None):
+    """
+    run a strategy of optionStrategies (e.g. long_call_long_put) partition by partition, return the trades
+    of the whole chain. see partitions for source and by.
+    """
+    ledgers = []
+    for data in partitions(source, filters, by, underlying_symbol):
+        ledgers.append(strategy(data, filters, mode = mode))
+        del data
+    return stitch_trades(ledgers)
@@ -0,0 +1,183 @@
+import pandas as pd
+from itertools import product
+from concurrent.futures import ProcessPoolExecutor
+
+from optionStrategies import _prepare_filters
+from backtest_main import simulate, assign_contract_id, _create_legs, _spread_of_legs, _unselected_legs
+from filters import filter_data, _apply_filters
+from nearestIndex import nearest_many, strike_pct_values
+from sharedChain import publish_chain, release_chain, attach_chain
+from tradeStat import results, empty_summary
+
+# Run a strategy over a grid of filters, e.g.
+#   grid = {
+#       "entry_dtm": [{"value": 7, "cond": "greater"}, {"value": 14, "cond": "greater"}],
+#       "leg1_delta": [{"value": d, "cond": "nearest"} for d in (0.3, 0.4, 0.5)],
+#       "exit_day_to_event": [{"value": -1, "cond": "nearest"}, {"value": 0, "cond": "nearest"}],
+#   }
+# The grid points are arranged as a tree of their init / entry / exit filters, so that the init
+# filtering runs once per distinct init filters and the entry filters before the leg selection
+# (entry_dtm, day_to_event...) once per distinct prefix. The leg selections (legN_delta, legN_strike_pct)
+# of all the points of a prefix are then made at once with nearestIndex.nearest_many, one call per leg
+# and filter instead of one nearest per point, and only simulate runs for every grid point.
+# The prefix groups are fanned out to a process pool.
+
+def _grid_points(grid):
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in product(*(grid[k] for k in keys))]
+
+def _key(*fils):
+    return repr([list(f.items()) for f in fils])
+
+def _param_value(v):
+    # value of a grid parameter shown in the result frame
+    return v["value"] if isinstance(v, dict) else v
+
+def _summary(trades, stats):
+    return results(trades, **stats)[0] if len(trades) else dict(empty_summary)
+
+# leg selection filter -> (leg index, searched column)
+leg_selection = {
+    f"leg{n + 1}_{kind}": (n, column)
+    for n in range(4)
+    for (kind, column) in (("delta", "delta"), ("strike_pct", "strike_pct"))
+}
+
+def _split_entry(entry_fil):
+    # (prefix, selection): the entry filters before the first leg selection filter and the others
+    keys = list(entry_fil)
+    first = next((i for (i, k) in enumerate(keys) if k in leg_selection), len(keys))
+    return {k: entry_fil[k] for k in keys[:first]}, {k: entry_fil[k] for k in keys[first:]}
+
+def _filter_tree(points, filters):
+    # {init key: (init filters, {prefix key: (prefix filters, {entry key: (selection filters, entry spread filters,
+    #     {exit key: (exit filters, exit spread filters, [grid point])})})})}
+    tree = {}
+    for i, point in enumerate(points):
+        init_fil, entry_fil, exit_fil, entry_s_fil, exit_s_fil = _prepare_filters({**filters, **point})
+        prefix_fil, select_fil = _split_entry(entry_fil)
+        prefixes = tree.setdefault(_key(init_fil), (init_fil, {}))[1]
+        entries = prefixes.setdefault(_key(prefix_fil), (prefix_fil, {}))[1]
+        exits = entries.setdefault(_key(select_fil, entry_s_fil), (select_fil, entry_s_fil, {}))[2]
+        exits.setdefault(_key(exit_fil, exit_s_fil), (exit_fil, exit_s_fil, []))[2].append(i)
+    return tree
+
+def _selection(k, v):
+    # (target, tie) of a nearest leg selection of a single value, None otherwise.
+    # the strike_pct filters take the value itself and always select the nearest
+    if leg_selection[k][1] == "strike_pct":
+        return (float(v), None) if isinstance(v, (int, float)) else None
+    if isinstance(v, dict) and v.get("cond") == "nearest" and isinstance(v.get("value"), (int, float)):
+        return (float(v["value"]), v.get("tie"))
+    return None
+
+def _is_batched(select_fil):
+    # only nearest selections of single values, at most one per leg, are made for all the points at once
+    # (two selections of one leg depend on each other, the other filters depend on the selected rows)
+    legs = [leg_selection[k][0] for k in select_fil if k in leg_selection]
+    return (
+        len(legs) == len(select_fil) == len(set(legs))
+        and all(_selection(k, v) is not None for (k, v) in select_fil.items())
+    )
+
+def _select_legs(legs, selections):
+    """
+    the legs of every selection, each leg selection made for all the targets with one nearest_many
+    :params legs: list, the legs after the prefix filters
+    :params selections: list of the selection filters (_is_batched) of the points
+    """
+    targets = {}
+    for select_fil in selections:
+        for (k, v) in select_fil.items():
+            (target, tie) = _selection(k, v)
+            targets.setdefault((k, tie), set()).add(target)
+
+    picked = {}
+    for ((k, tie), values) in targets.items():
+        idx, column = leg_selection[k]
+        leg = legs[idx].assign(strike_pct = strike_pct_values(legs[idx])) if column == "strike_pct" else legs[idx]
+        rows = nearest_many(leg, column, sorted(values), tie = tie)
+        picked.update({
+            (k, tie, t): g.drop(columns = "target").reset_index(drop = True)
+            for (t, g) in rows.groupby("target", sort = False)
+        })
+
+    out = []
+    for select_fil in selections:
+        selected = list(legs)
+        for (k, v) in select_fil.items():
+            idx = leg_selection[k][0]
+            (target, tie) = _selection(k, v)
+            selected[idx] = picked.get((k, tie, target), legs[idx].iloc[:0])
+        out.append(selected)
+    return out
+
+def _run_prefix(data, legs, prefix_fil, entries, mode, stats, strike_order = None):
+    # the prefix filters once for all the entries sharing them, then the leg selections and create_spread per entry
+    legs = _apply_filters([_create_legs(data, leg, idx) for (idx, leg) in enumerate(legs)], prefix_fil)
+    batched = [i for (i, e) in enumerate(entries) if _is_batched(e[0])]
+    selected = dict(zip(batched, _select_legs(legs, [entries[i][0] for i in batched])))
+
+    out = {}
+    for (n, (select_fil, entry_s_fil, exits)) in enumerate(entries):
+        if n in selected:
+            spreads = _spread_of_legs(selected[n], {}, entry_s_fil, mode, strike_order)
+        else:
+            spreads = _spread_of_legs(legs, select_fil, entry_s_fil, mode, strike_order)
+        for (exit_fil, exit_s_fil, point_ids) in exits:
+            summary = _summary(simulate(spreads, data, exit_fil, exit_s_fil, mode), stats)
+            out.update({i: summary for i in point_ids})
+    return out
+
+def _run_prefix_shared(handle, *args):
+    return _run_prefix(attach_chain(handle), *args)
+
+def _run_entries(chain, tasks, workers):
+    if workers == 1:
+        return [_run_prefix(chain, *t) for t in tasks]
+
+    handle, blocks = publish_chain(chain)
+    try:
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            futures = [pool.submit(_run_prefix_shared, handle, *t) for t in tasks]
+            return [f.result() for f in futures]
+    finally:
+        release_chain(blocks)
+
+def sweep(data, legs, grid, filters = None, mode = "market", workers = None, strike_order = None, **stats):
+    """
+    :params data: dataframe, the option chain
+    :params legs: list, the legs of the strategy, e.g. [(CallPut.CALL, 1), (CallPut.PUT, 1)] for a long straddle
+    :params grid: dict, filter name -> list of values to test
+    :params filters: dict, the filters shared by all the grid points
+    :params workers: int, number of worker processes, 1 runs everything in this process
+    :params strike_order: list, the strike constraints of the legs, see backtest_main.create_spread
+        (e.g. [(0, "<", 1)] for the call spreads of optionStrategies)
+    :params stats: init_balance, t_cost, num_option passed to tradeStat.results
+    return a dataframe with one row per grid point: the grid values and the trade stats
+    """
+    filters = {} if filters is None else filters
+    points = _grid_points(grid)
+    if strike_order is not None or len(legs) > 2:
+        # the legs are joined like create_spread, every leg needs a selection filter
+        missing = sorted({n for point in points for n in _unselected_legs(len(legs), {**filters, **point})})
+        if missing:
+            raise ValueError(f"The legs {missing} need a legN_delta or legN_strike_pct filter")
+    data = data if "contract_id" in data else assign_contract_id(data)
+
+    summaries = {}
+    for (init_fil, prefixes) in _filter_tree(points, filters).values():
+        # the init filters only select contracts by maturity date, so the filtered chain
+        # still holds every exit quote of the contracts that can be traded
+        chain = filter_data(data, init_fil)
+        tasks = [
+            (legs, prefix_fil, [(select_fil, entry_s_fil, list(exits.values())) for (select_fil, entry_s_fil, exits) in entries.values()], mode, stats, strike_order)
+            for (prefix_fil, entries) in prefixes.values()
+        ]
+        for out in _run_entries(chain, tasks, workers):
+            summaries.update(out)
+
+    return pd.DataFrame([
+        {**{k: _param_value(v) for (k, v) in point.items()}, **summaries[i]}
+        for (i, point) in enumerate(points)
+    ])
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+
+# Vectorised Black-Scholes pricing over whole columns: prices, greeks in the units of the vendor
+# files (theta per day, vega and rho per 1% move) and the implied vol of quoted prices.
+# fill_greeks completes a chain imported without (some of) the greeks, see data_import.get_data.
+
+DAYS_PER_YEAR = 365.0
+
+greek_fields = ('delta', 'gamma', 'theta', 'vega', 'rho')
+
+def _norm_pdf(x):
+    return np.exp(-0.5 * x ** 2) / np.sqrt(2 * np.pi)
+
+def _norm_cdf(x, pdf = None):
+    # Abramowitz & Stegun 26.2.17, |error| < 7.5e-8. pdf: _norm_pdf(x) when already known
+    t = 1 / (1 + 0.2316419 * np.abs(x))
+    poly = t * (0.319381530 + t * (-0.356563782 + t * (1.781477937 + t * (-1.821255978 + t * 1.330274429))))
+    cdf = 1 - (_norm_pdf(x) if pdf is None else pdf) * poly
+    return np.where(x >= 0, cdf, 1 - cdf)
+
+def _d1_d2(s, k, t, r, vol):
+    sqrt_t = np.sqrt(t)
+    d1 = (np.log(s / k) + (r + 0.5 * vol ** 2) * t) / (vol * sqrt_t)
+    return d1, d1 - vol * sqrt_t
+
+def bs_price(s, k, t, r, vol, is_call):
+    """
+    :params s, k: underlying price and strike
+    :params t: time to maturity in years
+    :params r: continuously compounded rate
+    :params vol: annualised volatility
+    :params is_call: bool array, False for puts
+    """
+    d1, d2 = _d1_d2(s, k, t, r, vol)
+    sign = np.where(is_call, 1.0, -1.0)
+    return sign * (s * _norm_cdf(sign * d1) - k * np.exp(-r * t) * _norm_cdf(sign * d2))
+
+def bs_greeks(s, k, t, r, vol, is_call):
+    # dict of delta, gamma, theta per day, vega and rho per 1% move
+    d1, d2 = _d1_d2(s, k, t, r, vol)
+    sqrt_t = np.sqrt(t)
+    disc = np.exp(-r * t)
+    sign = np.where(is_call, 1.0, -1.0)
+    pdf = _norm_pdf(d1)
+    return {
+        "delta": np.where(is_call, _norm_cdf(d1), _norm_cdf(d1) - 1),
+        "gamma": pdf / (s * vol * sqrt_t),
+        "theta": (-s * pdf * vol / (2 * sqrt_t) - sign * r * k * disc * _norm_cdf(sign * d2)) / DAYS_PER_YEAR,
+        "vega": s * pdf * sqrt_t / 100,
+        "rho": sign * k * t * disc * _norm_cdf(sign * d2) / 100,
+    }
+
+def _initial_vol(price, s, k, t, r, low, high):
+    # Manaster-Koehler start: Newton converges monotonically from the vol where vega peaks,
+    # Brenner-Subrahmanyam near the money where that vol goes to 0
+    mk = np.sqrt(2 * np.abs(np.log(s / k) + r * t) / t)
+    bs = np.sqrt(2 * np.pi / t) * price / s
+    return np.clip(np.maximum(mk, bs), low * 2, high / 2)
+
+def implied_vol(price, s, k, t, r, is_call, tol = 1e-6, max_iter = 100, low = 1e-4, high = 5.0):
+    """
+    implied vol of option prices, NaN when the price is outside the no-arbitrage bounds.
+    In the money options are solved on their out of the money counterpart (put-call parity), whose
+    price is all time value. Newton steps inside a bracket [low, high] that shrinks at every iteration,
+    a step leaving the bracket (e.g. vega close to 0 far out of the money) is replaced by a bisection.
+    Only the options not converged yet are repriced at each iteration.
+    """
+    price, s, k, t = (np.asarray(x, dtype = float) for x in (price, s, k, t))
+    is_call = np.broadcast_to(np.asarray(is_call, dtype = bool), price.shape)
+    r = np.broadcast_to(np.asarray(r, dtype = float), price.shape)
+
+    # c - p = s - k * exp(-rt)
+    forward_gap = s - k * np.exp(-r * t)
+    itm = np.where(is_call, forward_gap > 0, forward_gap < 0)
+    price = np.where(itm, price - np.abs(forward_gap), price)
+    is_call = is_call ^ itm
+    with np.errstate(invalid = "ignore"):
+        valid = (t > 0) & (price > 0) & (price < np.where(is_call, s, s - forward_gap))
+
+    vol = np.full(price.shape, np.nan)
+    todo = np.flatnonzero(valid)
+    s, k, t, r, is_call, price = (x[todo] for x in (s, k, t, r, is_call, price))
+    disc_k, sqrt_t, sign = k * np.exp(-r * t), np.sqrt(t), np.where(is_call, 1.0, -1.0)
+    v = _initial_vol(price, s, k, t, r, low, high)
+    lo = np.full(len(todo), low)
+    hi = np.full(len(todo), high)
+
+    for _ in range(max_iter):
+        if not len(todo):
+            break
+        d1 = (np.log(s / k) + (r + 0.5 * v ** 2) * t) / (v * sqrt_t)
+        d2 = d1 - v * sqrt_t
+        pdf1 = _norm_pdf(d1)
+        pdf2 = pdf1 * s / disc_k # n(d2) = n(d1) * s / (k * exp(-rt))
+        model = sign * (s * _norm_cdf(sign * d1, pdf1) - disc_k * _norm_cdf(sign * d2, pdf2))
+        vega = s * pdf1 * sqrt_t
+        diff = model - price
+        # the price increases with the vol
+        hi = np.where(diff > 0, v, hi)
+        lo = np.where(diff > 0, lo, v)
+        # Newton on the log price, far out of the money options have tiny and very convex prices
+        with np.errstate(divide = "ignore", over = "ignore", invalid = "ignore"):
+            step = v - np.log(model / price) * model / vega
+        bisect = ~np.isfinite(step) | (step <= lo) | (step >= hi)
+        step = np.where(bisect, 0.5 * (lo + hi), step)
+
+        # converged when the price or the next vol step is within tol
+        done = (np.abs(diff) < tol) | (np.abs(step - v) < tol)
+        vol[todo[done]] = v[done]
+        left = ~done
+        todo, s, k, t, r, price, lo, hi, disc_k, sqrt_t, sign = (
+            x[left] for x in (todo, s, k, t, r, price, lo, hi, disc_k, sqrt_t, sign)
+        )
+        v = step[left]
+    return vol
+
+def _quoted_price(data):
+    # mid price when both sides are quoted, otherwise the last price
+    mid = (data["bid"] + data["ask"]) / 2 if "bid" in data and "ask" in data else np.nan
+    last = data["last"] if "last" in data else np.nan
+    return pd.Series(mid, index = data.index).fillna(pd.Series(last, index = data.index)).values.astype(float)
+
+def fill_greeks(data, rate = 0.0):
+    """
+    fill the missing implied_vol and greek columns (or their missing values) of a normalised chain.
+    the implied vol is solved from the quoted price, the greeks are priced with it.
+    :params rate: float, continuously compounded rate
+    """
+    s = data["underlying_price"].values.astype(float)
+    k = data["strike"].values.astype(float)
+    t = data["dtm"].values.astype(float) / DAYS_PER_YEAR
+    is_call = (data["call_put"] == "c").values
+
+    vol = data["implied_vol"].values.astype(float) if "implied_vol" in data else np.full(len(data), np.nan)
+    missing = np.isnan(vol)
+    if missing.any():
+        vol = vol.copy()
+        vol[missing] = implied_vol(_quoted_price(data)[missing], s[missing], k[missing], t[missing], rate, is_call[missing])
+
+    todo = [f for f in greek_fields if f not in data or data[f].isna().any()]
+    if not todo:
+        return data.assign(implied_vol = vol)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        greeks = bs_greeks(s, k, t, rate, vol, is_call)
+    return data.assign(
+        implied_vol = vol,
+        **{f: data[f].fillna(pd.Series(greeks[f], index = data.index)) if f in data else greeks[f] for f in todo}
+    )
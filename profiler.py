@@ -0,0 +1,102 @@
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from functools import wraps
+from contextlib import contextmanager
+
+# Opt-in instrumentation of the strategy pipeline: wall time, rows in / out and memory delta of every
+# stage (init filters, create_spread, simulate and their steps) and of every filter of func_map.
+#
+#   with profile() as report:
+#       trades = long_call_long_put(data, filters)
+#   report_frame(report)
+#
+# or trades, report = profiled_run(long_call_long_put, data, filters, mode = "mid_price")
+#
+# The pipeline wraps its steps with profiled(func), which returns func itself when no profile is
+# running, so the disabled cost is one global lookup per step.
+
+_records = None # list of the records of the running profile, None when profiling is off
+_path = []      # names of the stages being run, outermost first
+
+def _rows(x):
+    # rows of a frame / list of frames, selected rows of a boolean mask, legs found by an exit search
+    if isinstance(x, pd.DataFrame):
+        return len(x)
+    elif isinstance(x, (np.ndarray, pd.Series)):
+        return int(x.sum()) if x.dtype == bool else len(x)
+    elif isinstance(x, list) and all(isinstance(d, pd.DataFrame) for d in x):
+        return sum(len(d) for d in x)
+    elif isinstance(x, tuple) and x:
+        return _rows(x[0])
+    return None
+
+def _memory():
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+def _measure(name, func, args, kwargs):
+    _path.append(name)
+    record = {
+        "stage": "/".join(_path),
+        "name": name,
+        "depth": len(_path) - 1,
+        "rows_in": _rows(args[0]) if args else None,
+    }
+    _records.append(record) # appended before running, so the records are in call order
+    mem = _memory()
+    start = time.perf_counter()
+    try:
+        out = func(*args, **kwargs)
+    finally:
+        _path.pop()
+    record["seconds"] = time.perf_counter() - start
+    record["mem_delta_mb"] = (_memory() - mem) / 2 ** 20
+    record["rows_out"] = _rows(out)
+    return out
+
+def profiled(func, name = None):
+    """
+    func, timed and recorded under name (default func.__name__) when a profile is running
+    """
+    if _records is None:
+        return func
+
+    @wraps(func)
+    def run(*args, **kwargs):
+        return _measure(name or func.__name__, func, args, kwargs)
+    return run
+
+@contextmanager
+def profile(memory = True):
+    """
+    record the stages run inside the block, yield the list of records.
+    :params memory: bool, trace the allocations with tracemalloc for mem_delta_mb (slower)
+    """
+    global _records
+    if _records is not None:
+        raise ValueError("A profile is already running")
+
+    started = memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    _records = []
+    try:
+        yield _records
+    finally:
+        _records = None
+        _path.clear()
+        if started:
+            tracemalloc.stop()
+
+def report_frame(records):
+    cols = ["stage", "name", "depth", "seconds", "rows_in", "rows_out", "mem_delta_mb"]
+    return pd.DataFrame(records, columns = cols).round({"seconds": 6, "mem_delta_mb": 3})
+
+def profiled_run(strategy, data, filters, mode = "market", memory = True):
+    """
+    run a strategy of optionStrategies (e.g. long_call_long_put), return (trades, report frame)
+    """
+    with profile(memory) as records:
+        trades = strategy(data, filters, mode = mode)
+    return trades, report_frame(records)
@@ -0,0 +1,130 @@
+import os
+import queue
+import threading
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Bulk export of the results of many events: the trade details (results()[1]) and consolidated trades
+# (results()[2]) of every event are appended to two parquet datasets partitioned like the event files,
+#   <root>/details/category=Monetary Policy/event=Fed/market=ASX/part-<run>-0-0.parquet
+#   <root>/trades/...
+# and the simple trade stats (results()[0]) of the events to <root>/summary/..., plus an optional
+# summary workbook. Read them back with e.g. pd.read_parquet(os.path.join(root, "trades")).
+#
+# The files are written by a background thread, put() only queues the frames of an event:
+#   with ResultWriter("results/long_straddle") as writer:
+#       for ...:
+#           writer.put({"category": ..., "event": ..., "market": ..., "name": ...}, *results(trades))
+# Every writer adds its own files (<run> is unique per writer), so many runs can share a root, e.g. one
+# mass_get_data per event. NOTE: running the same events again in a root adds their trades twice.
+# A run that fails calls abort() instead of close(), so that its own error is the one raised.
+
+partition_cols = ["category", "event", "market"]
+
+MAX_PENDING = 16 # events queued before put() waits for the writer, bounds the memory held by the queue
+
+_done = object() # end of the queue
+
+class ResultWriter:
+    """
+    :params root: string, directory of the datasets
+    :params workbook: string, path of an xlsx file to also write the summary to (needs openpyxl), None for no workbook
+    :params max_pending: int, events queued before put() blocks
+    """
+    def __init__(self, root, workbook = None, max_pending = MAX_PENDING):
+        self.root = root
+        self.run = uuid.uuid4().hex[:8]
+        self.workbook = workbook
+        self.summary = []
+        self.result = None # summary frame returned by close
+        self.closed = False
+        self.error = None
+        self.count = 0
+        self.queue = queue.Queue(maxsize = max_pending)
+        self.thread = threading.Thread(target = self._run, name = "ResultWriter", daemon = True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def put(self, keys, stats, details, trades):
+        """
+        queue the results of one event
+        :params keys: dict of the event columns, with at least the partition_cols
+        :params stats, details, trades: the 3 items returned by tradeStat.results
+        """
+        if self.closed:
+            raise ValueError("The writer is closed")
+        self._raise()
+        missing = [c for c in partition_cols if c not in keys]
+        if missing:
+            raise ValueError(f"The event keys need the columns {missing}")
+        self.summary.append({**keys, **stats})
+        self.queue.put((self.count, keys, details, trades))
+        self.count += 1
+
+    def close(self):
+        # wait for the queued events, write the summary and return it as a dataframe (the same one on repeat calls)
+        if not self.closed:
+            self._stop()
+            if self.error is None:
+                try:
+                    self.result = self._write_summary(pd.DataFrame(self.summary))
+                except Exception as e:
+                    self.error = e
+        self._raise()
+        return self.result
+
+    def abort(self):
+        # after a failure of the run: wait for the queued events, without writing the summary or raising the writer error
+        if not self.closed:
+            self._stop()
+
+    def _stop(self):
+        self.closed = True
+        if self.thread.is_alive():
+            self.queue.put(_done)
+            self.thread.join()
+
+    def _write_summary(self, summary):
+        if len(summary):
+            self._write_dataset("summary", summary, "summary")
+            if self.workbook is not None:
+                summary.to_excel(self.workbook, index = False)
+        return summary
+
+    def _raise(self):
+        if self.error is not None:
+            raise RuntimeError(f"Writing the results to {self.root} failed") from self.error
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _done:
+                return
+            if self.error is None: # after a failure the queue is still drained, so that put() never blocks
+                try:
+                    self._write(*item)
+                except Exception as e:
+                    self.error = e
+
+    def _write(self, seq, keys, details, trades):
+        for kind, frame in (("details", details), ("trades", trades)):
+            if len(frame):
+                self._write_dataset(kind, frame.reset_index().assign(**keys), seq)
+
+    def _write_dataset(self, kind, frame, part):
+        pq.write_to_dataset(
+            pa.Table.from_pandas(frame, preserve_index = False),
+            os.path.join(self.root, kind),
+            partition_cols = partition_cols,
+            basename_template = f"part-{self.run}-{part}-{{i}}.parquet",
+        )
@@ -4,8 +4,14 @@ import pandas as pd
 
 from optionStrategies import long_call, short_call, long_call_long_put, long_call_short_put, short_call_short_put
 from data_import import get_data
-from tradeStat import results
+from backtest_main import assign_contract_id
+from chainStore import store_chain, load_chain
+from importCache import get_cached_data, cache_stats, CACHE_DIR
+from eventCalendar import calendar_from_files, event_chains, calendar_cols, BEFORE, AFTER
+from tradeStat import results, empty_summary
+from resultExport import ResultWriter
 from pathlib import PurePath, Path
+from concurrent.futures import ProcessPoolExecutor
 
 NKY_BUDGET = 3000000 # initial budget
 NKY_TCOST = 0 # T cost is irrelevant for NKY
@@ -17,6 +23,29 @@ SPX_BUDGET = 70000
 SPX_TCOST = 1
 SPX_CONTRACT_SIZE = 100
 
+# Here we define the struct to match the format of our csv file
+# the struct indices are 0-indexed where first column of the csv file
+# is mapped to 0
+SPX_FILE_STRUCT = (
+    ("date", 0),
+    ("bid", 1),
+    ("ask", 2),
+    ('last',3),
+    ("call_put", 5),
+    ("maturity_date", 6),
+    ("strike", 7),
+    ("underlying_symbol", 8),
+    ("underlying_price", 9),
+    ("implied_vol", 11),
+    ("delta", 12),
+    ("gamma", 13),
+    ("vega", 14), 
+    ("theta", 15),
+    ("rho", 16),
+    ('event_day', 18),
+    ('day_to_event', 19),
+)
+
 pp = PurePath(Path.cwd()).parts[:]
 pdir = PurePath(*pp)
 infp=PurePath(pdir)
@@ -62,85 +91,183 @@ def run_strategy(data, strategy, after = True, timeLag = True, contract_size = S
     else:
         return data
 
-def store_and_get_data(file_name):
+def store_and_get_data(file_name, filters = None):
     # absolute file path to our input file
     curr_file = os.path.abspath(os.path.dirname(__file__))
-    file = os.path.join(curr_file, "data", f"{file_name}.pkl")
+    store = os.path.join(curr_file, "data", f"{file_name}.parquet")
 
-    # check if we have a pickle store
-    if os.path.isfile(file):
-        print("pickle file found, retrieving...")
-        return pd.read_pickle(file)
-    else:
-        print("no picked file found, retrieving csv data...")
+    # check if we have a chain store, only the partitions needed by the filters are loaded
+    if not os.path.isdir(store):
+        print("no chain store found, retrieving csv data...")
 
         csv_file = os.path.join(curr_file, "data", f"{file_name}.csv")
         data = get_data(csv_file, SPX_FILE_STRUCT, preview = False)
 
-        print("storing to pickle file...")
-        pd.to_pickle(data, file)
-        return data
+        print("storing to chain store...")
+        store_chain(data, store)
+    else:
+        print("chain store found, retrieving...")
 
-def mass_get_data(strategy, infp = infp, category = "Monetary Policy", event = "Fed", market = "ASX",after = True, timeLag = True):
-    # absolute file path to our input file
-    # curr_file = os.path.abspath(os.path.dirname(__file__))
-    path = os.path.join(infp , "data" , "event_dateframe" , category , event ,  market)
-    entries = os.listdir(path)
-    
+    # the contract ids are assigned once on load, not by every strategy run on the chain
+    return load_chain(store, filters = filters).pipe(assign_contract_id)
+
+def _market_params(market):
+    # initial balance, transaction cost and contract size of each market
     if market == "ASX":
-        init_balance = ASX_BUDGET
-        t_cost = ASX_TCOST
-        contract_size = ASX_CONTRACT_SIZE
+        return ASX_BUDGET, ASX_TCOST, ASX_CONTRACT_SIZE
     elif market == "NKY":
-        init_balance = NKY_BUDGET
-        t_cost = NKY_TCOST
-        contract_size = NKY_CONTRACT_SIZE
+        return NKY_BUDGET, NKY_TCOST, NKY_CONTRACT_SIZE
     elif market == "SPX":
-        init_balance = SPX_BUDGET
-        t_cost = SPX_TCOST
-        contract_size = SPX_CONTRACT_SIZE
+        return SPX_BUDGET, SPX_TCOST, SPX_CONTRACT_SIZE
     else:
-        ValueError()
+        raise ValueError("Unknown market")
+
+def _event_path(infp, category, event, market):
+    return os.path.join(infp , "data" , "event_dateframe" , category , event ,  market)
+
+def _run_event(csv_file, struct, strategy, market, after, timeLag, writer = None, keys = None, cache_dir = CACHE_DIR):
+    # run the strategy on one event file and write the trades, return the simple trade stats
+    # writer: resultExport.ResultWriter queuing the trades under the event keys, instead of the xls files
+    # cache_dir: directory of the import cache (importCache)
+    init_balance, t_cost, contract_size = _market_params(market)
+    entry = os.path.basename(csv_file)
+    # the same event file is imported again by every strategy / after / timeLag run, the cache also
+    # keeps its contract ids so that the strategy does not build them on every run
+    data = get_cached_data(csv_file, struct, cache_dir = cache_dir, contract_ids = True)
     
-    for entry in entries:
-        csv_file = os.path.join(path, entry)
-        data = get_data(csv_file, SPX_FILE_STRUCT, preview = False)
-        
-        r = data.pipe(run_strategy, strategy = strategy, after = after, timeLag = timeLag, contract_size = contract_size).pipe(results, init_balance = init_balance, t_cost = t_cost)
-        # r[0] is the simple trade stats
-        # print(r[0])
-        # r[1] is a dataframe containing all the individual trades of the strategy
-        # i.e. document each call and put transactions
-        # print(r[1])
-        r[1].to_excel(entry.replace(".csv","_details.xls" ))
-        # r[2] is a dataframe containing the consolidated trades
-        # i.e. documents each trade by a strategy as a whole
-        r[2].to_excel(entry.replace(".csv","_trade.xls" ))
-        # print(r[2])
+    r = data.pipe(run_strategy, strategy = strategy, after = after, timeLag = timeLag, contract_size = contract_size).pipe(results, init_balance = init_balance, t_cost = t_cost)
+    # r[0] is the simple trade stats
+    # print(r[0])
+    # r[1] is a dataframe containing all the individual trades of the strategy
+    # i.e. document each call and put transactions
+    # print(r[1])
+    if writer is not None:
+        writer.put({**keys, "name": entry.replace(".csv", "")}, *r)
+        return r[0]
+    r[1].to_excel(entry.replace(".csv","_details.xls" ))
+    # r[2] is a dataframe containing the consolidated trades
+    # i.e. documents each trade by a strategy as a whole
+    r[2].to_excel(entry.replace(".csv","_trade.xls" ))
+    # print(r[2])
+    return r[0]
+
+class _EventResults:
+    # stands for the ResultWriter in a worker process: the results of the event are sent back
+    # to the parent process, which puts them to its writer
+    def __init__(self):
+        self.items = []
+
+    def put(self, keys, *r):
+        self.items.append((keys, r))
+
+def _try_run_event(csv_file, struct, strategy, market, after, timeLag, cache_dir, keys = None):
+    # used by the worker processes, a bad event file is reported in the summary instead of killing the batch.
+    # the import cache_stats counted by the worker for the event are returned with its summary, and
+    # the results of the event when keys are given (export), instead of writing the xls files
+    before = dict(cache_stats)
+    collected = None if keys is None else _EventResults()
+    try:
+        row = {"event": os.path.basename(csv_file), **_run_event(csv_file, struct, strategy, market, after, timeLag, collected, keys, cache_dir = cache_dir), "error": None}
+    except Exception as e:
+        row = {"event": os.path.basename(csv_file), "error": repr(e)}
+    return row, {k: cache_stats[k] - before[k] for k in cache_stats}, [] if collected is None else collected.items
+
+def mass_get_data(strategy, infp = infp, category = "Monetary Policy", event = "Fed", market = "ASX",after = True, timeLag = True, export = None, workbook = None, cache_dir = CACHE_DIR):
+    """
+    'export': directory of the resultExport datasets of the trades of all the events (written by a
+        background thread), instead of two xls files per event. Return the summary of the events then.
+    'workbook': path of an xlsx file to also write the summary of the events to
+    'cache_dir': directory of the import cache of the event files
+    """
+    # absolute file path to our input file
+    # curr_file = os.path.abspath(os.path.dirname(__file__))
+    path = _event_path(infp, category, event, market)
+    entries = os.listdir(path)
+    
+    writer = None if export is None else ResultWriter(export, workbook = workbook)
+    keys = {"category": category, "event": event, "market": market}
+    try:
+        for entry in entries:
+            csv_file = os.path.join(path, entry)
+            _run_event(csv_file, SPX_FILE_STRUCT, strategy, market, after, timeLag, writer, keys, cache_dir = cache_dir)
+    except BaseException:
+        # the error of the run is raised, not the one of the writer
+        if writer is not None:
+            writer.abort()
+        raise
+    return None if writer is None else writer.close()
+
+def mass_get_data_parallel(strategy, infp = infp, category = "Monetary Policy", event = "Fed", market = "ASX", after = True, timeLag = True, workers = None, struct = None, cache_dir = CACHE_DIR, export = None, workbook = None):
+    """
+    Same as mass_get_data, but the event files are run in a process pool.
+    'workers': number of worker processes, default = number of cores
+    'struct': file struct of the event files, default = SPX_FILE_STRUCT
+    'cache_dir': directory of the import cache, shared by the workers. Their cache_stats are added
+        to the importCache.cache_stats of this process.
+    'export', 'workbook': write the trades of the events with resultExport, see mass_get_data. The results
+        are sent back by the workers and written by this process.
+    Return a dataframe of the simple trade stats of each event, indexed by the event file,
+    the 'error' column records the exception of the event files that failed.
+    """
+    struct = SPX_FILE_STRUCT if struct is None else struct
+    path = _event_path(infp, category, event, market)
+    csv_files = [os.path.join(path, entry) for entry in sorted(os.listdir(path))]
+
+    writer = None if export is None else ResultWriter(export, workbook = workbook)
+    keys = None if writer is None else {"category": category, "event": event, "market": market}
+    try:
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            futures = [pool.submit(_try_run_event, f, struct, strategy, market, after, timeLag, cache_dir, keys) for f in csv_files]
+            summary = []
+            for f in futures:
+                row, stats, items = f.result()
+                summary.append(row)
+                for (k, v) in stats.items():
+                    cache_stats[k] += v
+                for (event_keys, r) in items:
+                    writer.put(event_keys, *r)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    if writer is not None:
+        writer.close()
+
+    return pd.DataFrame(summary).set_index("event")
+
+def mass_run_events(data, strategy, calendar = None, market = "ASX", after = True, timeLag = True, export = None, workbook = None, window = (BEFORE, AFTER)):
+    """
+    Same as mass_get_data, but every event of the calendar is run on one loaded chain 'data'
+    (e.g. store_and_get_data of the market) instead of importing one csv file per event.
+    'calendar': eventCalendar table, default = the events of the event files of the market
+    'export', 'workbook': write the trades of the events with resultExport, see mass_get_data
+    'window': (days before, days after) the event kept in the chain of the event, see eventCalendar.event_chains
+    Return a dataframe of the simple trade stats of each event, indexed by the event name and date,
+    the stats of an event without trades are 0.
+    """
+    init_balance, t_cost, contract_size = _market_params(market)
+    if calendar is None:
+        calendar = calendar_from_files()
+        calendar = calendar[calendar["market"] == market]
+
+    summary = []
+    writer = None if export is None else ResultWriter(export, workbook = workbook)
+    try:
+        for idx, chain in event_chains(data, calendar, *window):
+            trades = chain.pipe(run_strategy, strategy = strategy, after = after, timeLag = timeLag, contract_size = contract_size)
+            r = results(trades, init_balance = init_balance, t_cost = t_cost) if len(trades) else (dict(empty_summary), )
+            if writer is not None and len(trades):
+                writer.put(calendar.loc[idx, calendar_cols].to_dict(), *r)
+            summary.append({"name": calendar.at[idx, "name"], "event_day": calendar.at[idx, "event_day"], **r[0]})
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    if writer is not None:
+        writer.close()
+    return pd.DataFrame(summary).set_index(["name", "event_day"])
 
 if __name__ == "__main__":
-    # Here we define the struct to match the format of our csv file
-    # the struct indices are 0-indexed where first column of the csv file
-    # is mapped to 0
-    SPX_FILE_STRUCT = (
-        ("date", 0),
-        ("bid", 1),
-        ("ask", 2),
-        ('last',3),
-        ("call_put", 5),
-        ("maturity_date", 6),
-        ("strike", 7),
-        ("underlying_symbol", 8),
-        ("underlying_price", 9),
-        ("implied_vol", 11),
-        ("delta", 12),
-        ("gamma", 13),
-        ("vega", 14), 
-        ("theta", 15),
-        ("rho", 16),
-        ('event_day', 18),
-        ('day_to_event', 19),
-    )
     # r = store_and_get_data("SPX_2018").pipe(run_strategy).pipe(results)
     # pd.DataFrame.from_dict(r[0], orient = 'index').to_excel("result.xls")
     long_straddle = "long_straddle"
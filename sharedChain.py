@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+import optionStrategies
+from backtest_main import assign_contract_id
+
+# Publish a normalised chain once into shared memory, so that worker processes can run the
+# strategies in optionStrategies on it without pickling the whole DataFrame to every task.
+#   numeric columns     -> one shared block each
+#   datetime columns    -> int64 nanoseconds in a shared block
+#   string / categorical-> category codes in a shared block, the categories (small) travel in the handle
+# The handle returned by publish_chain is a small picklable dict, attach_chain turns it into a
+# read-only DataFrame whose columns are views of the shared blocks.
+
+_attached = {} # shared memory blocks attached by this process, they must outlive the DataFrame views
+
+def _share(arr):
+    shm = shared_memory.SharedMemory(create = True, size = max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype = arr.dtype, buffer = shm.buf)[:] = arr
+    return shm
+
+def _column_spec(s):
+    # (kind, array to share, categories) of a column
+    if isinstance(s.dtype, pd.api.types.CategoricalDtype):
+        return "category", s.cat.codes.values, list(s.cat.categories)
+    elif np.issubdtype(s.dtype, np.datetime64):
+        return "datetime", s.values.astype("datetime64[ns]").view(np.int64), None
+    elif s.dtype == object:
+        codes, categories = pd.factorize(s)
+        return "category", codes.astype(np.int32), list(categories)
+    else:
+        return "numeric", s.values, None
+
+def publish_chain(data):
+    """
+    copy the chain into shared memory, return (handle, blocks).
+    the chain is indexed by contract_id first, so that the workers never copy it to build the index.
+    keep the blocks alive while the workers run and call release_chain(blocks) when done.
+    """
+    data = data if "contract_id" in data else assign_contract_id(data)
+    handle, blocks = {"length": len(data), "columns": []}, []
+    for col in data.columns:
+        kind, arr, categories = _column_spec(data[col])
+        arr = np.ascontiguousarray(arr)
+        shm = _share(arr)
+        blocks.append(shm)
+        handle["columns"].append({
+            "name": col,
+            "kind": kind,
+            "shm": shm.name,
+            "dtype": arr.dtype.str,
+            "categories": categories,
+        })
+    return handle, blocks
+
+def release_chain(blocks):
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
+
+def _attach(name):
+    if name not in _attached:
+        # pool workers share the resource tracker of the publisher, which unlinks the block in release_chain
+        _attached[name] = shared_memory.SharedMemory(name = name)
+    return _attached[name]
+
+def attach_chain(handle):
+    # zero-copy, read-only DataFrame view of a published chain
+    cols = {}
+    for c in handle["columns"]:
+        arr = np.ndarray((handle["length"],), dtype = np.dtype(c["dtype"]), buffer = _attach(c["shm"]).buf)
+        arr.setflags(write = False)
+        if c["kind"] == "category":
+            cols[c["name"]] = pd.Categorical.from_codes(arr, c["categories"])
+        elif c["kind"] == "datetime":
+            cols[c["name"]] = arr.view("datetime64[ns]")
+        else:
+            cols[c["name"]] = arr
+    return pd.DataFrame(cols, copy = False)
+
+def _run_shared(handle, strategy, filters, mode):
+    # worker: run one strategy of optionStrategies on the shared chain
+    return getattr(optionStrategies, strategy)(attach_chain(handle), filters, mode = mode)
+
+def map_strategies(data, jobs, workers = None):
+    """
+    run the (strategy, filters, mode) jobs in a process pool on one shared copy of the chain,
+    e.g. [("long_call_long_put", filters, "mid_price"), ("short_call_short_put", filters, "mid_price")]
+    return the list of trades of each job.
+    """
+    handle, blocks = publish_chain(data)
+    try:
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            futures = [pool.submit(_run_shared, handle, strategy, filters, mode) for (strategy, filters, mode) in jobs]
+            return [f.result() for f in futures]
+    finally:
+        release_chain(blocks)
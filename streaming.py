@@ -0,0 +1,151 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from optionStrategies import _process_legs
+from tradeStat import results, calc_total_trades, BUDGET, TCOST, NUN_OPTION
+
+# Streaming backtest: the trades of a strategy are yielded in batches of entry dates, in entry date
+# order, instead of one frame at the end of the run. The trade_num of the batches follow each other,
+# so the batches stacked are the trades of the strategy run in one go.
+#
+#   for trades in stream_trades(data, [(CallPut.CALL, 1), (CallPut.PUT, 1)], filters, mode = "mid_price"):
+#       ...
+#
+# or feed the batches to sinks, e.g. write them to a csv file while computing the results stats:
+#
+#   (_, (stats, per_trade)) = run_stream(data, legs, filters, [CsvSink("trades.csv"), StatsSink()])
+#
+# A sink is any object with write(trades), called with every batch, and close(), whose return value
+# is returned by run_stream. When the run fails, the sinks with an abort() method (e.g. ParquetSink,
+# to release its file) are aborted instead of closed and the error of the run is raised. The spreads of a batch are created from the quotes of its dates only, so
+# the memory of the run is the one of a batch, unless an entry filter compares the quotes of different
+# dates (e.g. a nearest entry_dtm), see optionStrategies._stream_legs.
+
+BATCH_DAYS = 20 # entry dates per batch
+
+def stream_trades(data, legs, filters, mode = "market", strike_order = None, batch_days = BATCH_DAYS):
+    """
+    yield the trades of the legs in batches of batch_days entry dates, ordered by entry date, in the
+    output format of the strategies
+    :params legs: list, the legs of the strategy, e.g. [(CallPut.CALL, 1), (CallPut.PUT, 1)] for long_call_long_put
+    """
+    return _process_legs(data, legs, filters, mode, strike_order, batch_days = batch_days)
+
+def run_stream(data, legs, filters, sinks, mode = "market", strike_order = None, batch_days = BATCH_DAYS):
+    """
+    write every batch of stream_trades to every sink, return the list of what the sinks return on close
+    """
+    try:
+        for trades in stream_trades(data, legs, filters, mode, strike_order, batch_days):
+            for sink in sinks:
+                sink.write(trades)
+    except BaseException:
+        # the error of the run is raised, not the one of a sink
+        for sink in sinks:
+            if hasattr(sink, "abort"):
+                sink.abort()
+        raise
+    return [sink.close() for sink in sinks]
+
+#-------------------------------------------------------------------------------------------------------------------------
+# Sinks
+#-------------------------------------------------------------------------------------------------------------------------
+class FrameSink:
+    # keep the batches in memory, close returns all the trades
+    def __init__(self):
+        self.batches = []
+
+    def write(self, trades):
+        self.batches.append(trades)
+
+    def close(self):
+        return pd.concat(self.batches) if self.batches else None
+
+class CsvSink:
+    # append the batches to a csv file, the header is written with the first batch
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+
+    def write(self, trades):
+        trades.to_csv(self.path, mode = "a" if self.rows else "w", header = not self.rows, index_label = "trade_num")
+        self.rows += len(trades)
+
+    def close(self):
+        return self.path
+
+class ParquetSink:
+    # append the batches to a parquet file, one row group per batch, with the schema of the first batch
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+
+    def write(self, trades):
+        trades = trades.reset_index()
+        if self.writer is None:
+            table = pa.Table.from_pandas(trades, preserve_index = False)
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = pa.Table.from_pandas(trades, schema = self.writer.schema, preserve_index = False)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        return self.path
+
+    def abort(self):
+        # after a failure of the run: release the file, without raising the error of the writer
+        try:
+            self.close()
+        except Exception:
+            pass
+
+class StatsSink:
+    """
+    the stats of tradeStat.results, aggregated batch by batch: close returns (stats dict, per trade frame),
+    the first and last items of results without the trades themselves
+    """
+    def __init__(self, init_balance = BUDGET, t_cost = TCOST, num_option = NUN_OPTION):
+        self.params = (init_balance, t_cost, num_option)
+        self.profit = 0.0
+        self.wins = 0
+        self.losses = 0
+        self.groups = 0 # trades with a cash_flow, the base of the win and loss percents like results
+        self.trades = 0
+        self.per_trade = []
+
+    def write(self, trades):
+        stats, _, per_trade = results(trades, *self.params)
+        self.profit += trades["cash_flow"].sum()
+        self.wins += stats["Total Win Count"]
+        self.losses += stats["Total Loss Count"]
+        self.groups += stats["Total Win Count"] + stats["Total Loss Count"]
+        # the trade_num follow each other from batch to batch, so this counts all the trades so far
+        self.trades = calc_total_trades(trades)
+        self.per_trade.append(per_trade)
+
+    def close(self):
+        n = max(self.groups, 1)
+        stats = {
+            "Total Profit": round(self.profit, 2),
+            "Total Win Count": self.wins,
+            "Total Win Percent": round(self.wins / n, 2),
+            "Total Loss Count": self.losses,
+            "Total Loss Percent": round(self.losses / n, 2),
+            "Total Trades": self.trades,
+        }
+        return stats, pd.concat(self.per_trade) if self.per_trade else None
+
+class ProgressSink:
+    # print the entry dates and the trades of every batch
+    def __init__(self):
+        self.trades = 0
+
+    def write(self, trades):
+        self.trades = calc_total_trades(trades)
+        print(f"{trades['entry_date'].min():%Y-%m-%d} - {trades['entry_date'].max():%Y-%m-%d}: {self.trades} trades")
+
+    def close(self):
+        return self.trades
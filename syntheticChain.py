@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+from pricing import bs_price, bs_greeks, DAYS_PER_YEAR
+
+# Deterministic synthetic option chain in the normalised format of data_import.get_data
+# (the data_import.fields columns + dtm), used to benchmark the pipeline on any size:
+#   underlyings x strikes x maturities x days x (call, put) quotes.
+# The underlyings follow a geometric brownian motion, the options are priced with Black-Scholes
+# on a skewed volatility surface, and an event sits in the middle of the period for day_to_event.
+
+def _underlying_paths(n_underlyings, days, spot, vol, rng):
+    dt = 1 / 252
+    shocks = rng.standard_normal((n_underlyings, len(days))) * vol * np.sqrt(dt) - 0.5 * vol ** 2 * dt
+    shocks[:, 0] = 0
+    return spot * np.exp(np.cumsum(shocks, axis = 1))
+
+def synthetic_chain(n_underlyings = 1, n_strikes = 41, n_maturities = 4, n_days = 60, start = "2016-01-04",
+                    spot = 5000.0, strike_step = 0.01, vol = 0.2, skew = -0.1, rate = 0.02, seed = 0):
+    """
+    :params n_underlyings: int, number of underlyings (SYN0, SYN1, ...)
+    :params n_strikes: int, number of strikes per maturity, centred on the initial spot
+    :params n_maturities: int, number of maturities listed on each day (monthly)
+    :params n_days: int, number of trading days (business days from start)
+    :params strike_step: float, distance between two strikes as a fraction of the initial spot
+    :params vol, skew: float, at-the-money implied vol and its slope in log moneyness
+    :params seed: int, the same seed always gives the same chain
+    """
+    rng = np.random.RandomState(seed)
+    days = pd.bdate_range(start, periods = n_days)
+    event_day = days[n_days // 2]
+    maturities = pd.date_range(days[0] + pd.Timedelta(days = 1), periods = n_maturities + n_days // 21 + 1, freq = "WOM-3FRI")
+    paths = _underlying_paths(n_underlyings, days, spot, vol, rng)
+    strikes = spot * (1 + strike_step * (np.arange(n_strikes) - n_strikes // 2))
+    strikes = np.round(strikes / 5) * 5
+
+    # every (underlying, day, listed maturity, strike, call/put)
+    u, d, m, k, cp = [], [], [], [], []
+    for di, day in enumerate(days):
+        listed = np.flatnonzero(maturities > day)[:n_maturities]
+        grid = np.array(np.meshgrid(np.arange(n_underlyings), listed, np.arange(n_strikes), [0, 1], indexing = "ij")).reshape(4, -1)
+        u.append(grid[0]); m.append(grid[1]); k.append(grid[2]); cp.append(grid[3])
+        d.append(np.full(grid.shape[1], di))
+    u, d, m, k, cp = (np.concatenate(x) for x in (u, d, m, k, cp))
+
+    s = paths[u, d]
+    strike = strikes[k]
+    t = (maturities.values[m] - days.values[d]).astype("timedelta64[D]").astype(float) / DAYS_PER_YEAR
+    iv = np.maximum(vol + skew * np.log(strike / s), 0.05)
+    is_call = cp == 0
+    price = np.maximum(bs_price(s, strike, t, rate, iv, is_call), 0.01)
+    greeks = bs_greeks(s, strike, t, rate, iv, is_call)
+
+    half_spread = np.maximum(0.05, 0.01 * price) * (1 + rng.uniform(size = len(price)))
+    return pd.DataFrame({
+        "date": days.values[d],
+        "bid": np.maximum(price - half_spread, 0),
+        "ask": price + half_spread,
+        "last": price,
+        "call_put": np.where(is_call, "c", "p"),
+        "maturity_date": maturities.values[m],
+        "strike": strike.astype(np.int64),
+        "underlying_symbol": np.array([f"SYN{i}" for i in range(n_underlyings)])[u],
+        "underlying_price": s,
+        "implied_vol": iv,
+        "delta": greeks["delta"],
+        "gamma": greeks["gamma"],
+        "vega": greeks["vega"],
+        "theta": greeks["theta"],
+        "rho": greeks["rho"],
+        "event_day": event_day.strftime("%Y-%m-%d"),
+        "day_to_event": (event_day - days[d]).days,
+        "dtm": (maturities.values[m] - days.values[d]).astype("timedelta64[D]").astype(np.int64),
+    }).round(2)
@@ -0,0 +1,37 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from data_import import get_data
+from sample_run import SPX_FILE_STRUCT
+
+EVENT_ROOT = os.path.join(ROOT, "data", "event_dateframe", "Monetary Policy")
+FED_FILE = os.path.join(EVENT_ROOT, "Fed", "ASX", "(ASX) 16 DEC 2015 FED RATE HIKE.csv")
+ECB_FILE = os.path.join(EVENT_ROOT, "ECB", "ASX", "(ASX) 16 MAR 2016 KEY ECB ANNOUNCEMENT.csv")
+
+# filters of sample_run.run_strategy for a long straddle after the event, on the ASX files
+EVENT_FILTERS = {
+    "entry_dtm": {"value": 7, "cond": "greater"},
+    "entry_day_to_event": {"value": -1, "cond": "greater"},
+    "day_to_event": {"value": 3, "cond": "less_or_equal"},
+    "leg1_delta": {"value": 0.5, "cond": "nearest"},
+    "leg2_delta": {"value": 0.5, "cond": "nearest"},
+    "contract_size": 10,
+    "exit_day_to_event": {"value": -1, "cond": "nearest"},
+}
+
+def pytest_configure(config):
+    # pandas / numpy deprecation warnings of the library code
+    config.addinivalue_line("filterwarnings", "ignore::FutureWarning")
+    config.addinivalue_line("filterwarnings", "ignore::DeprecationWarning")
+
+@pytest.fixture(scope = "session")
+def fed_chain():
+    return get_data(FED_FILE, SPX_FILE_STRUCT)
+
+@pytest.fixture(scope = "session")
+def ecb_chain():
+    return get_data(ECB_FILE, SPX_FILE_STRUCT)
@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+from datetime import datetime
+
+from chainStore import store_chain, load_chain
+from conftest import EVENT_FILTERS
+from filters import filter_data
+from optionStrategies import long_call_long_put
+
+def _sorted(data):
+    return data.sort_values(["date", "maturity_date", "call_put", "strike"]).reset_index(drop = True)
+
+@pytest.mark.parametrize("filters", [
+    {},
+    {"start_date": {"value": datetime(2016, 1, 21), "cond": "greater"}},
+    {"end_date": {"value": datetime(2016, 1, 21), "cond": "less_or_equal"}},
+])
+def test_load_equals_filtered_chain(tmp_path, fed_chain, filters):
+    # the pushed down filters load the rows the filters select on the frame
+    root = store_chain(fed_chain, str(tmp_path / "chain"))
+    expected = _sorted(filter_data(fed_chain, filters))
+    pd.testing.assert_frame_equal(load_chain(root, filters)[expected.columns], expected, check_dtype = False, check_categorical = False)
+
+def test_entry_filters_not_pushed_down(tmp_path, fed_chain):
+    # day_to_event selects the entries, the exit quotes outside of it are still loaded
+    root = store_chain(fed_chain, str(tmp_path / "chain"))
+    assert len(load_chain(root, {"day_to_event": {"value": 3, "cond": "less_or_equal"}})) == len(fed_chain)
+
+def test_store_twice_overwrites(tmp_path, fed_chain):
+    root = store_chain(fed_chain, str(tmp_path / "chain"))
+    store_chain(fed_chain, root)
+    assert len(load_chain(root)) == len(fed_chain)
+
+def test_store_backtest_equals_frame(tmp_path, fed_chain):
+    # the filters of the backtest are passed to the store, like sample_run.store_and_get_data
+    root = store_chain(fed_chain, str(tmp_path / "chain"))
+    pd.testing.assert_frame_equal(
+        long_call_long_put(load_chain(root, EVENT_FILTERS), EVENT_FILTERS),
+        long_call_long_put(fed_chain, EVENT_FILTERS),
+        check_dtype = False,
+        check_categorical = False,
+    )
@@ -0,0 +1,21 @@
+import pandas as pd
+import pytest
+
+from conftest import FED_FILE
+from data_import import get_data, float32_fields
+from sample_run import SPX_FILE_STRUCT
+
+@pytest.mark.parametrize("chunksize", [1000, 7919, 10 ** 7])
+def test_chunked_import_equals_full_import(fed_chain, chunksize):
+    data = get_data(FED_FILE, SPX_FILE_STRUCT, chunksize = chunksize)
+
+    assert str(data["call_put"].dtype) == "category"
+    assert str(data["underlying_symbol"].dtype) == "category"
+    assert all(str(data[f].dtype) == "float32" for f in float32_fields)
+    assert str(data["dtm"].dtype) == "int32"
+
+    expected = fed_chain.astype({c: data[c].dtype for c in data})
+    exact = [c for c in data if c not in float32_fields]
+    pd.testing.assert_frame_equal(data[exact], expected[exact])
+    # read as float32 then rounded: a value on a rounding tie may end one cent away
+    pd.testing.assert_frame_equal(data[list(float32_fields)], expected[list(float32_fields)], check_exact = False, atol = 0.011)
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from conftest import EVENT_FILTERS
+from equityCurve import mark_to_market, equity_curve
+from optionStrategies import long_call_long_put
+from tradeStat import BUDGET
+
+HELD = {k: v for (k, v) in EVENT_FILTERS.items() if k != "exit_day_to_event"}
+
+@pytest.mark.parametrize("filters", [EVENT_FILTERS, HELD])
+def test_marks_end_on_cash_flow(fed_chain, filters):
+    # on the exit date the P&L of a leg is its cash_flow (a leg without exit price keeps its previous mark)
+    trades = long_call_long_put(fed_chain, filters)
+    marks = mark_to_market(trades, fed_chain)
+    last = marks.groupby("leg").agg(pnl = ("pnl", "last"), date = ("date", "last"))
+    priced = trades["cash_flow"].notna().values
+    assert len(last) == len(trades)
+    assert (last["date"].values[priced] == trades["exit_date"].values[priced]).all()
+    np.testing.assert_allclose(last["pnl"].values[priced], trades["cash_flow"].values[priced])
+
+    curve = equity_curve(trades, fed_chain)
+    assert curve["equity"].iloc[-1] == pytest.approx(BUDGET + last["pnl"].sum())
+    assert curve["gross_exposure"].values == pytest.approx(marks["mark_value"].abs().groupby(marks["date"]).sum().round(2).values)
+    assert (curve["drawdown"] <= 0).all()
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest_main import on, assign_contract_id
+from conftest import EVENT_FILTERS
+from eventCalendar import calendar_from_files, make_calendar, event_chains, run_events
+from optionStrategies import long_call_long_put
+from sample_run import mass_run_events
+from tradeStat import empty_summary
+
+HELD = {k: v for (k, v) in EVENT_FILTERS.items() if k != "exit_day_to_event"}
+
+@pytest.fixture(scope = "module")
+def market(fed_chain, ecb_chain):
+    # one chain of the quotes of both event files, and the calendar of the two events
+    chain = (
+        pd.concat([fed_chain, ecb_chain], ignore_index = True)
+        .drop(columns = ["event_day", "day_to_event"])
+        .drop_duplicates(on + ["date"])
+        .reset_index(drop = True)
+    )
+    calendar = calendar_from_files()
+    calendar = calendar[
+        (calendar["market"] == "ASX")
+        & (calendar["event"].isin(["Fed", "ECB"]))
+        & calendar["event_day"].isin(pd.to_datetime(["2015-12-16", "2016-03-16"]))
+    ]
+    assert len(calendar) == 2
+    return chain, calendar
+
+@pytest.mark.parametrize("filters", [EVENT_FILTERS, HELD])
+def test_event_chains_equal_event_files(market, fed_chain, ecb_chain, filters):
+    (chain, calendar) = market
+    files = {"Fed": fed_chain, "ECB": ecb_chain}
+    for (idx, data) in event_chains(chain, calendar):
+        expected = long_call_long_put(files[calendar.at[idx, "event"]], filters)
+        assert len(expected)
+        pd.testing.assert_frame_equal(long_call_long_put(data, filters), expected, check_dtype = False)
+
+def test_run_events_stacks_the_events(market, fed_chain, ecb_chain):
+    (chain, calendar) = market
+    trades = run_events(chain, calendar, long_call_long_put, EVENT_FILTERS)
+    assert set(trades["event"]) == {"Fed", "ECB"}
+    assert len(trades) == len(long_call_long_put(fed_chain, EVENT_FILTERS)) + len(long_call_long_put(ecb_chain, EVENT_FILTERS))
+
+def test_event_chains_equal_date_windows(market):
+    # overlapping windows and an event without quotes, against a date mask of the chain per event
+    (chain, _) = market
+    calendar = make_calendar([
+        ("c", "A", "ASX", "a", "2015-12-16"),
+        ("c", "B", "ASX", "b", "2015-12-20"),
+        ("c", "C", "ASX", "c", "2030-01-01"),
+    ])
+    ordered = assign_contract_id(chain)
+    events = dict(event_chains(chain, calendar, before = 10, after = 5))
+    assert sorted(events) == [0, 1]
+    for (idx, data) in events.items():
+        event_day = calendar.at[idx, "event_day"]
+        expected = ordered[(ordered["date"] >= event_day - pd.Timedelta(days = 10)) & (ordered["date"] <= event_day + pd.Timedelta(days = 5))]
+        pd.testing.assert_frame_equal(data.drop(columns = ["event_day", "day_to_event"]), expected.reset_index(drop = True))
+        np.testing.assert_array_equal(data["day_to_event"].values, (event_day - expected["date"]).dt.days.values)
+
+def test_mass_run_events_without_trades(market):
+    # the stats of an event without trades are 0, a window of the event day only has no exit
+    (chain, calendar) = market
+    summary = mass_run_events(chain, "long_straddle", calendar, window = (0, 0))
+    assert len(summary) == 2
+    assert (summary[list(empty_summary)] == 0).all().all()
+    assert (mass_run_events(chain, "long_straddle", calendar)["Total Trades"] > 0).all()
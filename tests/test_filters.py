@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+from datetime import datetime
+from functools import reduce
+
+from filters import filter_data, func_map, _compile_filters
+
+def _sequential(data, filters):
+    # every filter function one after the other, without the compiled masks
+    return reduce(lambda d, kv: func_map[kv[0]]["func"](d, kv[1], 0), filters.items(), data)
+
+@pytest.mark.parametrize("filters", [
+    {
+        "start_date": {"value": datetime(2015, 12, 1), "cond": "greater"},
+        "end_date": {"value": datetime(2016, 2, 1), "cond": "less_or_equal"},
+    },
+    {
+        "entry_dtm": {"value": 7, "cond": "greater"},
+        "entry_day_to_event": {"value": -1, "cond": "greater"},
+        "day_to_event": {"value": 3, "cond": "less_or_equal"},
+        "leg1_delta": {"value": 0.5, "cond": "nearest"},
+    },
+    {
+        # a comparison after a nearest filter does not commute with it
+        "entry_dtm": {"value": 40, "cond": "nearest"},
+        "day_to_event": {"value": 10, "cond": "less"},
+        "entry_day_to_event": {"value": 0, "cond": "greater_or_equal"},
+        "leg1_delta": {"value": (0.3, 0.4, 0.5), "cond": "nearest"},
+    },
+])
+def test_compiled_masks_equal_filter_functions(fed_chain, filters):
+    expected = _sequential(fed_chain, filters)
+    assert len(expected)
+    pd.testing.assert_frame_equal(filter_data(fed_chain, filters)[expected.columns], expected)
+
+def test_compile_keeps_order():
+    filters = {
+        "entry_dtm": {"value": 7, "cond": "greater"},
+        "day_to_event": {"value": 3, "cond": "less_or_equal"},
+        "leg1_delta": {"value": 0.5, "cond": "nearest"},
+        "entry_day_to_event": {"value": -1, "cond": "greater"},
+    }
+    assert [(kind, [k for (k, _) in items]) for (kind, items) in _compile_filters(filters)] == [
+        ("mask", ["entry_dtm", "day_to_event"]),
+        ("func", ["leg1_delta"]),
+        ("mask", ["entry_day_to_event"]),
+    ]
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from helpers import nearest
+
+GROUPS = {
+    "default": None,
+    "contract": ["call_put", "maturity_date", "underlying_symbol"],
+}
+
+def _merge_nearest(df, column, val, groupby):
+    # the groupby-min-merge nearest replaced by the sort-based one. a row without value has no
+    # distance: the merge matched NaN with NaN and kept the groups without any value, nearest drops them
+    data = df.assign(abs_dist = lambda r: (r[column].abs() - val).abs()).dropna(subset = ["abs_dist"])
+    return (
+        data.groupby(groupby)["abs_dist"].min().to_frame()
+        .merge(data, on = groupby + ["abs_dist"])
+        .drop("abs_dist", axis = 1)
+    )
+
+def _sorted(df):
+    return df.sort_values(["date", "call_put", "maturity_date", "strike"]).reset_index(drop = True)
+
+@pytest.mark.parametrize("column, val", [("delta", 0.5), ("delta", 0.25), ("dtm", 40), ("day_to_event", 0)])
+@pytest.mark.parametrize("groups", list(GROUPS))
+def test_nearest_equals_merge(fed_chain, column, val, groups):
+    groupby = GROUPS[groups]
+    expected = _merge_nearest(fed_chain, column, val, groupby or ["date", "call_put", "maturity_date", "underlying_symbol"])
+    result = nearest(fed_chain, column, val, groupby = groupby)
+    pd.testing.assert_frame_equal(_sorted(result)[fed_chain.columns], _sorted(expected)[fed_chain.columns])
+
+@pytest.mark.parametrize("tie, pick", [("roundup", np.max), ("rounddown", np.min)])
+def test_nearest_tie(tie, pick):
+    # two deltas at the same distance of the target, tie keeps one of them
+    df = pd.DataFrame({
+        "date": pd.Timestamp("2016-01-04"),
+        "call_put": "c",
+        "maturity_date": pd.Timestamp("2016-02-18"),
+        "underlying_symbol": "AS51",
+        "strike": [5000.0, 5025.0, 5050.0],
+        "delta": [0.75, 0.25, 0.125],
+    })
+    assert len(nearest(df, "delta", 0.5)) == 2
+    assert nearest(df, "delta", 0.5, tie = tie)["delta"].tolist() == [pick([0.75, 0.25])]
+
+def test_nearest_skips_missing_values(fed_chain):
+    assert fed_chain["delta"].isna().any()
+    assert nearest(fed_chain, "delta", 0.5)["delta"].notna().all()
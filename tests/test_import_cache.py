@@ -0,0 +1,46 @@
+import pandas as pd
+
+import importCache
+from backtest_main import assign_contract_id
+from conftest import FED_FILE
+from sample_run import SPX_FILE_STRUCT
+
+def test_cached_equals_get_data(tmp_path, fed_chain):
+    importCache.cache_stats.update(hits = 0, misses = 0)
+    cache_dir = str(tmp_path)
+    miss = importCache.get_cached_data(FED_FILE, SPX_FILE_STRUCT, cache_dir = cache_dir)
+    hit = importCache.get_cached_data(FED_FILE, SPX_FILE_STRUCT, cache_dir = cache_dir)
+    assert (importCache.cache_stats["misses"], importCache.cache_stats["hits"]) == (1, 1)
+    pd.testing.assert_frame_equal(miss, fed_chain)
+    pd.testing.assert_frame_equal(hit, fed_chain)
+
+def test_changed_struct_misses(tmp_path):
+    cache_dir = str(tmp_path)
+    importCache.get_cached_data(FED_FILE, SPX_FILE_STRUCT, cache_dir = cache_dir)
+    importCache.get_cached_data(FED_FILE, SPX_FILE_STRUCT, chunksize = 5000, cache_dir = cache_dir)
+    assert len(list(tmp_path.iterdir())) == 2
+
+def test_entry_evicted_by_another_process(tmp_path, monkeypatch, fed_chain):
+    # an entry removed between the lookup and the read is imported again
+    cache_dir = str(tmp_path)
+    importCache.get_cached_data(FED_FILE, SPX_FILE_STRUCT, cache_dir = cache_dir)
+    def evicted(file):
+        raise FileNotFoundError(file)
+    monkeypatch.setattr(importCache.feather, "read_feather", evicted)
+    misses = importCache.cache_stats["misses"]
+    pd.testing.assert_frame_equal(importCache.get_cached_data(FED_FILE, SPX_FILE_STRUCT, cache_dir = cache_dir), fed_chain)
+    assert importCache.cache_stats["misses"] == misses + 1
+
+def test_evict_missing_entry(tmp_path, monkeypatch):
+    monkeypatch.setattr(importCache, "_cache_entries", lambda cache_dir: [(0, 10, str(tmp_path / "gone.feather"))])
+    importCache._evict(str(tmp_path), 0)
+
+def test_cached_contract_ids(tmp_path, fed_chain):
+    # the contract ids are a separate entry, assigned on import only
+    cache_dir = str(tmp_path)
+    importCache.get_cached_data(FED_FILE, SPX_FILE_STRUCT, cache_dir = cache_dir)
+    misses = importCache.cache_stats["misses"]
+    for _ in range(2):
+        data = importCache.get_cached_data(FED_FILE, SPX_FILE_STRUCT, cache_dir = cache_dir, contract_ids = True)
+        pd.testing.assert_frame_equal(data, assign_contract_id(fed_chain))
+    assert importCache.cache_stats["misses"] == misses + 1
@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+import incrementalBacktest as ib
+from conftest import EVENT_FILTERS
+from definedClass import CallPut
+from optionStrategies import long_call_long_put
+
+LEGS = [(CallPut.CALL, 1), (CallPut.PUT, 1)]
+# without exit filter the trades are held to maturity (exit_dtm None)
+HELD = {k: v for (k, v) in EVENT_FILTERS.items() if k != "exit_day_to_event"}
+
+def _daily(filters, quotes):
+    state = ib.init_state(LEGS, filters, "market")
+    for (_, day) in quotes.groupby("date"):
+        state = ib.update(state, day)
+    return state
+
+@pytest.mark.parametrize("filters", [
+    EVENT_FILTERS,
+    HELD,
+    {**HELD, "entry_day_to_event": {"value": 30, "cond": "less_or_equal"}},
+])
+def test_incremental_equals_full_run(fed_chain, filters):
+    expected = long_call_long_put(fed_chain, filters)
+    assert len(expected)
+    once = ib.update(ib.init_state(LEGS, filters, "market"), fed_chain)
+    pd.testing.assert_frame_equal(ib.trades(once), expected, check_dtype = False)
+    pd.testing.assert_frame_equal(ib.trades(_daily(filters, fed_chain)), expected, check_dtype = False)
+
+def test_held_legs_before_maturity(fed_chain):
+    # before maturity the held trades stay open, the full run of the quotes so far has no exit for them either
+    filters = {**HELD, "entry_day_to_event": {"value": 30, "cond": "less_or_equal"}}
+    quotes = fed_chain[fed_chain["date"] < fed_chain["maturity_date"].min()]
+    state = _daily(filters, quotes)
+    assert len(ib.open_trades(state))
+    pd.testing.assert_frame_equal(ib.trades(state), long_call_long_put(quotes, filters), check_dtype = False)
+
+def test_path_exit_filters_raise():
+    with pytest.raises(ValueError):
+        ib.init_state(LEGS, {**EVENT_FILTERS, "exit_hold_days": 2}, "market")
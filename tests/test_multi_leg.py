@@ -0,0 +1,69 @@
+from itertools import product
+
+import numpy as np
+import pytest
+
+from backtest_main import _create_legs, _leg_candidates, _join_legs, strike_ops, trade_keys
+from definedClass import CallPut
+from helpers import nearest
+from optionStrategies import short_iron_butterfly, short_iron_condor
+
+CONDOR = [(CallPut.PUT, 1), (CallPut.PUT, -1), (CallPut.CALL, -1), (CallPut.CALL, 1)]
+
+def _brute_force(cands, strike_order):
+    # every combination of the candidates of a trade, the first one in the candidate order meeting the strike order
+    best = {}
+    by_key = [c.groupby(trade_keys) for c in cands]
+    for key in set.intersection(*(set(g.groups) for g in by_key)):
+        rows = [list(zip(g.get_group(key)[f"strike{i}"], g.get_group(key)[f"pos{i}"])) for (i, g) in enumerate(by_key)]
+        for combo in product(*rows):
+            strikes = [s for (s, _) in combo]
+            if all(strike_ops[op](strikes[a], strikes[b]) for (a, op, b) in strike_order):
+                pos = tuple(p for (_, p) in combo)
+                best[key] = min(best.get(key, pos), pos)
+    return best
+
+@pytest.mark.parametrize("strike_order", [
+    [(0, "<", 1), (1, "<", 2), (2, "<", 3)],
+    [(0, "<", 1), (1, "==", 2), (2, "<", 3)],
+    [(3, ">", 0)],
+])
+def test_join_legs_equals_brute_force(fed_chain, strike_order):
+    # a few strikes around the money on two dates, to keep the brute force small
+    dates = fed_chain["date"].drop_duplicates().iloc[[10, 40]]
+    data = fed_chain[fed_chain["date"].isin(dates) & fed_chain["strike"].between(4900, 5100)]
+    cands = [_leg_candidates(_create_legs(data, leg, idx), idx)[1] for (idx, leg) in enumerate(CONDOR)]
+    expected = _brute_force(cands, strike_order)
+    assert expected
+
+    combos = _join_legs(cands, strike_order)
+    result = {
+        tuple(row[trade_keys]): tuple(row[[f"pos{i}" for i in range(len(CONDOR))]].astype(np.int64))
+        for (_, row) in combos.iterrows()
+    }
+    assert result == expected
+
+WINGS = {
+    "entry_dtm": {"value": 7, "cond": "greater"},
+    "day_to_event": {"value": 3, "cond": "less_or_equal"},
+    "leg1_delta": {"value": 0.2, "cond": "nearest"},
+    "leg4_delta": {"value": 0.2, "cond": "nearest"},
+    "exit_day_to_event": {"value": -1, "cond": "nearest"},
+}
+
+def test_iron_butterfly_body_at_the_money(fed_chain):
+    # without body filter the put and call bodies are the strike of the calls with the delta nearest 0.5
+    trades = short_iron_butterfly(fed_chain, WINGS)
+    assert len(trades)
+    atm = nearest(fed_chain[fed_chain["call_put"] == "c"], "delta", 0.5).groupby(["date", "maturity_date"])["strike"].max()
+    for (_, t) in trades.groupby(level = 0):
+        (put_wing, put_body, call_body, call_wing) = (
+            t[(t["call_put"] == cp) & (t["ratio"] == ratio)].iloc[0] for (cp, ratio) in (("p", 1), ("p", -1), ("c", -1), ("c", 1))
+        )
+        assert put_wing["strike"] < put_body["strike"] == call_body["strike"] < call_wing["strike"]
+        assert call_body["strike"] == atm[(call_body["entry_date"], call_body["maturity_date"])]
+        assert abs(call_body["entry_delta"]) == pytest.approx(0.5, abs = 0.1)
+
+def test_legs_without_selection_raise(fed_chain):
+    with pytest.raises(ValueError):
+        short_iron_condor(fed_chain, WINGS)
@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+
+import helpers
+import paramSweep
+from definedClass import CallPut
+from nearestIndex import nearest_many, strike_pct_values
+from test_param_sweep import BASE, GRID, LEGS
+
+TARGETS = [0.1, 0.25, 0.3, 0.45, 0.5, 0.55, 0.9]
+
+@pytest.mark.parametrize("tie", [None, "roundup", "rounddown", "first"])
+@pytest.mark.parametrize("call_put", [CallPut.CALL, CallPut.PUT])
+def test_nearest_many_equals_nearest(fed_chain, call_put, tie):
+    leg = helpers.callput(fed_chain, call_put)
+    leg = leg.assign(strike_pct = strike_pct_values(leg))
+    for column in ("delta", "strike_pct"):
+        rows = nearest_many(leg, column, TARGETS, tie = tie)
+        for t in TARGETS:
+            got = rows[rows["target"] == t].drop(columns = "target").reset_index(drop = True)
+            pd.testing.assert_frame_equal(got, helpers.nearest(leg, column, t, tie = tie))
+
+def test_sweep_selects_legs_with_the_index(monkeypatch, fed_chain):
+    calls = {"nearest": 0, "nearest_many": 0}
+    nearest, many = helpers.nearest, paramSweep.nearest_many
+
+    def count_nearest(*args, **kwargs):
+        calls["nearest"] += 1
+        return nearest(*args, **kwargs)
+
+    def count_many(*args, **kwargs):
+        calls["nearest_many"] += 1
+        return many(*args, **kwargs)
+
+    monkeypatch.setattr(helpers, "nearest", count_nearest)
+    monkeypatch.setattr(paramSweep, "nearest_many", count_many)
+    paramSweep.sweep(fed_chain, LEGS, GRID, BASE, workers = 1)
+    # one index per (leg filter, tie): leg1_delta, leg2_delta and leg2_delta with tie "first"
+    assert calls == {"nearest": 0, "nearest_many": 3}
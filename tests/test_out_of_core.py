@@ -0,0 +1,31 @@
+import pandas as pd
+import pytest
+
+from chainStore import store_chain
+from conftest import EVENT_FILTERS
+from optionStrategies import long_call_long_put
+from outOfCore import run_partitioned
+
+HELD = {k: v for (k, v) in EVENT_FILTERS.items() if k != "exit_day_to_event"}
+# a nearest entry_dtm compares the quotes of one maturity only, so it is exact per partition too
+NEAREST_DTM = {**HELD, "entry_dtm": {"value": 40, "cond": "nearest"}, "day_to_event": {"value": 60, "cond": "less_or_equal"}}
+
+@pytest.mark.parametrize("filters", [EVENT_FILTERS, HELD, NEAREST_DTM])
+@pytest.mark.parametrize("by", ["maturity", "month"])
+def test_partitioned_equals_full_run(fed_chain, filters, by):
+    expected = long_call_long_put(fed_chain, filters)
+    assert len(expected)
+    pd.testing.assert_frame_equal(run_partitioned(fed_chain, long_call_long_put, filters, by = by), expected)
+
+@pytest.mark.parametrize("filters", [EVENT_FILTERS, HELD])
+def test_partitioned_store_equals_full_run(tmp_path, ecb_chain, filters):
+    root = str(tmp_path / "chain")
+    store_chain(ecb_chain, root)
+    expected = long_call_long_put(ecb_chain, filters)
+    assert len(expected)
+    pd.testing.assert_frame_equal(
+        run_partitioned(root, long_call_long_put, filters),
+        expected,
+        check_dtype = False,
+        check_categorical = False,
+    )
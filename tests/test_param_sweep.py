@@ -0,0 +1,62 @@
+import pytest
+
+import paramSweep
+from conftest import EVENT_FILTERS
+from definedClass import CallPut
+from optionStrategies import long_call_long_put, long_call_spread
+from tradeStat import results
+
+LEGS = [(CallPut.CALL, 1), (CallPut.PUT, 1)]
+BASE = {k: v for (k, v) in EVENT_FILTERS.items() if k not in ("leg1_delta", "leg2_delta")}
+GRID = {
+    "leg1_delta": [{"value": x, "cond": "nearest"} for x in (0.2, 0.3, 0.45, 0.5, 0.6)],
+    "leg2_delta": [{"value": x, "cond": "nearest", "tie": tie} for x in (0.4, 0.5) for tie in (None, "first")],
+    "exit_day_to_event": [{"value": -1, "cond": "nearest"}, {"value": 0, "cond": "nearest"}],
+}
+
+def _expected(data, point):
+    trades = long_call_long_put(data, {**BASE, **point})
+    return results(trades)[0] if len(trades) else paramSweep.empty_summary
+
+@pytest.mark.parametrize("chain", ["fed_chain", "ecb_chain"])
+def test_sweep_equals_full_runs(request, chain):
+    data = request.getfixturevalue(chain)
+    out = paramSweep.sweep(data, LEGS, GRID, BASE, workers = 1)
+
+    points = paramSweep._grid_points(GRID)
+    assert len(out) == len(points)
+    for (i, point) in enumerate(points):
+        expected = _expected(data, point)
+        assert {k: out.iloc[i][k] for k in expected} == expected
+
+def test_sweep_runs_prefix_once(monkeypatch, fed_chain):
+    # the entry filters before the leg selection run once for the whole delta grid
+    calls = []
+    apply_filters = paramSweep._apply_filters
+    monkeypatch.setattr(paramSweep, "_apply_filters", lambda legs, fil: calls.append(fil) or apply_filters(legs, fil))
+    paramSweep.sweep(fed_chain, LEGS, GRID, BASE, workers = 1)
+    assert len(calls) == 1
+    assert not any(k.startswith("leg") for k in calls[0])
+
+def test_sweep_process_pool(fed_chain):
+    grid = {"leg1_delta": GRID["leg1_delta"][:2], "entry_dtm": [{"value": 7, "cond": "greater"}, {"value": 20, "cond": "greater"}]}
+    base = {k: v for (k, v) in BASE.items() if k != "entry_dtm"}
+    assert paramSweep.sweep(fed_chain, LEGS, grid, base, workers = 2).equals(paramSweep.sweep(fed_chain, LEGS, grid, base, workers = 1))
+
+def test_sweep_keeps_strike_order(fed_chain):
+    # a call spread sweep joins the legs with the strike order of long_call_spread
+    legs = [(CallPut.CALL, 1), (CallPut.CALL, -1)]
+    grid = {
+        "leg1_delta": [{"value": x, "cond": "nearest"} for x in (0.4, 0.5)],
+        "leg2_delta": [{"value": x, "cond": "nearest"} for x in (0.2, 0.3, 0.5)],
+    }
+    out = paramSweep.sweep(fed_chain, legs, grid, BASE, workers = 1, strike_order = [(0, "<", 1)])
+    for (i, point) in enumerate(paramSweep._grid_points(grid)):
+        trades = long_call_spread(fed_chain, {**BASE, **point})
+        expected = results(trades)[0] if len(trades) else paramSweep.empty_summary
+        assert {k: out.iloc[i][k] for k in expected} == expected
+    assert (out["Total Trades"] == 0).any() and (out["Total Trades"] > 0).any()
+
+def test_sweep_legs_without_selection_raise(fed_chain):
+    with pytest.raises(ValueError):
+        paramSweep.sweep(fed_chain, LEGS, {"leg1_delta": GRID["leg1_delta"]}, BASE, workers = 1, strike_order = [(0, "<", 1)])
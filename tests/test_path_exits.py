@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from backtest_main import assign_contract_id, create_spread, simulate
+from conftest import EVENT_FILTERS
+from definedClass import CallPut
+from filters import filter_data
+from optionStrategies import _prepare_filters
+
+LEGS = [(CallPut.CALL, 1), (CallPut.PUT, 1)]
+HELD = {k: v for (k, v) in EVENT_FILTERS.items() if k != "exit_day_to_event"}
+KEYS = ["entry_date", "maturity_date", "call_put", "strike"]
+
+@pytest.fixture(scope = "module")
+def chain(fed_chain):
+    return assign_contract_id(fed_chain)
+
+def _passage_reference(spreads, chain, breach, exit_day_to_event = None):
+    # trade by trade: the first date after entry with a quote of every leg where breach(day) is True or
+    # every leg is at the exit day_to_event, else the last such date without exit_day_to_event
+    exits = {}
+    for (_, legs) in spreads.groupby(level = 0):
+        entry_date = legs["date"].iloc[0]
+        quotes = chain[chain["contract_id"].isin(legs["contract_id"]) & (chain["date"] > entry_date)]
+        quotes = quotes.merge(legs[["contract_id", "ratio", "leg"]], on = "contract_id")
+        quotes["close"] = np.where(quotes["ratio"] > 0, quotes["bid"], quotes["ask"]) * quotes["ratio"]
+        days = [(date, q) for (date, q) in quotes.groupby("date") if len(q) == len(legs)]
+        entry = legs["entry_opt_price"].sum()
+        hit = [
+            date for (date, q) in days
+            if breach({
+                "hold_days": (date - entry_date).days,
+                "pnl_pct": (q["close"].sum() + entry) / abs(entry) * 100,
+                "spread_price": q["close"].sum(),
+                "spread_delta": (q["delta"] * q["ratio"]).sum(),
+                "leg1_delta": abs(q.loc[q["leg"] == 0, "delta"]).max(),
+            }) or (exit_day_to_event is not None and (q["day_to_event"] == exit_day_to_event).all())
+        ]
+        exit_date = hit[0] if hit else days[-1][0] if days and exit_day_to_event is None else None
+        if exit_date is not None:
+            exits.update({(entry_date, r["maturity_date"], r["call_put"], r["strike"]): exit_date for (_, r) in legs.iterrows()})
+    return exits
+
+@pytest.mark.parametrize("base, path_filters, breach", [
+    (HELD, {"exit_hold_days": {"value": 3}}, lambda d: d["hold_days"] >= 3),
+    (HELD, {"exit_hold_days": {"value": 5, "cond": "greater"}}, lambda d: d["hold_days"] > 5),
+    (HELD, {"exit_hold_days": 3}, lambda d: d["hold_days"] >= 3),
+    (HELD, {"exit_profit_loss_pct": {"value": (-10, 10)}}, lambda d: d["pnl_pct"] <= -10 or d["pnl_pct"] >= 10),
+    (EVENT_FILTERS, {"exit_profit_loss_pct": {"value": (-5, None)}}, lambda d: d["pnl_pct"] <= -5),
+    (EVENT_FILTERS, {"exit_spread_price": {"value": (None, 250)}}, lambda d: d["spread_price"] > 250),
+    (HELD, {"exit_leg_1_delta": {"value": (0.45, 0.55)}}, lambda d: d["leg1_delta"] < 0.45 or d["leg1_delta"] > 0.55),
+    (EVENT_FILTERS, {"exit_leg_1_delta": {"value": (0.48, None)}}, lambda d: d["leg1_delta"] < 0.48),
+    (HELD, {"exit_spread_delta": {"value": (-0.05, 0.05)}}, lambda d: d["spread_delta"] < -0.05 or d["spread_delta"] > 0.05),
+    (EVENT_FILTERS, {"exit_spread_delta": {"value": (None, 0.02)}}, lambda d: d["spread_delta"] > 0.02),
+])
+def test_path_exits_equal_trade_loop(chain, base, path_filters, breach):
+    f = _prepare_filters({**base, **path_filters})
+    spreads = filter_data(chain, f[0]).pipe(create_spread, LEGS, f[1], f[3], "market")
+    trades = simulate(spreads, chain, f[2], f[4], "market")
+    assert len(trades)
+    exit_day_to_event = base.get("exit_day_to_event", {}).get("value")
+    expected = _passage_reference(spreads, chain, breach, exit_day_to_event)
+    assert dict(zip(map(tuple, trades[KEYS].values), trades["exit_date"])) == expected
+
+def test_hold_days_cond_raises(chain):
+    f = _prepare_filters({**HELD, "exit_hold_days": {"value": 3, "cond": "between"}})
+    spreads = filter_data(chain, f[0]).pipe(create_spread, LEGS, f[1], f[3], "market")
+    with pytest.raises(ValueError):
+        simulate(spreads, chain, f[2], f[4], "market")
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from pricing import bs_price, bs_greeks, implied_vol, fill_greeks, greek_fields, DAYS_PER_YEAR
+
+@pytest.fixture(scope = "module")
+def grid():
+    rng = np.random.default_rng(0)
+    n = 2000
+    return {
+        "s": np.full(n, 5000.0),
+        "k": 5000.0 * np.exp(rng.uniform(-0.3, 0.3, n)),
+        "t": rng.uniform(5, 400, n) / DAYS_PER_YEAR,
+        "r": 0.02,
+        "vol": rng.uniform(0.05, 1.0, n),
+        "is_call": rng.random(n) < 0.5,
+    }
+
+def test_implied_vol_round_trip(grid):
+    g = grid
+    price = bs_price(g["s"], g["k"], g["t"], g["r"], g["vol"], g["is_call"])
+    # the quotes with a price the vol can be told from
+    ok = bs_greeks(g["s"], g["k"], g["t"], g["r"], g["vol"], g["is_call"])["vega"] > 1e-2
+    vol = implied_vol(price[ok], g["s"][ok], g["k"][ok], g["t"][ok], g["r"], g["is_call"][ok])
+    np.testing.assert_allclose(vol, g["vol"][ok], atol = 1e-4)
+
+def test_greeks_equal_finite_differences(grid):
+    g = grid
+    greeks = bs_greeks(g["s"], g["k"], g["t"], g["r"], g["vol"], g["is_call"])
+    price = lambda s = g["s"], t = g["t"], r = g["r"], vol = g["vol"]: bs_price(s, g["k"], t, r, vol, g["is_call"])
+    (ds, dt, dv, dr) = (0.5, 1e-5, 1e-5, 1e-5)
+    np.testing.assert_allclose(greeks["delta"], (price(s = g["s"] + ds) - price(s = g["s"] - ds)) / (2 * ds), atol = 1e-4)
+    np.testing.assert_allclose(greeks["gamma"], (price(s = g["s"] + ds) - 2 * price() + price(s = g["s"] - ds)) / ds ** 2, atol = 1e-4)
+    np.testing.assert_allclose(greeks["vega"], (price(vol = g["vol"] + dv) - price(vol = g["vol"] - dv)) / (2 * dv) / 100, atol = 1e-3)
+    np.testing.assert_allclose(greeks["rho"], (price(r = g["r"] + dr) - price(r = g["r"] - dr)) / (2 * dr) / 100, atol = 1e-3)
+    np.testing.assert_allclose(greeks["theta"], -(price(t = g["t"] + dt) - price(t = g["t"] - dt)) / (2 * dt) / DAYS_PER_YEAR, atol = 1e-3)
+
+def test_fill_greeks(fed_chain):
+    # the missing greeks are priced from the implied vol, the quoted ones are kept
+    data = fed_chain.drop(columns = list(greek_fields))
+    filled = fill_greeks(data)
+    priced = fed_chain["implied_vol"].notna() & (fed_chain["dtm"] > 0)
+    assert priced.mean() > 0.5
+    assert filled.loc[priced, list(greek_fields)].notna().all().all()
+    assert (np.abs(filled["delta"] - fed_chain["delta"]).quantile(0.95)) < 0.05
+
+    partial = fed_chain.assign(delta = fed_chain["delta"].where(fed_chain["strike"] > 5000))
+    refilled = fill_greeks(partial)
+    kept = partial["delta"].notna()
+    assert (refilled["delta"][kept] == fed_chain["delta"][kept]).all()
+    np.testing.assert_allclose(refilled["delta"][~kept], filled["delta"][~kept])
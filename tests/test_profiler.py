@@ -0,0 +1,24 @@
+import pandas as pd
+import pytest
+
+from conftest import EVENT_FILTERS
+from optionStrategies import long_call_long_put
+from profiler import profiled, profile, profiled_run
+
+PATH_FILTERS = {**EVENT_FILTERS, "exit_profit_loss_pct": {"value": (-5, None)}}
+
+@pytest.mark.parametrize("filters", [EVENT_FILTERS, PATH_FILTERS])
+def test_profiled_run_equals_run(fed_chain, filters):
+    (trades, report) = profiled_run(long_call_long_put, fed_chain, filters, memory = False)
+    pd.testing.assert_frame_equal(trades, long_call_long_put(fed_chain, filters))
+    assert {"init_filters", "create_spread", "simulate"} <= set(report["name"])
+    assert report.loc[report["name"] == "simulate", "rows_out"].iloc[0] == len(trades)
+
+def test_disabled_profiled_is_the_function():
+    assert profiled(len) is len
+    with profile(memory = False):
+        assert profiled(len) is not len
+        with pytest.raises(ValueError):
+            with profile():
+                pass
+    assert profiled(len) is len
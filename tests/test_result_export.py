@@ -0,0 +1,76 @@
+import os
+import pandas as pd
+import pytest
+
+import sample_run
+from conftest import ROOT, FED_FILE
+from resultExport import ResultWriter, partition_cols
+from tradeStat import results
+
+def _keys(category, event):
+    return {"category": category, "event": event, "market": "ASX", "name": event.lower()}
+
+def _read(root, kind, keys):
+    frame = pd.read_parquet(os.path.join(root, kind))
+    for col in partition_cols:
+        frame[col] = frame[col].astype(str)
+    frame = frame[(frame["event"] == keys["event"])]
+    return frame.drop(columns = list(keys)).reset_index(drop = True)
+
+def test_export_equals_results(tmp_path, fed_chain, ecb_chain):
+    runs = [
+        (_keys("Monetary Policy", "Fed"), results(sample_run.run_strategy(fed_chain, "long_straddle"))),
+        (_keys("Monetary Policy", "ECB"), results(sample_run.run_strategy(ecb_chain, "long_straddle"))),
+    ]
+    with ResultWriter(str(tmp_path)) as writer:
+        for (keys, r) in runs:
+            writer.put(keys, *r)
+
+    for (keys, (stats, details, trades)) in runs:
+        pd.testing.assert_frame_equal(_read(tmp_path, "details", keys), details.reset_index(), check_dtype = False)
+        pd.testing.assert_frame_equal(_read(tmp_path, "trades", keys), trades.reset_index(), check_dtype = False)
+        assert _read(tmp_path, "summary", keys).iloc[0].to_dict() == pytest.approx(stats)
+
+def test_close_twice(tmp_path, fed_chain):
+    writer = ResultWriter(str(tmp_path))
+    writer.put(_keys("Monetary Policy", "Fed"), *results(sample_run.run_strategy(fed_chain, "long_straddle")))
+    summary = writer.close()
+    assert writer.close() is summary
+    assert len(pd.read_parquet(os.path.join(tmp_path, "summary"))) == 1
+    with pytest.raises(ValueError):
+        writer.put(_keys("Monetary Policy", "Fed"), *results(sample_run.run_strategy(fed_chain, "long_straddle")))
+
+def test_writer_error_is_chained(tmp_path, fed_chain):
+    (stats, details, trades) = results(sample_run.run_strategy(fed_chain, "long_straddle"))
+    writer = ResultWriter(str(tmp_path))
+    writer.put(_keys("Monetary Policy", "Fed"), stats, details.assign(bad = object()), trades)
+    with pytest.raises(RuntimeError) as err:
+        writer.close()
+    assert err.value.__cause__ is not None
+
+def test_run_error_is_not_hidden(tmp_path, monkeypatch):
+    # a failing event raises its own error, not the one of the writer
+    def failing(csv_file, struct, strategy, market, after, timeLag, writer = None, keys = None, cache_dir = None):
+        writer.error = OSError("disk full")
+        raise KeyError(csv_file)
+    monkeypatch.setattr(sample_run, "_run_event", failing)
+    with pytest.raises(KeyError):
+        sample_run.mass_get_data("long_straddle", infp = ROOT, export = str(tmp_path))
+
+def test_mass_get_data_export(tmp_path, fed_chain):
+    summary = sample_run.mass_get_data("long_straddle", infp = ROOT, export = str(tmp_path / "export"), cache_dir = str(tmp_path / "cache"))
+    init_balance, t_cost, contract_size = sample_run._market_params("ASX")
+    expected = results(sample_run.run_strategy(fed_chain, "long_straddle", contract_size = contract_size), init_balance = init_balance, t_cost = t_cost)
+    keys = {**_keys("Monetary Policy", "Fed"), "name": os.path.basename(FED_FILE).replace(".csv", "")}
+    assert summary.drop(columns = list(keys)).iloc[0].to_dict() == pytest.approx(expected[0])
+    pd.testing.assert_frame_equal(_read(tmp_path / "export", "trades", keys), expected[2].reset_index(), check_dtype = False)
+
+def test_parallel_export_equals_serial(tmp_path, fed_chain):
+    cache_dir = str(tmp_path / "cache")
+    serial = sample_run.mass_get_data("long_straddle", infp = ROOT, export = str(tmp_path / "serial"), cache_dir = cache_dir)
+    summary = sample_run.mass_get_data_parallel("long_straddle", infp = ROOT, workers = 1, export = str(tmp_path / "parallel"), cache_dir = cache_dir)
+    assert summary["error"].isna().all()
+    keys = {**_keys("Monetary Policy", "Fed"), "name": os.path.basename(FED_FILE).replace(".csv", "")}
+    for kind in ("details", "trades", "summary"):
+        pd.testing.assert_frame_equal(_read(tmp_path / "parallel", kind, keys), _read(tmp_path / "serial", kind, keys))
+    assert len(serial) == 1
@@ -0,0 +1,29 @@
+import os
+import pandas as pd
+
+import sample_run
+from conftest import ROOT, FED_FILE
+from importCache import cache_stats
+from tradeStat import results
+
+def test_mass_get_data_parallel_default_struct(tmp_path, monkeypatch, fed_chain):
+    # no Excel writer engine is needed, the workers are forked with the patched to_excel
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pd.DataFrame, "to_excel", lambda *args, **kwargs: None)
+    cache_dir = str(tmp_path / "cache")
+    before = dict(cache_stats)
+    summary = sample_run.mass_get_data_parallel("long_straddle", infp = ROOT, event = "Fed", workers = 1, cache_dir = cache_dir)
+    # the cache misses of the worker are counted in this process
+    assert cache_stats["misses"] == before["misses"] + 1
+    sample_run.mass_get_data_parallel("long_straddle", infp = ROOT, event = "Fed", workers = 1, cache_dir = cache_dir)
+    assert cache_stats["hits"] == before["hits"] + 1
+
+    init_balance, t_cost, contract_size = sample_run._market_params("ASX")
+    expected = results(
+        sample_run.run_strategy(fed_chain, "long_straddle", contract_size = contract_size),
+        init_balance = init_balance,
+        t_cost = t_cost,
+    )[0]
+    row = summary.loc[os.path.basename(FED_FILE)]
+    assert row["error"] is None
+    assert {k: row[k] for k in expected} == expected
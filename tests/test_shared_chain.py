@@ -0,0 +1,25 @@
+import pandas as pd
+
+from backtest_main import assign_contract_id
+from conftest import EVENT_FILTERS
+from optionStrategies import long_call_long_put, short_call_short_put
+from sharedChain import publish_chain, release_chain, attach_chain, map_strategies
+
+def test_attach_equals_chain(fed_chain):
+    chain = assign_contract_id(fed_chain)
+    handle, blocks = publish_chain(chain)
+    try:
+        shared = attach_chain(handle)
+        for col in chain.columns:
+            # the object columns are shared as categoricals
+            pd.testing.assert_series_equal(shared[col].astype(chain[col].dtype), chain[col])
+        pd.testing.assert_frame_equal(long_call_long_put(shared, EVENT_FILTERS), long_call_long_put(chain, EVENT_FILTERS), check_dtype = False, check_categorical = False)
+        del shared
+    finally:
+        release_chain(blocks)
+
+def test_map_strategies_equals_runs(fed_chain):
+    jobs = [("long_call_long_put", EVENT_FILTERS, "market"), ("short_call_short_put", EVENT_FILTERS, "mid_price")]
+    (long, short) = map_strategies(fed_chain, jobs, workers = 2)
+    pd.testing.assert_frame_equal(long, long_call_long_put(fed_chain, EVENT_FILTERS), check_dtype = False, check_categorical = False)
+    pd.testing.assert_frame_equal(short, short_call_short_put(fed_chain, EVENT_FILTERS, mode = "mid_price"), check_dtype = False, check_categorical = False)
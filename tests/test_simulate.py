@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest_main import on, assign_contract_id, create_spread, simulate, _close_legs, _number_trades
+from conftest import EVENT_FILTERS
+from definedClass import CallPut
+from filters import filter_data
+from optionStrategies import _prepare_filters
+
+LEGS = [(CallPut.CALL, 1), (CallPut.PUT, 1)]
+
+@pytest.fixture(scope = "module")
+def chain(fed_chain):
+    return assign_contract_id(fed_chain)
+
+def _spreads(chain, filters):
+    f = _prepare_filters(filters)
+    return filter_data(chain, f[0]).pipe(create_spread, LEGS, f[1], f[3], "market"), f
+
+def test_contract_id_equals_merge(chain):
+    # spreads without contract_id are looked up in the contract dictionary of the chain
+    (spreads, f) = _spreads(chain, EVENT_FILTERS)
+    fast = simulate(spreads, chain, f[2], f[4], "market")
+    assert len(fast)
+    pd.testing.assert_frame_equal(
+        fast,
+        simulate(spreads.drop(columns = "contract_id"), chain.drop(columns = "contract_id"), f[2], f[4], "market"),
+        check_dtype = False,
+    )
+
+def _first_exit_reference(spreads, chain, exit_filters, mode = "market"):
+    # every quote of the legs merged and filtered by the exit filters, then the first date after the
+    # entry date where every leg of the trade has a quote
+    merged = (
+        pd.merge(spreads.drop(columns = "contract_id").rename_axis("trade").reset_index(), chain.drop(columns = "contract_id"), on = on, suffixes = ("_entry", "_exit"))
+        .pipe(filter_data, filters = exit_filters)
+    )
+    if all(v is None for v in exit_filters.values()):
+        merged = merged[merged["dtm_exit"] < 1] # held to maturity
+    merged = merged[merged["date_exit"] > merged["date_entry"]]
+    n_legs = spreads.index.value_counts()
+    complete = merged.groupby(["trade", "date_exit"])["trade"].transform("size") == n_legs.reindex(merged["trade"]).values
+    first = merged[complete].groupby("trade")["date_exit"].min()
+    return (
+        merged[complete & (merged["date_exit"] == first.reindex(merged["trade"]).values)]
+        .drop(columns = "trade")
+        .reset_index(drop = True)
+        .pipe(_close_legs, {}, mode)
+        .pipe(_number_trades)
+    )
+
+@pytest.mark.parametrize("exits", [
+    {"exit_day_to_event": {"value": -1, "cond": "nearest"}},
+    {"exit_day_to_event": {"value": 0, "cond": "nearest"}},
+    {"exit_dtm": {"value": 20, "cond": "nearest"}},
+    {"exit_dtm": {"value": 60, "cond": "less"}, "exit_day_to_event": {"value": -2, "cond": "nearest"}},
+    {}, # held to maturity
+])
+def test_exit_masks_equal_exit_filters(chain, exits):
+    # the exit masks give the exits of the exit filters of func_map
+    filters = {**{k: v for (k, v) in EVENT_FILTERS.items() if k != "exit_day_to_event"}, **exits}
+    (spreads, f) = _spreads(chain, filters)
+    trades = simulate(spreads, chain, f[2], f[4], "market")
+    assert len(trades)
+    pd.testing.assert_frame_equal(trades, _first_exit_reference(spreads, chain, f[2]), check_dtype = False)
+
+def test_legs_exit_on_the_same_date(chain):
+    # a leg without quote on the exit date of the other leg: the trade exits on the next date both legs are quoted
+    filters = {**{k: v for (k, v) in EVENT_FILTERS.items() if k != "exit_day_to_event"}, "exit_dtm": {"value": 20, "cond": "nearest"}}
+    (spreads, f) = _spreads(chain, filters)
+    exits = simulate(spreads, chain, f[2], f[4], "market")
+    call = exits[exits["call_put"] == "c"].iloc[0]
+    gap = (chain["strike"] == call["strike"]) & (chain["call_put"] == "c") & (chain["maturity_date"] == call["maturity_date"]) & (chain["date"] == call["exit_date"])
+    trades = simulate(spreads, chain[~gap], f[2], f[4], "market")
+    assert (trades.groupby(level = 0)["exit_date"].nunique() == 1).all()
+    assert (trades.groupby(level = 0).size() == 2).all()
+    moved = trades[(trades["entry_date"] == call["entry_date"]) & (trades["maturity_date"] == call["maturity_date"])]
+    assert len(moved) and (moved["exit_date"] > call["exit_date"]).all()
+    pd.testing.assert_frame_equal(trades, _first_exit_reference(spreads, chain[~gap], f[2]), check_dtype = False)
@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+from conftest import EVENT_FILTERS
+from definedClass import CallPut
+from optionStrategies import long_call_long_put, _by_entry_date, _prepare_filters
+from profiler import profile, report_frame
+from streaming import stream_trades, run_stream, FrameSink, StatsSink
+from tradeStat import results
+
+LEGS = [(CallPut.CALL, 1), (CallPut.PUT, 1)]
+HELD = {k: v for (k, v) in EVENT_FILTERS.items() if k != "exit_day_to_event"}
+# a nearest entry_dtm compares the quotes of different dates, the spreads are then created once
+NEAREST_DTM = {
+    **HELD,
+    "entry_dtm": {"value": 40, "cond": "nearest"},
+    "entry_day_to_event": {"value": 30, "cond": "less_or_equal"},
+    "day_to_event": {"value": 60, "cond": "less_or_equal"},
+}
+
+@pytest.mark.parametrize("filters", [EVENT_FILTERS, HELD, NEAREST_DTM])
+@pytest.mark.parametrize("batch_days", [1, 7])
+def test_stream_equals_full_run(fed_chain, filters, batch_days):
+    expected = long_call_long_put(fed_chain, filters)
+    assert len(expected)
+    batches = list(stream_trades(fed_chain, LEGS, filters, batch_days = batch_days))
+    assert len(batches) > 1 or batch_days > 1
+    pd.testing.assert_frame_equal(pd.concat(batches), expected)
+
+def test_by_entry_date():
+    assert _by_entry_date(_prepare_filters(EVENT_FILTERS)[1])
+    assert not _by_entry_date(_prepare_filters(NEAREST_DTM)[1])
+
+def test_stats_sink_equals_results(ecb_chain):
+    (trades, (stats, per_trade)) = run_stream(ecb_chain, LEGS, HELD, [FrameSink(), StatsSink()], batch_days = 5)
+    expected = results(long_call_long_put(ecb_chain, HELD))
+    pd.testing.assert_frame_equal(trades, expected[1])
+    assert stats == expected[0]
+    pd.testing.assert_frame_equal(per_trade, expected[2])
+
+def test_strategies_do_not_stream(fed_chain):
+    stream = stream_trades(fed_chain, LEGS, EVENT_FILTERS)
+    assert isinstance(long_call_long_put(fed_chain, EVENT_FILTERS), pd.DataFrame)
+    next(stream)
+
+def test_exit_mask_computed_once(fed_chain):
+    with profile(memory = False) as records:
+        batches = list(stream_trades(fed_chain, LEGS, EVENT_FILTERS, batch_days = 1))
+    names = report_frame(records)["name"]
+    assert (names == "_exit_mask").sum() == 1
+    assert (names == "simulate").sum() == len(batches) > 1
+
+class _FailingSink(FrameSink):
+    def write(self, trades):
+        raise KeyError("write")
+
+class _CloseFailingSink(FrameSink):
+    def close(self):
+        raise OSError("close")
+
+def test_stream_raises_the_error_of_the_run(ecb_chain):
+    # the sinks are aborted, not closed, so that the error of the run is the one raised
+    with pytest.raises(KeyError, match = "write"):
+        run_stream(ecb_chain, LEGS, HELD, [_CloseFailingSink(), _FailingSink()], batch_days = 5)
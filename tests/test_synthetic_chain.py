@@ -0,0 +1,32 @@
+import os
+import pandas as pd
+
+from benchmark import compare, unmatched_sizes, BASELINE
+from data_import import fields
+from syntheticChain import synthetic_chain
+
+def test_same_seed_same_chain():
+    pd.testing.assert_frame_equal(synthetic_chain(n_underlyings = 2, n_days = 20, seed = 3), synthetic_chain(n_underlyings = 2, n_days = 20, seed = 3))
+    assert not synthetic_chain(n_days = 20, seed = 3).equals(synthetic_chain(n_days = 20, seed = 4))
+
+def test_chain_format():
+    data = synthetic_chain(n_days = 20)
+    required = [name for (name, req, *_) in fields if req is True]
+    assert set(required) <= set(data.columns)
+    assert (data["bid"] <= data["ask"]).all()
+    assert (data["bid"] >= 0).all()
+
+def test_compare_flags_regressions():
+    base = {"small": {"rows": 10, "stages": {"simulate": {"seconds": 1.0, "peak_mb": 10.0}}}}
+    report = {"small": {"rows": 10, "stages": {"simulate": {"seconds": 1.5, "peak_mb": 10.5}}}}
+    assert compare(report, base) == [("small", "simulate", "seconds", 1.0, 1.5)]
+    assert compare({"small": {**report["small"], "rows": 20}}, base) == []
+
+def test_unmatched_sizes_reported():
+    base = {"small": {"rows": 10, "stages": {}}}
+    report = {"small": {"rows": 20, "stages": {}}, "medium": {"rows": 30, "stages": {}}}
+    assert unmatched_sizes(report, base) == ["small", "medium"]
+    assert unmatched_sizes({"small": base["small"]}, base) == []
+
+def test_baseline_next_to_the_module():
+    assert os.path.isabs(BASELINE)
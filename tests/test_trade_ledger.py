@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import EVENT_FILTERS
+from optionStrategies import long_call_long_put
+from tradeLedger import TradeLedger, concat_ledgers
+from tradeStat import results, calc_pnl
+
+HELD = {k: v for (k, v) in EVENT_FILTERS.items() if k != "exit_day_to_event"}
+
+@pytest.fixture(params = ["fed_chain", "ecb_chain"])
+def trades(request):
+    return long_call_long_put(request.getfixturevalue(request.param), HELD)
+
+def test_round_trip(trades):
+    assert len(trades)
+    pd.testing.assert_frame_equal(TradeLedger.from_frame(trades).to_frame(), trades, check_dtype = False, check_categorical = False)
+
+def test_results_equal_frame_results(trades):
+    (stats, ledger, per_trade) = results(TradeLedger.from_frame(trades))
+    expected = results(trades)
+    assert stats == expected[0]
+    assert isinstance(ledger, TradeLedger)
+    pd.testing.assert_frame_equal(per_trade, expected[2], check_dtype = False)
+
+def test_calc_pnl_equals_frame(trades):
+    ledger = calc_pnl(TradeLedger.from_frame(trades))
+    expected = calc_pnl(trades.copy())
+    for col in ("entry_price", "exit_price", "cash_flow"):
+        np.testing.assert_allclose(ledger.column(col), expected[col].values)
+
+def test_concat_ledgers(fed_chain, ecb_chain):
+    frames = [long_call_long_put(fed_chain, HELD), long_call_long_put(ecb_chain, HELD)]
+    ledger = concat_ledgers([TradeLedger.from_frame(f) for f in frames])
+    pd.testing.assert_frame_equal(ledger.to_frame(), pd.concat(frames), check_dtype = False, check_categorical = False)
+
+@pytest.mark.parametrize("name", ["call_put", "underlying_symbol"])
+def test_missing_category_raises(trades, name):
+    trades = trades.astype({name: object})
+    trades.iloc[0, trades.columns.get_loc(name)] = None
+    with pytest.raises(ValueError):
+        TradeLedger.from_frame(trades)
@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+
+from conftest import EVENT_FILTERS
+from optionStrategies import long_call_long_put, short_call_short_put
+from tradeStat import results, trade_stats, stack_ledgers
+
+HELD = {k: v for (k, v) in EVENT_FILTERS.items() if k != "exit_day_to_event"}
+
+@pytest.fixture(scope = "module")
+def ledgers(fed_chain, ecb_chain):
+    return {
+        ("Fed", "long"): long_call_long_put(fed_chain, HELD),
+        ("Fed", "short"): short_call_short_put(fed_chain, EVENT_FILTERS),
+        ("ECB", "long"): long_call_long_put(ecb_chain, EVENT_FILTERS),
+    }
+
+def test_trade_stats_equal_results(ledgers):
+    for trades in ledgers.values():
+        stats = results(trades)[0]
+        s = trade_stats(trades).loc["all"]
+        assert s["total_profit"] == pytest.approx(stats["Total Profit"])
+        assert s["win_count"] == stats["Total Win Count"]
+        assert s["loss_count"] == stats["Total Loss Count"]
+        assert s["trades"] == trades.index.nunique()
+
+def test_stacked_equal_single(ledgers):
+    stacked = trade_stats(stack_ledgers(ledgers, ["event", "side"]), by = ["event", "side"])
+    for (key, trades) in ledgers.items():
+        pd.testing.assert_series_equal(stacked.loc[key], trade_stats(trades).loc["all"], check_names = False)
+
+def test_results_trades_equal_groupby(ledgers):
+    # the per-trade table of results is the sum of the legs of each trade
+    price_stats = ["entry_delta", "entry_gamma", "entry_vega", "entry_rho", "entry_theta", "entry_price", "exit_price"]
+    for trades in ledgers.values():
+        expected = trades.groupby(["trade_num", "entry_date", "exit_date", "maturity_date"])[price_stats].sum().reset_index().set_index("trade_num")
+        pd.testing.assert_frame_equal(results(trades)[2][expected.columns], expected)
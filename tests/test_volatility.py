@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from volatility import getAnnualisedVol, realized_vol, underlying_series, init_vol_state, update_vol
+
+WINDOWS = (5, 20)
+
+@pytest.fixture(scope = "module")
+def chain(fed_chain, ecb_chain):
+    # two underlyings with different dates
+    return pd.concat([fed_chain, ecb_chain.assign(underlying_symbol = "ECB")], ignore_index = True)
+
+def test_realized_vol_equals_getAnnualisedVol(chain):
+    vols = realized_vol(chain, windows = WINDOWS)
+    series = underlying_series(chain)
+    assert series["underlying_symbol"].nunique() == 2
+    for (sym, s) in series.groupby("underlying_symbol"):
+        v = vols[vols["underlying_symbol"] == sym]
+        for w in WINDOWS:
+            np.testing.assert_allclose(v[f"rv_{w}"].values, getAnnualisedVol(s, "underlying_price", span = w).values, rtol = 1e-9)
+        ret = np.log(s["underlying_price"] / s["underlying_price"].shift(1))
+        ewma = np.sqrt(252 * (ret ** 2).ewm(alpha = 0.06, adjust = False).mean())
+        np.testing.assert_allclose(v["ewma_vol_94"].values, ewma.values, rtol = 1e-9)
+
+def test_update_vol_equals_batch(chain):
+    state = init_vol_state(windows = WINDOWS)
+    days = [update_vol(state, quotes) for (_, quotes) in chain.groupby("date")]
+    incremental = pd.concat(days).sort_values(["underlying_symbol", "date"]).reset_index(drop = True)
+    pd.testing.assert_frame_equal(incremental, realized_vol(chain, windows = WINDOWS), check_exact = False, rtol = 1e-9)
+
+def _drifting_prices(n = 300, noise = 1e-8, seed = 0):
+    # returns of 1% a day with a tiny noise: the std is far below the mean of the returns
+    ret = 0.01 + noise * np.random.default_rng(seed).standard_normal(n)
+    price = 100 * np.exp(np.r_[0, np.cumsum(ret)])
+    return pd.DataFrame({"underlying_symbol": "A", "date": pd.date_range("2020-01-01", periods = n + 1), "underlying_price": price})
+
+def test_rolling_std_is_stable():
+    data = _drifting_prices()
+    ret = np.log(data["underlying_price"] / data["underlying_price"].shift(1))
+    expected = np.sqrt(252) * ret.rolling(20).apply(lambda x: np.std(x, ddof = 1), raw = True)
+    np.testing.assert_allclose(realized_vol(data, windows = (20,), ewma = ())["rv_20"].values, expected.values, rtol = 1e-6)
+
+def test_flat_prices_zero_vol():
+    data = _drifting_prices(n = 40).assign(underlying_price = 1234.5)
+    vols = realized_vol(data, windows = (5,), ewma = (0.94,))
+    assert (vols["rv_5"].dropna() == 0).all() and vols["rv_5"].notna().sum() == 36
+    assert (vols["ewma_vol_94"].dropna() == 0).all()
+
+def test_ewma_columns_unique():
+    vols = realized_vol(_drifting_prices(n = 40, noise = 0.02), windows = (), ewma = (0.94, 0.9449))
+    assert {"ewma_vol_94", "ewma_vol_9449"} <= set(vols.columns)
+    assert not np.allclose(vols["ewma_vol_94"].values[1:], vols["ewma_vol_9449"].values[1:])
+    with pytest.raises(ValueError):
+        init_vol_state(windows = (5, 5))
@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+
+# Compact trade ledger: the legs of the trades in one numpy structured array instead of a dataframe,
+#   ledger = TradeLedger.from_frame(long_call_long_put(data, filters))
+#   stats, ledger, per_trade = results(ledger)
+#   ledger.to_frame()                       # the dataframe, only built when asked for
+# The dates are day numbers (int32), underlying_symbol and call_put category codes, the quotes and
+# greeks float32, so a leg takes about a third of the memory of its dataframe row. The chain is
+# rounded to 2 decimals at import (data_import.timeFormatter), float32 keeps 2 decimals exactly below
+# 131072, so the float32 columns are rounded back to 2 decimals when the frame is built. The money
+# columns (entry_price, exit_price, cash_flow) are summed over many trades and stay float64.
+# tradeStat.calc_entry_price, calc_exit_price, calc_pnl and results take a ledger as well as a frame.
+
+DECIMALS = 2 # decimals of the float32 columns, see data_import.timeFormatter
+
+date_fields = ("entry_date", "exit_date", "maturity_date")
+category_fields = ("underlying_symbol", "call_put")
+
+# same order as backtest_main.output_format
+ledger_fields = [
+    ("entry_date", np.int32),
+    ("exit_date", np.int32),
+    ("maturity_date", np.int32),
+    ("underlying_symbol", np.uint16),
+    ("dtm", np.int16),
+    ("ratio", np.int16),
+    ("contracts", np.int32),
+    ("call_put", np.uint8),
+    ("strike", np.float32),
+    ("entry_delta", np.float32),
+    ("entry_gamma", np.float32),
+    ("entry_vega", np.float32),
+    ("entry_theta", np.float32),
+    ("entry_rho", np.float32),
+    ("entry_underlying_price", np.float32),
+    ("exit_underlying_price", np.float32),
+    ("entry_opt_price", np.float32),
+    ("exit_opt_price", np.float32),
+    ("entry_price", np.float64),
+    ("exit_price", np.float64),
+    ("cash_flow", np.float64),
+]
+
+# quotes the prices are calculated from, kept when the frame has them (see tradeStat._calc_mkt_opt_price)
+quote_fields = [(f"{col}_{action}", np.float32) for action in ("entry", "exit") for col in ("bid", "ask", "last")]
+
+def _day_num(values):
+    return np.asarray(values, dtype = "datetime64[D]").astype(np.int32)
+
+def _from_day_num(days):
+    return np.asarray(days, dtype = np.int64).astype("datetime64[D]").astype("datetime64[ns]")
+
+class TradeLedger:
+    """
+    :params rows: numpy structured array with the ledger_fields (and quote_fields), one row per leg
+    :params categories: dict, the values of the codes of the category_fields
+    """
+    def __init__(self, rows, categories):
+        self.rows = rows
+        self.categories = categories
+
+    @classmethod
+    def from_frame(cls, data):
+        """
+        ledger of a dataframe in the output format of the strategies, indexed or with a column trade_num.
+        the price columns calculated later (entry_opt_price... cash_flow) may be missing, they are NaN then.
+        """
+        trade_num = data["trade_num"].values if "trade_num" in data else data.index.values
+        fields = [("trade_num", np.int32)] + ledger_fields + [f for f in quote_fields if f[0] in data]
+        missing = [name for (name, dtype) in fields[1:] if name not in data and not np.issubdtype(dtype, np.floating)]
+        if missing:
+            raise ValueError(f"The trades need the columns {missing}")
+
+        rows = np.empty(len(data), dtype = fields)
+        rows["trade_num"] = trade_num
+        categories = {}
+        for (name, dtype) in fields[1:]:
+            if name not in data:
+                rows[name] = np.nan
+            elif name in date_fields:
+                rows[name] = _day_num(data[name].values)
+            elif name in category_fields:
+                if data[name].isna().any():
+                    raise ValueError(f"The trades have missing values in {name}")
+                codes, categories[name] = pd.factorize(data[name], sort = True)
+                rows[name] = codes
+            else:
+                rows[name] = data[name].values
+        return cls(rows, {k: np.asarray(v) for k, v in categories.items()})
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, name):
+        return name in self.rows.dtype.names
+
+    def __getitem__(self, name):
+        # the stored values: day numbers for the dates, codes for the categories
+        return self.rows[name]
+
+    def __setitem__(self, name, values):
+        if name not in self:
+            raise ValueError(f"{name} is not a field of the ledger")
+        self.rows[name] = values
+
+    @property
+    def nbytes(self):
+        return self.rows.nbytes + sum(v.nbytes for v in self.categories.values())
+
+    def round(self, decimals):
+        # like DataFrame.round, a new ledger with the float64 columns rounded (the float32 ones are rounded on to_frame)
+        rows = self.rows.copy()
+        for name in rows.dtype.names:
+            if rows.dtype[name] == np.float64:
+                rows[name] = rows[name].round(decimals)
+        return TradeLedger(rows, self.categories)
+
+    def column(self, name):
+        # the values of a field as they are in the dataframe
+        values = self.rows[name]
+        if name in date_fields:
+            return _from_day_num(values)
+        elif name in category_fields:
+            return self.categories[name][values]
+        elif values.dtype == np.float32:
+            return values.astype(np.float64).round(DECIMALS)
+        return values
+
+    def to_frame(self):
+        # the dataframe in the output format of the strategies, indexed by trade_num
+        names = [n for n in self.rows.dtype.names if n != "trade_num"]
+        return pd.DataFrame(
+            {n: self.column(n) for n in names},
+            index = pd.Index(self.rows["trade_num"].astype(np.int64), name = "trade_num"),
+        )
+
+    def trade_sums(self, cols, keys = ("trade_num", )):
+        """
+        the sums of the cols per group of keys, like data.groupby(keys)[cols].sum() on the dataframe
+        (sorted by keys, NaN counted as 0, the sums in float64)
+        """
+        keys = list(keys)
+        uniq, inv = np.unique(np.stack([self.rows[k].astype(np.int64) for k in keys], axis = 1), axis = 0, return_inverse = True)
+        inv = inv.ravel()
+        sums = {
+            c: np.bincount(inv, weights = np.nan_to_num(self.column(c).astype(np.float64)), minlength = len(uniq))
+            for c in cols
+        }
+        levels = [
+            _from_day_num(uniq[:, i]) if k in date_fields else self.categories[k][uniq[:, i]] if k in category_fields else uniq[:, i]
+            for i, k in enumerate(keys)
+        ]
+        index = pd.MultiIndex.from_arrays(levels, names = keys) if len(keys) > 1 else pd.Index(levels[0], name = keys[0])
+        return pd.DataFrame(sums, index = index)
+
+def concat_ledgers(ledgers):
+    """
+    one ledger of many ledgers with the same fields, e.g. the trades of the points of a sweep.
+    the category codes are remapped to the categories of all the ledgers, trade_num is kept.
+    """
+    ledgers = [l for l in ledgers if len(l)]
+    if not ledgers:
+        raise ValueError("No trades to concatenate")
+    categories = {
+        name: np.unique(np.concatenate([l.categories[name] for l in ledgers]))
+        for name in category_fields
+    }
+    parts = []
+    for l in ledgers:
+        rows = l.rows.copy()
+        for name, values in categories.items():
+            rows[name] = np.searchsorted(values, l.categories[name])[rows[name]]
+        parts.append(rows)
+    return TradeLedger(np.concatenate(parts), categories)
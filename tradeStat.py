@@ -1,4 +1,7 @@
 import numpy as np 
+import pandas as pd
+
+from tradeLedger import TradeLedger
 
 COMMISION_RATE = 0.175 / 100
 
@@ -9,6 +12,16 @@ TCOST = 0 # T cost is irrelevant for NKY
 
 NUN_OPTION = 2 # straddle
 
+# the simple trade stats of results for a run without trades
+empty_summary = {
+    "Total Profit": 0,
+    "Total Win Count": 0,
+    "Total Win Percent": 0,
+    "Total Loss Count": 0,
+    "Total Loss Percent": 0,
+    "Total Trades": 0,
+}
+
 
 def calc_ending_balance(data, init_balance = BUDGET):
 #    window = np.insert(data['cash_flow'].values, 0, init_balance, axis = 0)
@@ -16,22 +29,16 @@ def calc_ending_balance(data, init_balance = BUDGET):
     return (init_balance + data['cash_flow'].sum())
 
 def calc_total_trades(data):
+    if isinstance(data, TradeLedger):
+        return int(data["trade_num"].max()) + 1
     return data.index.max() + 1
 
 def calc_total_profit(data):
+    if isinstance(data, TradeLedger):
+        # NaN cash flows (legs without exit price) count as 0, like the dataframe sum
+        return np.nansum(data["cash_flow"]).round(2)
     return data['cash_flow'].sum().round(2)
 
-def _calc_with_groups(data):
-    df = data.groupby('trade_num')['cash_flow'].sum()
-    wins = df[df >= 0].count()
-    losses = df[df < 0].count()
-    return {
-        "win_cnt": wins,
-        "win_pct": round(wins / df.size, 2),
-        "loss_cnt": losses,
-        "loss_pct": round(losses / df.size, 2),
-    }
-
 def _calc_mkt_opt_price(data, action):
     ask = data[f"ask_{action}"] * data['ratio']
     bid = data[f"bid_{action}"] * data['ratio']
@@ -78,10 +85,108 @@ def calc_pnl(data):
     data["cash_flow"] = data["exit_price"] + data["entry_price"]
     return data.round(2)
 
+# the legs columns the trade statistics are computed from
+stats_cols = ["cash_flow", "entry_price", "entry_date", "exit_date"]
+
+def _legs_frame(data, cols):
+    # the legs of a TradeLedger as a dataframe indexed by trade_num, only with the columns cols
+    if isinstance(data, TradeLedger):
+        return pd.DataFrame({c: data.column(c) for c in cols}, index = pd.Index(data["trade_num"].astype(np.int64), name = "trade_num"))
+    return data
+
+def _trade_ledger(data, by, **aggs):
+    # one row per trade: P&L, premium and dates of the trade (and the named aggs), over its legs
+    keys = by + ["trade_num"]
+    return (
+        data.reset_index()
+        .groupby(keys, sort = False, observed = True)
+        .agg(
+            pnl = ("cash_flow", "sum"),
+            premium = ("entry_price", "sum"),
+            entry_date = ("entry_date", "min"),
+            exit_date = ("exit_date", "max"),
+            **aggs,
+        )
+        .reset_index()
+    )
+
+def stack_ledgers(ledgers, names):
+    """
+    the trades of many ledgers in one frame, with the ledger key in the columns names, e.g.
+    stack_ledgers({("Fed", "ASX"): trades_1, ("ECB", "ASX"): trades_2}, ["event", "market"])
+    """
+    return pd.concat(ledgers, names = names + ["trade_num"]).reset_index()
+
+def trade_stats(data, by = None, init_balance = BUDGET):
+    """
+    statistics of the trades of one or many ledgers, computed in one grouped pass over all the trades.
+    :params data: dataframe, trades in the strategy output format (indexed by trade_num), or many
+        ledgers stacked with stack_ledgers
+    :params by: list, the columns identifying a ledger, None for a single ledger
+    return a dataframe with one row per ledger (a single row indexed by "all" when by is None).
+    The returns are P&L / premium paid or received per trade, the Sharpe and Sortino ratios are per trade
+    (not annualised) and the drawdown is measured on the P&L cumulated by exit date from init_balance.
+    """
+    single = not by
+    by = ["ledger"] if single else list(by)
+    data = _legs_frame(data, stats_cols)
+    if single:
+        data = data.assign(ledger = "all")
+    return _stats_of_trades(_trade_ledger(data, by), by, init_balance).round(4)
+
+def _stats_of_trades(t, by, init_balance):
+    # the statistics of trade_stats (not rounded) of the trades of _trade_ledger
+    t = t.sort_values(by + ["exit_date", "trade_num"], kind = "mergesort")
+    pnl = t["pnl"].values
+    ret = pnl / np.abs(t["premium"].values)
+    cum = t.groupby(by, sort = False, observed = True)["pnl"].cumsum()
+    peak = cum.groupby([t[k] for k in by], sort = False, observed = True).cummax().clip(lower = 0)
+    t = t.assign(
+        win = pnl >= 0,
+        gross_profit = np.where(pnl > 0, pnl, 0),
+        gross_loss = np.where(pnl < 0, -pnl, 0),
+        ret = ret,
+        downside_sq = np.minimum(ret, 0) ** 2,
+        holding_days = (t["exit_date"] - t["entry_date"]).dt.days,
+        drawdown = cum - peak,
+        drawdown_pct = (cum - peak) / (init_balance + peak) * 100,
+    )
+
+    s = t.groupby(by, observed = True).agg(
+        total_profit = ("pnl", "sum"),
+        trades = ("pnl", "size"),
+        win_count = ("win", "sum"),
+        gross_profit = ("gross_profit", "sum"),
+        gross_loss = ("gross_loss", "sum"),
+        avg_pnl = ("pnl", "mean"),
+        avg_return = ("ret", "mean"),
+        std_return = ("ret", "std"),
+        downside_dev = ("downside_sq", "mean"),
+        max_drawdown = ("drawdown", "min"),
+        max_drawdown_pct = ("drawdown_pct", "min"),
+        avg_holding_days = ("holding_days", "mean"),
+    )
+    s["loss_count"] = s["trades"] - s["win_count"]
+    s["win_pct"] = s["win_count"] / s["trades"]
+    s["profit_factor"] = s["gross_profit"] / s["gross_loss"] # inf without losing trade
+    s["downside_dev"] = np.sqrt(s["downside_dev"])
+    s["sharpe"] = s["avg_return"] / s["std_return"].replace(0, np.nan)
+    s["sortino"] = s["avg_return"] / s["downside_dev"].replace(0, np.nan)
+    cols = [
+        "total_profit", "trades", "win_count", "win_pct", "loss_count", "profit_factor", "avg_pnl",
+        "avg_return", "sharpe", "sortino", "max_drawdown", "max_drawdown_pct", "avg_holding_days",
+    ]
+    return s[cols]
+
 def results(data, init_balance=BUDGET, t_cost = TCOST, num_option = NUN_OPTION):
     
     priceStats = ['entry_delta','entry_gamma','entry_vega','entry_rho', 'entry_theta', 'entry_price', 'exit_price']
-    df = data.groupby(['trade_num', 'entry_date' ,'exit_date', 'maturity_date'])[priceStats].sum().reset_index().set_index('trade_num')
+    # the trades and their statistics in the single pass of trade_stats
+    cols = list(dict.fromkeys(stats_cols + ["maturity_date"] + priceStats))
+    legs = _legs_frame(data, cols)[cols].assign(ledger = "all")
+    trades = _trade_ledger(legs, ["ledger"], maturity_date = ("maturity_date", "first"), **{c: (c, "sum") for c in priceStats})
+    stats = _stats_of_trades(trades, ["ledger"], init_balance)
+    df = trades.sort_values("trade_num").set_index("trade_num")[['entry_date' ,'exit_date', 'maturity_date'] + priceStats]
     df['holding_period'] = df['exit_date'] - df['entry_date']
     df['num_contracts'] = round(init_balance / abs(df['entry_price']),0)
     df['total_t_cost'] = num_option * t_cost * df['num_contracts'] # maybe not always
@@ -90,14 +195,15 @@ def results(data, init_balance=BUDGET, t_cost = TCOST, num_option = NUN_OPTION):
     df['Total_Return_pct'] = df['Actual_Profit'] / init_balance * 100
     df['Average_Daily_Return_pct']  = round((df['Total_Return_pct'] / df['holding_period'].dt.days),2) 
     # df['Average_Day_Profit'] = round((df['Actual_Profit'] / df['holding_period']),2)
+    trade_cnt = stats.at["all", "trades"]
     return (
         {
-            "Total Profit": calc_total_profit(data),
-            "Total Win Count": _calc_with_groups(data)["win_cnt"],
-            "Total Win Percent": _calc_with_groups(data)["win_pct"],
-            "Total Loss Count": _calc_with_groups(data)["loss_cnt"],
-            "Total Loss Percent": _calc_with_groups(data)["loss_pct"],
-            "Total Trades": calc_total_trades(data),
+            "Total Profit": stats.at["all", "total_profit"].round(2),
+            "Total Win Count": stats.at["all", "win_count"],
+            "Total Win Percent": round(stats.at["all", "win_count"] / trade_cnt, 2),
+            "Total Loss Count": stats.at["all", "loss_count"],
+            "Total Loss Percent": round(stats.at["all", "loss_count"] / trade_cnt, 2),
+            "Total Trades": trade_cnt,
         },
         data,
         df,
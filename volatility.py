@@ -11,3 +11,127 @@ def getAnnualisedVol(df, column, span = 90, mulFactor = np.sqrt(252)):
     """
     std = np.log(df[column] / df[column].shift(1)).rolling(window = span).std(ddof = 1)
     return mulFactor * std
+
+# Realized vol engine: several rolling windows and EWMA variants of the log returns of every
+# underlying in one pass over the (underlying_symbol, date) series of the chain, e.g.
+#   vols = realized_vol(data, windows = (10, 20, 60), ewma = (0.94,))
+#   data = join_realized_vol(data, vols)   # rv_10, rv_20, rv_60, ewma_vol_94 on every quote
+# The state of init_vol_state / update_vol keeps per underlying the last price, the returns of the
+# longest window and the last EWMA variances, so appending days only computes the vols of the new
+# returns, underlying by underlying.
+
+WINDOWS = (10, 20, 60)
+EWMA = (0.94,)
+MUL_FACTOR = np.sqrt(252)
+
+def _ewma_column(lam):
+    # the digits of lambda after the decimal point, e.g. ewma_vol_94 for 0.94 and ewma_vol_9449 for 0.9449
+    if not 0 < lam < 1:
+        raise ValueError("The EWMA lambda must be between 0 and 1")
+    return "ewma_vol_" + np.format_float_positional(lam, trim = "-").split(".")[1]
+
+def _vol_columns(windows, ewma):
+    cols = [f"rv_{w}" for w in windows] + [_ewma_column(lam) for lam in ewma]
+    if len(set(cols)) < len(cols):
+        raise ValueError("The windows and EWMA lambdas must be unique")
+    return cols
+
+def underlying_series(data):
+    # one underlying price per (underlying_symbol, date), sorted by underlying_symbol and date
+    return (
+        data.groupby(["underlying_symbol", "date"], sort = True, observed = True)["underlying_price"]
+        .first()
+        .reset_index()
+    )
+
+def _rolling_std(ret, window):
+    # rolling sample std over the last window returns, NaN while incomplete. every underlying starts with
+    # a NaN return, so a window never spans two underlyings. the variance is updated online by pandas,
+    # it can still come out slightly below 0 on flat prices, hence the clip
+    var = pd.Series(ret).rolling(window, min_periods = window).var(ddof = 1)
+    return np.sqrt(np.maximum(var.values, 0))
+
+def _ewma_var(sq, lam):
+    # RiskMetrics variance of squared returns, sq[0] seeds the recursion (leading NaNs are skipped)
+    return pd.Series(sq).ewm(alpha = 1 - lam, adjust = False).mean().values
+
+def realized_vol(data, windows = WINDOWS, ewma = EWMA, mulFactor = MUL_FACTOR):
+    """
+    annualised realized vol of every underlying of the chain, one row per (underlying_symbol, date)
+    :params windows: rolling windows (number of returns), std with ddof = 1 like getAnnualisedVol
+    :params ewma: decay factors lambda of the EWMA variance (RiskMetrics), seeded with the first squared return
+    """
+    cols = _vol_columns(windows, ewma)
+    series = underlying_series(data)
+    sym = series["underlying_symbol"].values
+    new_group = np.r_[True, sym[1:] != sym[:-1]]
+
+    price = series["underlying_price"].values.astype(float)
+    ret = np.log(price / np.r_[np.nan, price[:-1]])
+    ret[new_group] = np.nan
+
+    for w in windows:
+        series[f"rv_{w}"] = mulFactor * _rolling_std(ret, w)
+    # the EWMA runs underlying by underlying, the groups are the contiguous runs of sym
+    bounds = np.r_[np.flatnonzero(new_group), len(sym)]
+    sq = ret ** 2
+    for (lam, col) in zip(ewma, cols[len(windows):]):
+        var = np.concatenate([_ewma_var(sq[a:b], lam) for (a, b) in zip(bounds[:-1], bounds[1:])]) if len(sym) else sq
+        series[col] = mulFactor * np.sqrt(var)
+    return series.drop(columns = "underlying_price")
+
+def join_realized_vol(data, vols):
+    # the realized vol columns on every quote of the chain, to be used by e.g. the entry_realized_vol filter
+    return data.merge(vols, on = ["underlying_symbol", "date"], how = "left")
+
+def init_vol_state(windows = WINDOWS, ewma = EWMA, mulFactor = MUL_FACTOR):
+    _vol_columns(windows, ewma)
+    return {"windows": tuple(windows), "ewma": tuple(ewma), "mulFactor": mulFactor, "last_date": None, "underlyings": {}}
+
+def _new_accumulators(state):
+    return {
+        "price": np.nan,
+        "returns": np.empty(0),                # the last max(windows) returns
+        "ewma": {lam: None for lam in state["ewma"]}, # last EWMA variance
+    }
+
+def _push_prices(state, u, prices):
+    # add the returns of the new prices of an underlying to its accumulators, return the vols of the prices
+    ret = np.log(prices / np.r_[u["price"], prices[:-1]])
+    u["price"] = prices[-1]
+    known = len(u["returns"])
+    returns = np.concatenate([u["returns"], ret])
+    vols = {}
+    for w in state["windows"]:
+        # the stored returns complete the windows of the first new returns, only the new rows are kept
+        vols[f"rv_{w}"] = state["mulFactor"] * _rolling_std(returns, w)[known:]
+    for (lam, col) in zip(state["ewma"], _vol_columns((), state["ewma"])):
+        var = u["ewma"][lam]
+        sq = ret ** 2 if var is None else np.r_[var, ret ** 2]
+        var = _ewma_var(sq, lam)[len(sq) - len(ret):]
+        vols[col] = state["mulFactor"] * np.sqrt(var)
+        if not np.isnan(var[-1]):
+            u["ewma"][lam] = var[-1]
+    # the NaN return of the first price of the underlying is never stored
+    u["returns"] = returns[~np.isnan(returns)][-max(state["windows"], default = 1):]
+    return vols
+
+def update_vol(state, data):
+    """
+    push the underlying prices of the quotes after state["last_date"], return the realized vols of
+    the new (underlying_symbol, date) rows in the format of realized_vol. state is updated in place.
+    """
+    if state["last_date"] is not None:
+        data = data[data["date"] > state["last_date"]]
+    series = underlying_series(data)
+    frames = []
+    for (sym, s) in series.groupby("underlying_symbol", sort = True):
+        u = state["underlyings"].setdefault(sym, _new_accumulators(state))
+        vols = _push_prices(state, u, s["underlying_price"].values.astype(float))
+        frames.append(s[["underlying_symbol", "date"]].assign(**vols))
+    if frames:
+        state["last_date"] = series["date"].max()
+    cols = ["underlying_symbol", "date"] + _vol_columns(state["windows"], state["ewma"])
+    if not frames:
+        return pd.DataFrame(columns = cols)
+    return pd.concat(frames)[cols].reset_index(drop = True)